@@ -0,0 +1,100 @@
+"""
+Measures the time spent ejecting `@hd.cached` entries invalidated by
+a mutation, with the dependency index of `Cache`, and with the scan
+of all entries it replaced.
+
+The app calls a cached function from `size` call sites, each
+rendering its own state. On each iteration, the state of one call
+site is mutated and the app re-runs, re-running only that call site.
+Only the time spent ejecting cache entries is reported, averaged over
+the iterations.
+
+Run from the repository root:
+
+    python benchmarks/cache_ejection.py
+    python benchmarks/cache_ejection.py --sizes 1000 10000 --mutated 1 100
+"""
+
+import argparse
+import time
+
+
+def scan_eject_entries_for_mutated_props(self, mutations):
+    keys_to_eject = set()
+    for key, entry in self.cache.items():
+        deps = entry["deps"]
+        for mutation in mutations:
+            if mutation in deps:
+                keys_to_eject.add(key)
+                break
+    for key_to_eject in keys_to_eject:
+        self.pop(key_to_eject)
+
+
+def run_configuration(size, mutated, iterations, eject):
+    import hyperdiv as hd
+    from hyperdiv.cache import Cache
+    from hyperdiv.test_utils import MockManualRunner
+
+    keys = dict()
+
+    @hd.cached
+    def item(i):
+        s = hd.state(count=0)
+        keys[i] = s._key
+        hd.text(s.count)
+
+    def app():
+        for i in range(size):
+            with hd.scope(i):
+                item(i)
+
+    eject_times = []
+    original_eject = Cache.eject_entries_for_mutated_props
+
+    def timed_eject(self, mutations):
+        start = time.perf_counter()
+        eject(self, mutations)
+        eject_times.append(time.perf_counter() - start)
+
+    Cache.eject_entries_for_mutated_props = timed_eject
+    try:
+        mr = MockManualRunner(app)
+        mr.advance()
+        eject_times.clear()
+        for iteration in range(1, iterations + 1):
+            mutations = [(keys[i], "count") for i in range(mutated)]
+            for key, prop_name in mutations:
+                mr.update_state(key, prop_name, iteration)
+            mr.process_task_mutations(mutations)
+    finally:
+        Cache.eject_entries_for_mutated_props = original_eject
+
+    return sum(eject_times) / len(eject_times) * 1000
+
+
+def main():
+    from hyperdiv.cache import Cache
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--mutated", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    indexed_eject = Cache.eject_entries_for_mutated_props
+
+    print(f"{'call sites':>10} {'mutated':>8} {'scan ms':>9} {'index ms':>9}")
+    for size in args.sizes:
+        for mutated in args.mutated:
+            if mutated > size:
+                continue
+            scan_ms = run_configuration(
+                size, mutated, args.iterations, scan_eject_entries_for_mutated_props
+            )
+            index_ms = run_configuration(size, mutated, args.iterations, indexed_eject)
+            print(f"{size:>10} {mutated:>8} {scan_ms:>9.3f} {index_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
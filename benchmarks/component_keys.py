@@ -0,0 +1,114 @@
+"""
+Measures the time spent running an app that creates many components,
+with cached component key generation, and with the uncached key
+generation it replaced.
+
+The app creates `size` text components from inside `depth` nested
+function calls, in scopes, so each key is generated from a deep call
+stack. On each iteration, a state prop is mutated and the app re-runs.
+Only the time spent running the app function is reported, as the
+minimum over the iterations.
+
+Run from the repository root:
+
+    python benchmarks/component_keys.py
+    python benchmarks/component_keys.py --sizes 1000 --depths 5 50
+"""
+
+import argparse
+import inspect
+import time
+
+
+def uncached_component_key(key=None):
+    import xxhash
+    from hyperdiv.frame import AppRunnerFrame
+    from hyperdiv.component_keys import runtime_py_path
+
+    hyperdiv_frame = AppRunnerFrame.current()
+
+    if not key:
+        stack_frame = inspect.currentframe().f_back.f_back
+        key = ""
+        while stack_frame:
+            filename = stack_frame.f_code.co_filename
+            lineno = stack_frame.f_lineno
+            funcname = stack_frame.f_code.co_name
+            if filename == runtime_py_path and funcname == "run_user_app":
+                break
+            key += f"::{filename}:{lineno}:{funcname}"
+            stack_frame = stack_frame.f_back
+
+        key = str(hyperdiv_frame.scope_stack) + key
+        key = "a" + xxhash.xxh32(key).hexdigest()
+
+    return key
+
+
+def run_configuration(size, depth, iterations, cached):
+    import hyperdiv as hd
+    import hyperdiv.component_base as component_base
+    from hyperdiv.test_utils import MockManualRunner
+
+    keys = dict()
+
+    def nested(n, fn):
+        if n == 0:
+            fn()
+        else:
+            nested(n - 1, fn)
+
+    def render_items():
+        for i in range(size):
+            with hd.scope(i):
+                hd.text(i)
+
+    def app():
+        state = hd.state(version=0)
+        keys["state"] = state._key
+        state.version
+        nested(depth, render_items)
+
+    run_times = []
+    original_get_component_key = component_base.get_component_key
+    if not cached:
+        component_base.get_component_key = uncached_component_key
+
+    try:
+        mr = MockManualRunner(app)
+        mr.advance()
+        original_run_user_app = mr.app_runner.run_user_app
+
+        def timed_run_user_app(*args, **kwargs):
+            start = time.perf_counter()
+            result = original_run_user_app(*args, **kwargs)
+            run_times.append(time.perf_counter() - start)
+            return result
+
+        mr.app_runner.run_user_app = timed_run_user_app
+        for version in range(1, iterations + 1):
+            mr.update_state(keys["state"], "version", version)
+            mr.process_task_mutations([(keys["state"], "version")])
+    finally:
+        component_base.get_component_key = original_get_component_key
+
+    return min(run_times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'components':>10} {'depth':>6} {'uncached ms':>12} {'cached ms':>10}")
+    for size in args.sizes:
+        for depth in args.depths:
+            uncached_ms = run_configuration(size, depth, args.iterations, False)
+            cached_ms = run_configuration(size, depth, args.iterations, True)
+            print(f"{size:>10} {depth:>6} {uncached_ms:>12.2f} {cached_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures the time spent diffing the previous and current component
+trees, at increasing tree sizes and numbers of mutated components.
+
+The app renders `size` text components in boxes of 10. On each
+iteration, a state prop is mutated, the app re-runs, and `mutated`
+of the text components display a new value. Only the time spent in
+the diff is reported, averaged over the iterations.
+
+Run from the repository root:
+
+    python benchmarks/diff.py
+    python benchmarks/diff.py --sizes 1000 20000 --mutated 1 100
+"""
+
+import argparse
+import time
+
+
+def run_configuration(size, mutated, iterations):
+    import hyperdiv as hd
+    import hyperdiv.app_runner as app_runner
+    from hyperdiv.test_utils import MockManualRunner
+
+    keys = dict()
+
+    def app():
+        state = hd.state(version=0)
+        keys["state"] = state._key
+        for i in range(size // 10):
+            with hd.scope(i):
+                with hd.box(gap=1, padding=1):
+                    for j in range(10):
+                        with hd.scope(j):
+                            n = i * 10 + j
+                            hd.text(state.version if n < mutated else n)
+
+    diff_times = []
+    original_diff = app_runner.diff
+
+    def timed_diff(*args, **kwargs):
+        start = time.perf_counter()
+        result = original_diff(*args, **kwargs)
+        diff_times.append(time.perf_counter() - start)
+        return result
+
+    app_runner.diff = timed_diff
+    try:
+        mr = MockManualRunner(app)
+        mr.advance()
+        diff_times.clear()
+        for version in range(1, iterations + 1):
+            mr.update_state(keys["state"], "version", version)
+            mr.process_task_mutations([(keys["state"], "version")])
+    finally:
+        app_runner.diff = original_diff
+
+    return sum(diff_times) / len(diff_times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--mutated", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'components':>10} {'mutated':>8} {'diff ms':>9}")
+    for size in args.sizes:
+        for mutated in args.mutated:
+            if mutated > size:
+                continue
+            diff_ms = run_configuration(size, mutated, args.iterations)
+            print(f"{size:>10} {mutated:>8} {diff_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Measures how long the ioloop is stalled while sessions send large
+DOM messages, with messages encoded on the sessions' threads by
+`Connection.send`, and with messages encoded on the ioloop, as
+`Connection.send` did before.
+
+The initial DOM message of an app rendering `size` components is
+sent `renders` times by each of `sessions` threads at once, on
+connections that discard the encoded messages. Meanwhile, a probe on
+the ioloop sleeps for `interval` milliseconds at a time, and records
+how late it wakes up. The maximum and total lateness are reported.
+
+Run from the repository root:
+
+    python benchmarks/ioloop_stall.py
+    python benchmarks/ioloop_stall.py --sizes 5000 --sessions 8 --renders 5
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+
+def make_dom_message(size):
+    import hyperdiv as hd
+    from hyperdiv.test_utils import MockManualRunner
+
+    def app():
+        with hd.table():
+            with hd.tbody():
+                for i in range(size // 3):
+                    with hd.scope(i):
+                        with hd.tr():
+                            hd.td(f"Row {i}")
+                            hd.td(i * 1.5)
+
+    mr = MockManualRunner(app)
+    mr.advance()
+    return mr.connection.msgs[0]
+
+
+def make_connection_class(encode_on_ioloop):
+    from hyperdiv.connection import Connection
+
+    class BenchmarkConnection:
+        def __init__(self, ioloop):
+            self.ioloop = ioloop
+            self.client_id = "client"
+            self.sent_client_id = True
+            self.num_bytes = 0
+
+        async def write_message(self, data):
+            self.num_bytes += len(data)
+
+        if encode_on_ioloop:
+
+            def send(self, message):
+                async def _send():
+                    await self.write_message(json.dumps(message))
+
+                self.ioloop.add_callback(_send)
+
+        else:
+            send = Connection.send
+            write_encoded_message = Connection.write_encoded_message
+
+    return BenchmarkConnection
+
+
+def run_configuration(message, sessions, renders, interval, encode_on_ioloop):
+    from tornado.ioloop import IOLoop
+
+    ioloop_started = threading.Event()
+    lateness = []
+    state = dict(running=True)
+
+    async def probe():
+        while state["running"]:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lateness.append(time.perf_counter() - start - interval)
+
+    def run_ioloop():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        state["ioloop"] = IOLoop.current()
+        state["ioloop"].add_callback(ioloop_started.set)
+        state["ioloop"].run_sync(probe)
+
+    ioloop_thread = threading.Thread(target=run_ioloop)
+    ioloop_thread.start()
+    ioloop_started.wait()
+    ioloop = state["ioloop"]
+
+    connection_class = make_connection_class(encode_on_ioloop)
+    connections = [connection_class(ioloop) for _ in range(sessions)]
+
+    def session(connection):
+        for _ in range(renders):
+            connection.send(message)
+
+    threads = [threading.Thread(target=session, args=(c,)) for c in connections]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Wait until the ioloop wrote all the messages, and the probe
+    # woke up after the last one.
+    drained = threading.Event()
+    ioloop.add_callback(drained.set)
+    drained.wait()
+    time.sleep(interval * 2)
+
+    state["running"] = False
+    ioloop_thread.join()
+
+    return max(lateness) * 1000, sum(lateness) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3000, 15000])
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--renders", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=5, help="milliseconds")
+    args = parser.parse_args()
+
+    interval = args.interval / 1000
+
+    print(
+        f"{'components':>10} {'message KB':>10} "
+        f"{'ioloop max ms':>13} {'ioloop sum ms':>13} "
+        f"{'thread max ms':>13} {'thread sum ms':>13}"
+    )
+    for size in args.sizes:
+        message = make_dom_message(size)
+        message_kb = len(json.dumps(message)) / 1024
+        results = [
+            run_configuration(
+                message, args.sessions, args.renders, interval, encode_on_ioloop
+            )
+            for encode_on_ioloop in (True, False)
+        ]
+        (ioloop_max, ioloop_sum), (thread_max, thread_sum) = results
+        print(
+            f"{size:>10} {message_kb:>10.0f} "
+            f"{ioloop_max:>13.1f} {ioloop_sum:>13.1f} "
+            f"{thread_max:>13.1f} {thread_sum:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
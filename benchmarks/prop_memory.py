@@ -0,0 +1,147 @@
+"""
+Measures the memory held by a session after its first run, with the
+slotted `StoredProp`, and with the dict-based `StoredProp` it
+replaced, which copied the metadata of its `Prop` into every
+instance.
+
+The app renders `size` buttons, each initializing `props` of its
+props with non-default values, so those props are stored. The memory
+held by the session is measured with `tracemalloc`, after the
+messages sent to the browser are dropped.
+
+Run from the repository root:
+
+    python benchmarks/prop_memory.py
+    python benchmarks/prop_memory.py --sizes 1000 --props 2 10
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+
+def to_caml_case(name):
+    parts = name.split("_")
+    return "".join([parts[0], *[part.capitalize() for part in parts[1:]]])
+
+
+def make_dict_stored_prop():
+    from hyperdiv.prop import StoredProp
+    from hyperdiv.prop_types import Event, CSS
+
+    class DictStoredProp:
+        """The `StoredProp` layout before `__slots__`."""
+
+        Unset = StoredProp.Unset
+
+        def __init__(self, key, prop):
+            self.key = key
+            self.prop = prop
+
+            self.name = prop.name
+            self.ui_name = prop.ui_name
+            self.camlcase_ui_name = prop.camlcase_ui_name
+            self.prop_type = prop.prop_type
+            self.default_value = prop.default_value
+            self.backend_immutable = prop.backend_immutable
+            self.internal = prop.internal
+
+            self.value = StoredProp.Unset
+            self.mutated = False
+            self.init_value = StoredProp.Unset
+
+            self.is_event_prop = isinstance(prop.prop_type, Event)
+            if self.is_event_prop:
+                self.internal = True
+            self.is_css_prop = isinstance(prop.prop_type, CSS)
+
+            if prop.ui_name:
+                self.ui_name = prop.ui_name
+            elif self.camlcase_ui_name:
+                self.ui_name = to_caml_case(prop.name)
+            else:
+                self.ui_name = prop.name
+
+        init = StoredProp.init
+        init_value_changed = StoredProp.init_value_changed
+        parse = StoredProp.parse
+        render = StoredProp.render
+        value_changed = StoredProp.value_changed
+        update = StoredProp.update
+        reset = StoredProp.reset
+
+        @staticmethod
+        def create(key, prop):
+            return DictStoredProp(key, prop)
+
+    return DictStoredProp
+
+
+button_props = dict(
+    variant="primary",
+    size="small",
+    pill=True,
+    outline=True,
+    disabled=True,
+    loading=True,
+    caret=True,
+    circle=True,
+    width=10,
+    height=3,
+    padding=1,
+    margin=1,
+)
+
+
+def session_bytes(size, num_props):
+    import hyperdiv as hd
+    from hyperdiv.test_utils import MockManualRunner
+
+    kwargs = dict(list(button_props.items())[:num_props])
+
+    def app():
+        for i in range(size):
+            with hd.scope(i):
+                hd.button("Hello", **kwargs)
+
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    mr = MockManualRunner(app)
+    mr.advance()
+    mr.connection.msgs.clear()
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del mr
+    return held
+
+
+def main():
+    import hyperdiv.application_state as application_state
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--props", type=int, nargs="+", default=[2, 6, 12])
+    args = parser.parse_args()
+
+    slotted_stored_prop = application_state.StoredProp
+    dict_stored_prop = make_dict_stored_prop()
+
+    print(f"{'components':>10} {'props':>6} {'dict KB':>9} {'slots KB':>9}")
+    for size in args.sizes:
+        for num_props in args.props:
+            application_state.StoredProp = dict_stored_prop
+            try:
+                dict_bytes = session_bytes(size, num_props)
+            finally:
+                application_state.StoredProp = slotted_stored_prop
+            slots_bytes = session_bytes(size, num_props)
+            print(
+                f"{size:>10} {num_props:>6} "
+                f"{dict_bytes / 1024:>9.0f} {slots_bytes / 1024:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Measures the time spent rendering the components sent when switching
+between two pages, with the renderings memoized by `UIPropState`,
+and with the memoized renderings dropped before every render.
+
+The app renders one of two pages of `size` text components in boxes
+of 10. On each iteration, the page is switched, the app re-runs, and
+the page shown is inserted into the DOM. With `--cached`, the pages
+are rendered by a `@cached` function, so the components of a page
+are reused from the previous time it was shown. Only the time spent
+in `render_and_reply` is reported, averaged over the iterations.
+
+Run from the repository root:
+
+    python benchmarks/render_fragments.py
+    python benchmarks/render_fragments.py --sizes 1000 20000 --cached
+"""
+
+import argparse
+import time
+
+
+def run_configuration(size, is_cached, memoized, iterations):
+    import hyperdiv as hd
+    from hyperdiv.app_runner import AppRunner
+    from hyperdiv.test_utils import MockManualRunner
+
+    keys = dict()
+
+    def page(number):
+        for i in range(size // 10):
+            with hd.scope(i):
+                with hd.box(gap=1, padding=1):
+                    for j in range(10):
+                        with hd.scope(j):
+                            hd.text(f"Page {number}, item {i * 10 + j}")
+
+    if is_cached:
+        page = hd.cached(page)
+
+    def app():
+        state = hd.state(page=0)
+        keys["state"] = state._key
+        with hd.scope(state.page):
+            page(state.page)
+
+    render_times = []
+    original_render_and_reply = AppRunner.render_and_reply
+
+    def timed_render_and_reply(self, *args, **kwargs):
+        if not memoized:
+            self.ui_prop_state.fragments.clear()
+        start = time.perf_counter()
+        result = original_render_and_reply(self, *args, **kwargs)
+        render_times.append(time.perf_counter() - start)
+        return result
+
+    AppRunner.render_and_reply = timed_render_and_reply
+    try:
+        mr = MockManualRunner(app)
+        mr.advance()
+        # Show both pages once.
+        mr.update_state(keys["state"], "page", 1)
+        mr.process_task_mutations([(keys["state"], "page")])
+        render_times.clear()
+        for i in range(iterations):
+            mr.update_state(keys["state"], "page", i % 2)
+            mr.process_task_mutations([(keys["state"], "page")])
+    finally:
+        AppRunner.render_and_reply = original_render_and_reply
+
+    return sum(render_times) / len(render_times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--cached", action="store_true")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'components':>10} {'dropped ms':>10} {'memoized ms':>11}")
+    for size in args.sizes:
+        dropped_ms, memoized_ms = [
+            run_configuration(size, args.cached, memoized, args.iterations)
+            for memoized in (False, True)
+        ]
+        print(f"{size:>10} {dropped_ms:>10.2f} {memoized_ms:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Measures the time spent diffing the children of a container when
+they are reordered, like the rows of a table sorted by another
+column.
+
+The app renders `size` text components in a box, in the order held
+by a state prop. On each iteration, the order is shuffled, the app
+re-runs, and the diff moves the children into their new order. Only
+the time spent in the diff is reported, averaged over the
+iterations, along with the number of moves.
+
+Run from the repository root:
+
+    python benchmarks/reorder.py
+    python benchmarks/reorder.py --sizes 10000 50000 --iterations 3
+"""
+
+import argparse
+import random
+import time
+
+
+def run_configuration(size, iterations):
+    import hyperdiv as hd
+    import hyperdiv.app_runner as app_runner
+    from hyperdiv.test_utils import MockManualRunner
+
+    keys = dict()
+
+    def app():
+        state = hd.state(items=tuple(range(size)))
+        keys["state"] = state._key
+        with hd.box() as box:
+            keys["box"] = box._key
+            for item in state.items:
+                with hd.scope(item):
+                    hd.plaintext(item)
+
+    diff_times = []
+    original_diff = app_runner.diff
+
+    def timed_diff(*args, **kwargs):
+        start = time.perf_counter()
+        result = original_diff(*args, **kwargs)
+        diff_times.append(time.perf_counter() - start)
+        return result
+
+    app_runner.diff = timed_diff
+    rng = random.Random(0)
+    num_moves = 0
+    try:
+        mr = MockManualRunner(app)
+        mr.advance()
+        diff_times.clear()
+        items = list(range(size))
+        for _ in range(iterations):
+            rng.shuffle(items)
+            mr.update_state(keys["state"], "items", tuple(items))
+            mr.process_task_mutations([(keys["state"], "items")])
+            num_moves += len(mr.connection.msgs[-1]["diff"][keys["box"]]["children"])
+    finally:
+        app_runner.diff = original_diff
+
+    return sum(diff_times) / len(diff_times) * 1000, num_moves // iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'children':>10} {'moves':>8} {'diff ms':>9}")
+    for size in args.sizes:
+        diff_ms, num_moves = run_configuration(size, args.iterations)
+        print(f"{size:>10} {num_moves:>8} {diff_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Compares one-thread-per-session AppRunners against AppRunners sharing a
+SessionScheduler, at increasing numbers of concurrent sessions.
+
+For each configuration it reports the thread count, the process RSS,
+and the p50/p99 latency between enqueueing a click event and the
+corresponding reply being sent on the (mock) connection.
+
+Each configuration runs in a fresh subprocess so RSS numbers are not
+polluted by previous runs. The thread-per-session mode is skipped above
+`--max-thread-sessions` sessions, since starting that many threads
+takes longer than the rest of the benchmark. Run from the repository
+root:
+
+    python benchmarks/session_scheduler.py
+    python benchmarks/session_scheduler.py --sessions 10000 --threads 8
+"""
+
+import argparse
+import random
+import subprocess
+import sys
+import threading
+import time
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_configuration(num_sessions, session_threads, num_events):
+    import hyperdiv as hd
+    from hyperdiv.app_runner import AppRunner
+    from hyperdiv.task_runtime import TaskRuntime
+    from hyperdiv.session_scheduler import SessionScheduler
+    from hyperdiv.test_utils import mock_initial_updates
+
+    class TimingConnection:
+        def __init__(self):
+            self.replied = threading.Event()
+            self.reply_time = None
+
+        def send(self, msg):
+            self.reply_time = time.perf_counter()
+            self.replied.set()
+
+    keys = dict()
+
+    def app():
+        state = hd.state(count=0)
+        button = hd.button("Increment")
+        keys["button"] = button._key
+        if button.clicked:
+            state.count += 1
+        with hd.box(gap=1):
+            for i in range(5):
+                with hd.scope(i):
+                    hd.text("Count:", state.count)
+
+    task_runtime = TaskRuntime(2)
+    scheduler = SessionScheduler(session_threads) if session_threads else None
+
+    runners = []
+    for _ in range(num_sessions):
+        connection = TimingConnection()
+        runner = AppRunner(
+            connection,
+            task_runtime,
+            app,
+            list(mock_initial_updates),
+            scheduler=scheduler,
+        )
+        runner.start()
+        runners.append(runner)
+
+    for runner in runners:
+        runner.connection.replied.wait()
+
+    # Let the sessions settle into their idle state.
+    time.sleep(1)
+    thread_count = threading.active_count()
+    rss = rss_mb()
+
+    latencies = []
+    for _ in range(num_events):
+        runner = random.choice(runners)
+        runner.connection.replied.clear()
+        start = time.perf_counter()
+        runner.enqueue_ui_updates([(keys["button"], "clicked", True)])
+        runner.connection.replied.wait()
+        latencies.append((runner.connection.reply_time - start) * 1000)
+
+    for runner in runners:
+        runner.stop()
+    for runner in runners:
+        runner.wait()
+    if scheduler:
+        scheduler.shutdown()
+    task_runtime.shutdown()
+
+    return thread_count, rss, percentile(latencies, 50), percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--max-thread-sessions", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--child", nargs=2, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        num_sessions, session_threads = args.child
+        result = run_configuration(num_sessions, session_threads, args.events)
+        print(*result)
+        return
+
+    print(
+        f"{'mode':>16} {'sessions':>9} {'threads':>8} {'rss MB':>9} "
+        f"{'p50 ms':>8} {'p99 ms':>8}"
+    )
+    for num_sessions in args.sessions:
+        for session_threads in (0, args.threads):
+            mode = (
+                f"scheduler({session_threads})" if session_threads else "thread/session"
+            )
+            if not session_threads and num_sessions > args.max_thread_sessions:
+                print(f"{mode:>16} {num_sessions:>9} skipped")
+                continue
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--events",
+                    str(args.events),
+                    "--child",
+                    str(num_sessions),
+                    str(session_threads),
+                ],
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                print(
+                    f"{mode:>16} {num_sessions:>9} failed: {proc.stderr.strip()[-200:]}"
+                )
+                continue
+            threads, rss, p50, p99 = proc.stdout.split()[-4:]
+            print(
+                f"{mode:>16} {num_sessions:>9} {int(threads):>8} {float(rss):>9.1f} "
+                f"{float(p50):>8.2f} {float(p99):>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measures the size of the initial DOM message of a table page, in
+the default JSON form, and in the compact form sent when
+`hd.run(compact_protocol=True)` is set. Sizes are also reported
+after zlib compression, approximating the websocket's
+permessage-deflate compression.
+
+The app renders a table with `rows` rows and `columns` columns. With
+`--styled`, every cell also has a few style props.
+
+Run from the repository root:
+
+    python benchmarks/wire_size.py
+    python benchmarks/wire_size.py --rows 100 1000 --columns 10 --styled
+"""
+
+import argparse
+import zlib
+
+
+def make_dom_message(rows, columns, styled):
+    import hyperdiv as hd
+    from hyperdiv.test_utils import MockManualRunner
+
+    cell_props = dict(padding=0.5, font_color="neutral-700") if styled else dict()
+
+    def app():
+        with hd.table():
+            with hd.thead():
+                with hd.tr():
+                    for j in range(columns):
+                        with hd.scope(j):
+                            hd.td(f"Column {j}")
+            with hd.tbody():
+                for i in range(rows):
+                    with hd.scope(i):
+                        with hd.tr():
+                            for j in range(columns):
+                                with hd.scope(j):
+                                    hd.td(i * columns + j, **cell_props)
+
+    mr = MockManualRunner(app)
+    mr.advance()
+    return mr.connection.msgs[0]
+
+
+def main():
+    from hyperdiv.encoding import encode_message, CompactEncoder
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--columns", type=int, nargs="+", default=[3, 10])
+    parser.add_argument("--styled", action="store_true")
+    args = parser.parse_args()
+
+    print(
+        f"{'rows':>6} {'columns':>7} {'json KB':>8} {'compact KB':>10} {'ratio':>6} "
+        f"{'json zlib KB':>12} {'compact zlib KB':>15}"
+    )
+    for rows in args.rows:
+        for columns in args.columns:
+            message = make_dom_message(rows, columns, args.styled)
+            data = encode_message(message)
+            compact_data = encode_message(message, CompactEncoder())
+            print(
+                f"{rows:>6} {columns:>7} {len(data) / 1024:>8.0f} "
+                f"{len(compact_data) / 1024:>10.0f} "
+                f"{len(data) / len(compact_data):>6.1f} "
+                f"{len(zlib.compress(data)) / 1024:>12.0f} "
+                f"{len(zlib.compress(compact_data)) / 1024:>15.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+// The maximum number of style class names in the table of a
+// decoder. Must match `max_style_classes` in `hyperdiv/encoding.py`.
+const maxStyleClasses = 10000;
+
+// Decodes the messages sent by the server in the compact form
+// produced by `hyperdiv.encoding.CompactEncoder`. A decoder is
+// created for each websocket connection, since the server starts a
+// new schema table on every connection.
+//
+// A compact component is an array `[key, schema, propValues,
+// styleClass, children]`, where `schema` indexes the table of `[name, tag,
+// classes, propNames]` schemas received on the connection. Messages
+// that use new schemas carry them in `message.schemas`. Components
+// that are not arrays are already decoded.
+//
+// A compact style class is either a class name, which is added to
+// the table of class names, or the index of a name in that table.
+export class CompactDecoder {
+  constructor() {
+    this.schemas = [];
+    this.styleClasses = [];
+  }
+
+  decodeMessage(message) {
+    if (message.schemas) {
+      for (const schema of message.schemas) {
+        this.schemas.push(schema);
+      }
+      delete message.schemas;
+    }
+
+    if (message.dom) {
+      message.dom = this.decodeComponent(message.dom);
+    }
+
+    if (message.diff) {
+      for (const key of Object.keys(message.diff)) {
+        const childrenDiff = message.diff[key].children;
+        if (childrenDiff) {
+          for (const chunk of childrenDiff) {
+            if (chunk[0] === "insert") {
+              chunk[2] = chunk[2].map((node) => this.decodeComponent(node));
+            }
+          }
+        }
+      }
+    }
+
+    return message;
+  }
+
+  decodeComponent(node) {
+    if (!Array.isArray(node)) {
+      return node;
+    }
+
+    const [key, schemaIndex, propValues, styleClass, children] = node;
+    const [name, tag, classes, propNames] = this.schemas[schemaIndex];
+
+    const props = {};
+    for (let i = 0; i < propNames.length; i++) {
+      props[propNames[i]] = propValues[i];
+    }
+
+    const hdNode = { key, name, tag, classes, props };
+
+    if (styleClass !== undefined && styleClass !== null) {
+      hdNode.styleClass = this.decodeStyleClass(styleClass);
+    }
+
+    if (children !== undefined) {
+      hdNode.children = children.map((child) => this.decodeComponent(child));
+    }
+
+    return hdNode;
+  }
+
+  decodeStyleClass(styleClass) {
+    if (typeof styleClass === "number") {
+      return this.styleClasses[styleClass];
+    }
+    if (this.styleClasses.length < maxStyleClasses) {
+      this.styleClasses.push(styleClass);
+    }
+    return styleClass;
+  }
+}
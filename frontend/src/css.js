@@ -1,7 +1,26 @@
-// `ruleCache` holds an in-memory mapping of CSS selectors -> CSS rule
-// DOM objects, so they can be quickly updated.
-let ruleCache = {};
-window.ruleCache = ruleCache;
+// Components are styled by shared style classes. The server sends
+// the definition of each class once, mapping selector suffixes, like
+// `""`, `":hover"` or `"::part(base)"`, to CSS, and then references
+// the class by name in every component that uses it. When a
+// component switches to a new class, the server may instead send the
+// new class as the difference from the component's previous class,
+// mapping each changed selector suffix to `null`, if the suffix was
+// removed, or to its changed declarations, where `null` marks a
+// removed declaration.
+//
+// The server counts the components using each class. When the count
+// of a class drops to zero, the server lists the class as released
+// in its next message, and sends its definition again if a later
+// message uses it. So the rules of a class are inserted when the
+// class is defined, and deleted when it is released.
+
+// Mapping of Hyperdiv component key -> the style class of its
+// element.
+let keyStyleClasses = {};
+
+// Mapping of style class name -> mapping of selector suffix -> the
+// rule of the class in the style sheet.
+let styleClassRules = {};
 
 function findHyperdivStyleSheet() {
   for (let i = 0; i < document.styleSheets.length; i++) {
@@ -22,111 +41,131 @@ function getStyleSheet() {
   return cachedStyleSheet;
 }
 
-function updateSelector(selector, style) {
-  const styleSheet = getStyleSheet();
-
-  if (selector in ruleCache) {
-    ruleCache[selector].style.cssText = style;
-  } else {
-    const styleSheetLength = styleSheet.cssRules
-      ? styleSheet.cssRules.length
-      : 0;
-    styleSheet.insertRule(selector + "{" + style + "}", styleSheetLength);
-    ruleCache[selector] = styleSheet.cssRules[styleSheetLength];
-  }
+// The `:not(#hd-no-id)` clause matches every element, but gives the
+// class selectors the specificity of the `#<key>` selectors that
+// styled components before, so they keep taking precedence over the
+// rules in overrides.css.
+function classSelector(className, suffix) {
+  return `.${className}:not(#hd-no-id)${suffix}`;
 }
 
-// `cssCache` holds an in-memory mapping of Hyperdiv component key ->
-// dictionary of style selectors at that key.
-let cssCache = {};
-window.cssCache = cssCache;
-
-export function updateStyle(key, style) {
-  if (typeof style === "undefined") {
-    return;
-  }
-
-  const keyCache = cssCache[key] || {};
-
-  const toRemove = new Set();
+function insertRule(className, suffix, css) {
+  const styleSheet = getStyleSheet();
+  const index = styleSheet.cssRules.length;
+  styleSheet.insertRule(
+    classSelector(className, suffix) + "{" + css + "}",
+    index,
+  );
+  styleClassRules[className][suffix] = styleSheet.cssRules[index];
+}
 
-  for (const selector of Object.keys(keyCache)) {
-    if (!(selector in style)) {
-      toRemove.add(selector);
-      delete keyCache[selector];
+// Inserts the rules of the given mapping of class name -> definition
+// in the style sheet, and then the rules of the given mapping of class
+// name -> `{base, diff}`, where `diff` is the difference of the class
+// from the `base` class.
+export function defineStyleClasses(definitions, derivedDefinitions) {
+  for (const className of Object.keys(definitions || {})) {
+    const definition = definitions[className];
+    styleClassRules[className] = {};
+    for (const suffix of Object.keys(definition)) {
+      insertRule(className, suffix, definition[suffix]);
     }
   }
 
-  removeSelectors(toRemove);
+  for (const className of Object.keys(derivedDefinitions || {})) {
+    const { base, diff } = derivedDefinitions[className];
+    const baseRules = styleClassRules[base] || {};
+    styleClassRules[className] = {};
 
-  for (const selector of Object.keys(style)) {
-    if (keyCache[selector] !== style[selector]) {
-      updateSelector(selector, style[selector]);
-      keyCache[selector] = style[selector];
+    for (const suffix of Object.keys(baseRules)) {
+      if (diff[suffix] !== null) {
+        insertRule(className, suffix, baseRules[suffix].style.cssText);
+      }
     }
-  }
 
-  if (Object.keys(keyCache).length > 0) {
-    cssCache[key] = keyCache;
-  } else {
-    delete cssCache[key];
+    for (const suffix of Object.keys(diff)) {
+      const declarations = diff[suffix];
+      if (declarations === null) {
+        continue;
+      }
+      if (!(suffix in styleClassRules[className])) {
+        insertRule(className, suffix, "");
+      }
+      const rule = styleClassRules[className][suffix];
+      for (const name of Object.keys(declarations)) {
+        if (declarations[name] === null) {
+          rule.style.removeProperty(name);
+        } else {
+          rule.style.setProperty(name, declarations[name]);
+        }
+      }
+    }
   }
 }
 
-function removeSelectors(selectors) {
-  const styleSheet = getStyleSheet();
-
-  if (selectors.size === 0) {
+// Deletes the rules of the given released classes from the style
+// sheet.
+export function releaseStyleClasses(classNames) {
+  if (!classNames || classNames.length === 0) {
     return;
   }
 
-  let i = 0;
-  while (true) {
-    if (i >= styleSheet.rules.length) {
-      break;
+  const released = new Set(classNames);
+  const releasedRules = new Set();
+  for (const className of released) {
+    for (const rule of Object.values(styleClassRules[className] || {})) {
+      releasedRules.add(rule);
     }
-    const rule = styleSheet.rules[i];
-    if (selectors.has(rule.selectorText)) {
+    delete styleClassRules[className];
+  }
+
+  const styleSheet = getStyleSheet();
+  for (let i = styleSheet.cssRules.length - 1; i >= 0; i--) {
+    if (releasedRules.has(styleSheet.cssRules[i])) {
       styleSheet.deleteRule(i);
-      delete ruleCache[rule.selectorText];
-    } else {
-      i++;
     }
   }
 }
 
-export function removeStyles(keys) {
-  const selectors = new Set();
-  for (const key of keys) {
-    const cachedStyle = cssCache[key];
-    if (!cachedStyle) {
-      continue;
-    }
+// Sets the style class of the element at `key`, replacing its
+// previous style class, if any. `className` may be `null` or
+// `undefined` to remove the element's style class.
+export function setStyleClass(key, element, className) {
+  const previous = keyStyleClasses[key];
+  if (previous === className) {
+    return;
+  }
 
-    for (const selector of Object.keys(cachedStyle)) {
-      selectors.add(selector);
-    }
+  if (previous) {
+    element.classList.remove(previous);
+    delete keyStyleClasses[key];
   }
 
-  removeSelectors(selectors);
+  if (className) {
+    element.classList.add(className);
+    keyStyleClasses[key] = className;
+  }
+}
 
+// Forgets the style classes of the given keys, whose elements were
+// removed.
+export function removeStyles(keys) {
   for (const key of keys) {
-    delete cssCache[key];
+    delete keyStyleClasses[key];
   }
 }
 
+// Removes all the style rules. The server sends the definitions of
+// the classes it uses again along with a new DOM.
 export function removeAllStyles() {
   const styleSheet = getStyleSheet();
-  let numStyles = styleSheet.rules.length;
+  let numStyles = styleSheet.cssRules.length;
 
   while (numStyles > 0) {
     styleSheet.deleteRule(0);
     numStyles -= 1;
   }
 
-  ruleCache = {};
-  window.ruleCache = ruleCache;
-
-  cssCache = {};
-  window.cssCache = cssCache;
+  keyStyleClasses = {};
+  styleClassRules = {};
 }
@@ -6,7 +6,13 @@ import "./styles/overrides.css";
 import "./shoelace.js";
 import "./disconnected-cover";
 import { websocket } from "./websocket.js";
-import { updateStyle, removeStyles, removeAllStyles } from "./css.js";
+import {
+  defineStyleClasses,
+  releaseStyleClasses,
+  setStyleClass,
+  removeStyles,
+  removeAllStyles,
+} from "./css.js";
 import { singletons, getInitialUpdates } from "./singletons.js";
 import { applyPendingCallbacks } from "./next-update.js";
 import { executeCommands } from "./commands.js";
@@ -21,10 +27,10 @@ import { getComponentLogic } from "./components.js";
 let elementCache = {};
 
 // Creates an HTML node from the given Hyperdiv node
-// `hdNode`. Populates the given node cache `cache` and style cache
-// `styleCache` with the HTML node and its styles.
-const createDomNode = (hdNode, cache, styleCache) => {
-  const { key, name, tag, props, children, classes, style } = hdNode;
+// `hdNode`. Populates the given node cache `cache` with the HTML
+// node.
+const createDomNode = (hdNode, cache) => {
+  const { key, name, tag, props, children, classes, styleClass } = hdNode;
 
   const component = getComponentLogic(name, tag);
 
@@ -39,6 +45,8 @@ const createDomNode = (hdNode, cache, styleCache) => {
     elem.classList.add(className);
   }
 
+  setStyleClass(key, elem, styleClass);
+
   // Set props and children
 
   for (const propName of Object.keys(props)) {
@@ -47,7 +55,7 @@ const createDomNode = (hdNode, cache, styleCache) => {
 
   if (children) {
     for (const child of children) {
-      const domNode = createDomNode(child, cache, styleCache);
+      const domNode = createDomNode(child, cache);
       elem.appendChild(domNode);
     }
   }
@@ -67,9 +75,8 @@ const createDomNode = (hdNode, cache, styleCache) => {
 
   component.specialSetup(elem, hdNode);
 
-  // Populate caches
+  // Populate the cache
 
-  styleCache[key] = style;
   cache[key] = { name, tag, element: elem };
 
   return elem;
@@ -92,42 +99,33 @@ function saveAndRestoreScrollPositions() {
   });
 }
 
-// Updates the global element cache and style cache with the given
-// cache objects.
-const updateCaches = (cache, styleCache) => {
-  // Repopulate the element cache.
+// Updates the global element cache with the given cache object.
+const updateCache = (cache) => {
   for (const key in cache) {
     if (Object.prototype.hasOwnProperty.call(cache, key)) {
       elementCache[key] = cache[key];
     }
   }
-
-  // Repopulate the style cache.
-  for (const key in styleCache) {
-    if (Object.prototype.hasOwnProperty.call(styleCache, key)) {
-      updateStyle(key, styleCache[key]);
-    }
-  }
 };
 
 // Replaces the DOM body with a new DOM that is created from the given
-// Hyperdiv dom structure.
-const setRootDom = (dom) => {
-  // First, clear the existing element cache, plugin cache, and style
-  // cache.
+// Hyperdiv dom structure, styled by the given style classes.
+const setRootDom = (dom, styleClasses) => {
+  // First, clear the existing element cache, plugin cache, and
+  // styles.
   clearPluginCache();
   elementCache = {};
   removeAllStyles();
+  defineStyleClasses(styleClasses);
 
-  // Create the root dom node, which will populate the `cache` and
-  // `styleCache` with cache entries.
+  // Create the root dom node, which will populate the `cache` with
+  // cache entries.
   const cache = {};
-  const styleCache = {};
 
-  const rootNode = createDomNode(dom, cache, styleCache);
+  const rootNode = createDomNode(dom, cache);
 
-  // Update the global caches
-  updateCaches(cache, styleCache);
+  // Update the global cache
+  updateCache(cache);
 
   // Saves the current scroll positions and restores them after a timeout,
   // after the dom has been updated with the new root.
@@ -177,12 +175,10 @@ const clearStyles = (nodes) => {
 // Applies an incoming diff to the DOM.
 const applyDiff = (diff) => {
   const cache = {};
-  const styleCache = {};
 
   for (const key of Object.keys(diff)) {
     const propDiff = diff[key].props;
     const childrenDiff = diff[key].children;
-    const styleDiff = diff[key].style;
     const { element, name, tag } = elementCache[key];
 
     // Update changed props
@@ -205,13 +201,13 @@ const applyDiff = (diff) => {
 
           if (startIndex === element.childNodes.length) {
             for (const node of nodesToInsert) {
-              const dom = createDomNode(node, cache, styleCache);
+              const dom = createDomNode(node, cache);
               element.appendChild(dom);
             }
           } else {
             const sentinelNode = element.childNodes[startIndex];
             for (const node of nodesToInsert) {
-              const dom = createDomNode(node, cache, styleCache);
+              const dom = createDomNode(node, cache);
               element.insertBefore(dom, sentinelNode);
             }
           }
@@ -230,16 +226,34 @@ const applyDiff = (diff) => {
 
           clearStyles(removedElements);
           clearCache(removedElements);
+        } else if (cmd === "move") {
+          const fromIndex = chunk[1];
+          const toIndex = chunk[2];
+
+          // `toIndex` indexes the children list without the moved
+          // node, so skip over the node when it precedes the target.
+          const node = element.childNodes[fromIndex];
+          const sentinelNode =
+            element.childNodes[toIndex < fromIndex ? toIndex : toIndex + 1] ||
+            null;
+
+          // `moveBefore` preserves the state of the moved node, like
+          // focus, where supported.
+          if (element.moveBefore) {
+            element.moveBefore(node, sentinelNode);
+          } else {
+            element.insertBefore(node, sentinelNode);
+          }
         }
       }
     }
 
-    // Update the global caches.
-    updateCaches(cache, styleCache);
+    // Update the global cache.
+    updateCache(cache);
 
-    // Update changed styles.
-    if (styleDiff !== undefined) {
-      updateStyle(key, styleDiff);
+    // Update the changed style class.
+    if ("styleClass" in diff[key]) {
+      setStyleClass(key, element, diff[key].styleClass);
     }
   }
 };
@@ -249,10 +263,14 @@ websocket.setInitialUpdatesCallback(getInitialUpdates);
 websocket.start();
 
 websocket.on("message", (message) => {
-  if (message.diff) {
-    applyDiff(message.diff);
-  } else if (message.dom) {
-    setRootDom(message.dom);
+  if (message.dom) {
+    setRootDom(message.dom, message.styleClasses);
+  } else {
+    defineStyleClasses(message.styleClasses, message.derivedStyleClasses);
+    if (message.diff) {
+      applyDiff(message.diff);
+    }
+    releaseStyleClasses(message.releasedStyleClasses);
   }
 
   if (message.singletons) {
@@ -1,9 +1,55 @@
 import EventBus from "./event-bus.js";
+import { CompactDecoder } from "./compact.js";
 
 function sleep(ms) {
   return new Promise((resolve) => setTimeout(resolve, ms));
 }
 
+/* Decompresses the compressed messages received on a connection. The
+ * server compresses the messages of a connection as a single zlib
+ * stream, flushed at the end of each message, so each message is
+ * compressed in the context of the previous ones. Each binary frame
+ * holds the length of the decompressed message, as a 4-byte
+ * big-endian integer, followed by the next chunk of the stream. */
+class MessageInflater {
+  constructor() {
+    const stream = new DecompressionStream("deflate");
+    this.writer = stream.writable.getWriter();
+    this.reader = stream.readable.getReader();
+    this.textDecoder = new TextDecoder();
+  }
+
+  /* Returns the JSON text of the message in the given binary frame.
+   * Must be called in the order the frames were received. */
+  async inflate(buffer) {
+    const length = new DataView(buffer).getUint32(0);
+    // The write resolves only once its output is read, below.
+    this.writer.write(new Uint8Array(buffer, 4)).catch(() => {});
+
+    const bytes = new Uint8Array(length);
+    let offset = 0;
+    while (offset < length) {
+      const { value, done } = await this.reader.read();
+      if (done) {
+        throw new Error("The compressed message stream ended.");
+      }
+      bytes.set(value, offset);
+      offset += value.length;
+    }
+    return this.textDecoder.decode(bytes);
+  }
+}
+
+/* Returns the JSON text of a message received from the server. Text
+ * frames hold JSON. Binary frames hold compressed JSON, decompressed
+ * by the connection's `inflater`. */
+function readMessageData(data, inflater) {
+  if (typeof data === "string") {
+    return data;
+  }
+  return inflater.inflate(data);
+}
+
 /* A helper message queue that allows a reader to wait for messages
  * while concurrent writers add messages. When a message is added, the
  * reader is immediately unblocked. Currently it only supports a
@@ -74,6 +120,10 @@ class Websocket extends EventBus {
     this.websocket = null;
     this.connected = false;
     this.started = false;
+    // The sequence number of the last message received from the
+    // server. Sent back on reconnect, so the server can replay the
+    // messages this client missed while disconnected.
+    this.lastSeq = null;
     this.initialUpdatesCallback = () => [];
   }
 
@@ -85,10 +135,22 @@ class Websocket extends EventBus {
     const wsProtocol = window.location.protocol === "https:" ? "wss:" : "ws:";
     let url = `${wsProtocol}//${window.location.host}/ws`;
 
-    const params = [];
+    // Ask for the compact protocol. The server uses it only if it
+    // is enabled with `hd.run(compact_protocol=True)`.
+    const params = ["protocol=compact"];
+
+    // Ask for compressed messages, if the browser can decompress
+    // them. The server compresses messages only if compression is
+    // enabled with `hd.run(compression=...)`.
+    if (typeof DecompressionStream !== "undefined") {
+      params.push("compression=deflate");
+    }
 
     if (this.clientId) {
       params.push(`clientId=${this.clientId}`);
+      if (this.lastSeq !== null) {
+        params.push(`lastSeq=${this.lastSeq}`);
+      }
     }
 
     // Attach "initial updates" as query parameters to the websocket
@@ -106,9 +168,7 @@ class Websocket extends EventBus {
       params.push(`updates=${encodedUpdates}`);
     }
 
-    if (params.length > 0) {
-      url += "?" + params.join("&");
-    }
+    url += "?" + params.join("&");
 
     return url;
   }
@@ -126,15 +186,33 @@ class Websocket extends EventBus {
       }
       const url = this.makeWebsocketUrl();
       this.websocket = new WebSocket(url);
+      this.websocket.binaryType = "arraybuffer";
+      const decoder = new CompactDecoder();
+      const inflater =
+        typeof DecompressionStream !== "undefined"
+          ? new MessageInflater()
+          : null;
+      // Compressed messages are decompressed asynchronously. Messages
+      // are handled in a promise chain so they are handled in the
+      // order they were received.
+      let received = Promise.resolve();
       this.websocket.addEventListener("open", () => {
         resolve();
       });
       this.websocket.addEventListener("message", (wsMessage) => {
-        const message = JSON.parse(wsMessage.data);
-        if ("clientId" in message) {
-          this.clientId = message.clientId;
-        }
-        this.dispatch("message", message);
+        received = received
+          .then(() => readMessageData(wsMessage.data, inflater))
+          .then((data) => {
+            const message = decoder.decodeMessage(JSON.parse(data));
+            if ("clientId" in message) {
+              this.clientId = message.clientId;
+            }
+            if ("seq" in message) {
+              this.lastSeq = message.seq;
+            }
+            this.dispatch("message", message);
+          })
+          .catch((e) => console.error("Failed to handle message", e));
       });
       // TODO: for connections that open successfully, the error event
       // can be used to immediately detect when the connection dies --
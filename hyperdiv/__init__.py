@@ -1,8 +1,11 @@
 from .main import run
 from .debug import logger
 from .cache import cached
+from .shared_cache import shared_cache, invalidate_shared_cache
 from .index_page import index_page
 from .equalities import register_equality
+from .hashers import register_hasher
+from .encoding import set_json_encoder
 from .component_mixins import Boxy, Styled, Interactive, Slottable, Togglable
 from .design_tokens import (
     Spacing,
@@ -1,4 +1,7 @@
 import time
+import uuid
+import pickle
+from collections import deque, Counter
 from queue import Queue, Empty
 import traceback
 import threading
@@ -14,6 +17,7 @@ from .frame import (
     UIUpdatesFrame,
 )
 from .ui_prop_state import UIPropState
+from .ui_update_queue import UIUpdateQueue
 from .debug import (
     PROFILE_RENDER,
     PROFILE_DIFF,
@@ -33,26 +37,57 @@ from .ui_singleton import SingletonCollector
 class AppRunner:
     """
     Manages the repeated running of the application, and holds on to
-    the global prop state, for a user session. Corresponds 1 to 1 with
-    a websocket connection.
+    the global prop state, for a user session. Usually corresponds 1
+    to 1 with a websocket connection. When the connection drops, the
+    runner can be detached and later attached to the client's new
+    connection, preserving the session.
     """
 
+    # The number of most recently sent messages kept around, to be
+    # replayed to a reconnecting client that missed them.
+    replay_buffer_size = 32
+
     def __init__(
         self,
         connection,
         task_runtime,
         app_function,
         initial_ui_updates,
+        scheduler=None,
+        state_gc_runs=None,
     ):
-        # The websocket connection
+        # The websocket connection. `None` while the runner is
+        # detached.
         self.connection = connection
+        # The connection passed to `attach`, until the internal
+        # thread attaches it. See `complete_attach`.
+        self.attaching_connection = None
+        # Guards `connection`, `attaching_connection`, `seq` and
+        # `sent_messages`, which are accessed by both the internal
+        # thread and the ioloop thread.
+        self.connection_lock = threading.Lock()
+        # The sequence number of the last message sent to the
+        # browser.
+        self.seq = 0
+        # The most recently sent messages, including messages sent
+        # while detached.
+        self.sent_messages = deque(maxlen=AppRunner.replay_buffer_size)
+        # Set when the browser holds a DOM that can't be brought up to
+        # date by replaying messages, so the full DOM has to be sent
+        # on the next run.
+        self.resync_requested = False
+        # Set to the `(connection, last_seq)` of the last attach
+        # request taken off the input queue.
+        self.pending_attach = None
         # A hyperdiv.task_runtime.TaskRuntime instance
         self.task_runtime = task_runtime
         # The user app
         self.app_function = cached_app(app_function)
 
-        # The cache managing @cached and @cached_app functions
-        self.cache = Cache()
+        # The cache managing @cached and @cached_app functions. The
+        # per-function hit, miss, and eviction counters of @cached
+        # functions are in `self.cache.stats`.
+        self.cache = Cache(pinned_keys=[self.app_function.cache_key])
 
         # The root container computed on the previous run, used when
         # calculating the diff of the most recent run
@@ -77,11 +112,37 @@ class AppRunner:
         # The queue receiving prop updates from the browser (or
         # internally from simulated events), or mutations from tasks.
         self.input_queue = Queue()
+        # The number of items taken off `input_queue` by the current
+        # `run_step`, marked done when the step finishes.
+        self.num_taken_items = 0
 
         # An internal cache of updates previously taken off
         # `input_queue` but not yet ready to be processed. Will be
         # processed on the next run.
-        self.ui_updates = []
+        self.ui_updates = UIUpdateQueue(self.is_event_prop)
+
+        # Counters of internal events, for performance monitoring:
+        # * runs, messages: The number of batches of updates that ran
+        #   the app, and the number of messages sent to the browser.
+        # * runs_saved, messages_saved: The runs and messages saved by
+        #   running UI updates and task mutations together.
+        # * ui_updates_coalesced: See `UIUpdateQueue`.
+        # * task_mutation_batches: The number of batches of task
+        #   mutations taken off the input queue.
+        # * state_gc_sweeps, state_gc_keys: The number of garbage
+        #   collection sweeps, and the number of keys whose state they
+        #   dropped. See `collect_garbage`.
+        self.stats = Counter()
+
+        # If set, the state of components that have not been rendered
+        # in the last `state_gc_runs` runs of the app is dropped. See
+        # `collect_garbage`.
+        self.state_gc_runs = state_gc_runs
+        # The keys rendered in the current generation of
+        # `state_gc_runs` runs, and in the previous generation.
+        self.gc_generation = set()
+        self.gc_previous_generation = set()
+        self.gc_generation_runs = 0
 
         # The run number of the current run. Increments by 1 with
         # every run.
@@ -94,25 +155,67 @@ class AppRunner:
             (lifecycle._key, "app_started", True)
         ]
 
+        # Whether the singletons have been added to the state, which
+        # happens on the 1st frame.
+        self.initialized = False
+
+        # Identifies the session's snapshot in a
+        # hyperdiv.hibernation.HibernationStore.
+        self.session_id = uuid.uuid4().hex
+        # The time of the most recent input, used to detect idle
+        # sessions.
+        self.last_input_time = time.monotonic()
+        # Whether the session's state is hibernated in
+        # `hibernation_store`, and released from memory.
+        self.hibernated = False
+        self.hibernation_store = None
+        # Set to a HibernationStore when a hibernation request is
+        # taken off the input queue.
+        self.hibernation_request = None
+        # The number of task functions currently running. A session
+        # with running tasks is not hibernated.
+        self.active_tasks = 0
+        self.tasks_lock = threading.Lock()
+
+        # A hyperdiv.session_scheduler.SessionScheduler instance. If
+        # given, the runner doesn't own a thread. Instead, it is
+        # scheduled on the scheduler's shared worker threads whenever
+        # it has input to process.
+        self.scheduler = scheduler
+        # Whether the runner is currently in the scheduler's ready
+        # queue, or being processed by a worker.
+        self.scheduled = False
+        self.schedule_lock = threading.Lock()
+        # Set when the runner exits, either because stop() was called
+        # or because of an uncaught exception.
+        self.done = threading.Event()
+
         # The core thread processing the input queue and running the
-        # application.
-        self.thread = threading.Thread(target=self.run_loop_wrapper)
+        # application, when not using a scheduler.
+        self.thread = (
+            None if scheduler else threading.Thread(target=self.run_loop_wrapper)
+        )
 
     def start(self):
         """
         Start the internal thread, which starts processing the queue.
         """
-        self.thread.start()
+        if self.thread:
+            self.thread.start()
         self.enqueue_ui_updates(self.initial_ui_updates)
 
-    def process_queue(self, timeout=1):
+    def process_queue(self, timeout=1, block=True):
         """
         Called only by the internal thread.
 
         Takes updates from the input queue and returns them. If
         updates clash on (key, prop_name), only the first is returned,
         and the rest are saved in `self.ui_updates` to be processed on
-        subsequent runs.
+        subsequent runs. Clashing updates to value props are coalesced
+        (see `UIUpdateQueue`).
+
+        If `block` is `False`, it returns immediately when the queue
+        is empty.
         """
         task_mutations = []
         stop = False
@@ -120,12 +223,21 @@ class AppRunner:
         def process(elem):
             nonlocal stop
 
+            self.num_taken_items += 1
+
             if elem[0] == "task_mutations":
                 task_mutations.extend(elem[1])
+                self.stats["task_mutation_batches"] += 1
             elif elem[0] in "ui_updates":
-                self.ui_updates.extend(elem[1])
+                self.stats["ui_updates_coalesced"] += self.ui_updates.extend(elem[1])
             elif elem[0] == "stop":
                 stop = True
+            elif elem[0] == "resync":
+                self.resync_requested = True
+            elif elem[0] == "attach":
+                self.pending_attach = elem[1:]
+            elif elem[0] == "hibernate":
+                self.hibernation_request = elem[1]
             else:
                 raise Exception(f"Malformed update: {elem}")
 
@@ -133,7 +245,7 @@ class AppRunner:
             # Block on an empty queue only if we don't have any
             # previous updates saved in `self.ui_updates`.
             if not self.ui_updates:
-                process(self.input_queue.get(timeout=timeout))
+                process(self.input_queue.get(block=block, timeout=timeout))
             while True:
                 try:
                     process(self.input_queue.get_nowait())
@@ -148,17 +260,20 @@ class AppRunner:
         # We apply updates in batches disjoint on (key, prop_name). We
         # assume it's ok to apply multiple updates in the same frame
         # as long as we're not updating the same prop multiple times.
+        return stop, self.ui_updates.take_batch(), task_mutations
 
-        check_set = set()
-        ui_updates = []
-
-        for (key, prop_name, value) in list(self.ui_updates):
-            if (key, prop_name) not in check_set:
-                check_set.add((key, prop_name))
-                ui_updates.append((key, prop_name, value))
-                self.ui_updates.remove((key, prop_name, value))
+    def is_event_prop(self, key, prop_name):
+        """
+        Called only by the internal thread.
 
-        return stop, ui_updates, task_mutations
+        Whether the given prop is an event prop. Props that don't
+        exist in the state are assumed to be event props, so their
+        updates are never coalesced.
+        """
+        try:
+            return self.state.peek_prop(key, prop_name).is_event_prop
+        except KeyError:
+            return True
 
     def get_storage(self, key, default=None):
         """
@@ -185,8 +300,56 @@ class AppRunner:
                 self.app_function()
 
         logger.debug(f"Component count: {AppRunnerFrame.current().component_count}")
+
+        if self.state_gc_runs:
+            self.collect_garbage(frame)
+
         return root_container
 
+    def collect_garbage(self, frame):
+        """
+        Called only by the internal thread.
+
+        Drops the state of the components that have not been rendered
+        for at least `state_gc_runs` runs of the app, like the rows of
+        table pages that are no longer shown, so that long sessions
+        don't accumulate state.
+
+        Runs are grouped in generations of `state_gc_runs` runs. At the
+        end of a generation, the keys rendered in the previous
+        generation, but not in this one, are swept. The fixed keys of
+        singletons and @component(global_state) are never rendered in
+        this sense, so they are never swept, and neither are the keys
+        of components marked with `Component.persist()`. Sweeps are
+        postponed while tasks are running, since tasks may update the
+        state of components that are no longer rendered.
+        """
+        self.gc_generation.update(frame.seen_keys)
+        self.gc_generation_runs += 1
+        if self.gc_generation_runs < self.state_gc_runs:
+            return
+        with self.tasks_lock:
+            if self.active_tasks > 0:
+                return
+
+        swept_keys = (
+            self.gc_previous_generation
+            - self.gc_generation
+            - self.state.persistent_keys
+        )
+        self.gc_previous_generation = self.gc_generation
+        self.gc_generation = set()
+        self.gc_generation_runs = 0
+
+        if swept_keys:
+            self.state.sweep(swept_keys)
+            self.ui_prop_state.sweep(swept_keys)
+            self.cache.eject_entries_for_keys(swept_keys)
+            logger.debug(f"Dropped the state of {len(swept_keys)} components.")
+
+        self.stats["state_gc_sweeps"] += 1
+        self.stats["state_gc_keys"] += len(swept_keys)
+
     def apply_ui_updates(self, ui_updates):
         """
         Called only by the internal thread.
@@ -237,7 +400,9 @@ class AppRunner:
         with timing("Set UI Prop Values"):
             if root_container:
                 self.ui_prop_state.set_prop_values_from_component(root_container)
+                self.ui_prop_state.set_child_keys(root_container)
             elif diff:
+                self.ui_prop_state.release_components(diff.deleted)
                 self.ui_prop_state.set_prop_values_from_diff(diff)
 
         with timing("Render", profile=PROFILE_RENDER):
@@ -256,6 +421,21 @@ class AppRunner:
                 output.setdefault("singletons", dict())
                 output["singletons"][singleton._name] = singleton.render()
 
+        # Send the rules of the style classes newly used by the
+        # rendered components, and release the classes no longer used
+
+        (
+            classes,
+            derived_classes,
+            released_classes,
+        ) = self.ui_prop_state.take_new_style_classes()
+        if classes:
+            output["styleClasses"] = classes
+        if derived_classes:
+            output["derivedStyleClasses"] = derived_classes
+        if released_classes:
+            output["releasedStyleClasses"] = released_classes
+
         # Render commands
 
         if len(self.pending_commands) > 0:
@@ -268,21 +448,56 @@ class AppRunner:
         if len(output) > 0:
             if PRINT_OUTPUT:
                 logger.debug(json.dumps(output, indent=2))
-            self.connection.send(output)
+            self.send(output)
+
+    def send(self, output):
+        """
+        Called only by the internal thread.
+
+        Numbers the message, remembers it for replay, and sends it on
+        the connection, if the runner is attached.
+        """
+        with self.connection_lock:
+            self.seq += 1
+            self.stats["messages"] += 1
+            output["seq"] = self.seq
+            self.sent_messages.append(output)
+            if self.connection:
+                self.connection.send(output)
+
+    def resync(self):
+        """
+        Called only by the internal thread.
 
-    def diff_and_reply(self, frame, root_container):
+        Sends the full DOM last rendered, and all the singletons, to a
+        browser whose DOM is out of sync.
+        """
+        self.resync_requested = False
+        # Forget what was sent previously, so that everything is
+        # rendered again.
+        self.ui_prop_state = UIPropState(self.state)
+        with RenderFrame(self) as render_frame:
+            self.render_and_reply(
+                render_frame, root_container=self.previous_root_container
+            )
+
+    def diff_and_reply(self, frame, root_container, components=None):
         """
         Called only by the internal thread.
 
         Sends a reply with the given root container (or a diff if a
-        previous container exists to diff against).
+        previous container exists to diff against). `components` holds
+        the components of the root container's tree by key, so the
+        diff can skip the unchanged subtrees.
         """
         dom = None
         dom_diff = None
 
         if self.previous_root_container:
             with timing("Diff", profile=PROFILE_DIFF):
-                dom_diff = diff(self.previous_root_container, root_container)
+                dom_diff = diff(
+                    self.previous_root_container, root_container, components
+                )
         else:
             dom = root_container
 
@@ -315,6 +530,9 @@ class AppRunner:
         default values after running the user function.
         """
         root_container = None
+        # The components created by the runs below, by key. The
+        # components of the last run's tree are among them.
+        components = dict()
 
         # We run the user app in the context of the given mutations.
         with AppRunnerFrame(self, prev_frame_mutations=mutations) as frame:
@@ -322,6 +540,7 @@ class AppRunner:
             if run_function:
                 logger.debug(f"Dirty deps: {self.app_function.get_dirty_deps()}")
                 root_container = self.run_user_app(frame)
+                components.update(frame.components)
 
         if event_mutations:
             with ResetUIEventsFrame(self) as reset_frame:
@@ -341,9 +560,10 @@ class AppRunner:
                 if run_function:
                     logger.debug(f"Dirty deps: {self.app_function.get_dirty_deps()}")
                     root_container = self.run_user_app(frame)
+                    components.update(frame.components)
             if not run_function:
                 with RenderFrame(self) as render_frame:
-                    self.diff_and_reply(render_frame, root_container)
+                    self.diff_and_reply(render_frame, root_container, components)
                     break
 
             num_frames += 1
@@ -353,6 +573,186 @@ class AppRunner:
                 )
         return num_frames
 
+    def initialize(self):
+        """
+        Called only by the internal thread.
+
+        Runs the 1st frame, before any updates are processed.
+        """
+        with StateAccessFrame(self):
+            # Add these 'singletons' to the state, because the
+            # UI will update them immediately, and their props
+            # need to be added to state in order to be
+            # updated.
+            SingletonCollector.create_singletons()
+        self.initialized = True
+
+    def hibernate(self, store):
+        """
+        Called only by the internal thread.
+
+        Saves the mutated prop values and the storage of the session
+        to `store`, and releases the state, cache, and trees held in
+        memory. The values of unmutated props are not saved, since
+        they are recomputed by re-running the app.
+
+        Returns `False` if the session can't be hibernated.
+        """
+        with self.tasks_lock:
+            if self.active_tasks > 0:
+                return False
+        try:
+            snapshot = pickle.dumps(
+                dict(values=self.state.get_mutated_values(), storage=self.storage)
+            )
+        except Exception as e:
+            logger.debug(f"Session state cannot be hibernated: {e}")
+            return False
+
+        try:
+            store.put(self.session_id, snapshot)
+        except RuntimeError as e:
+            # The store is closed when the server shuts down.
+            logger.debug(f"Session state cannot be hibernated: {e}")
+            return False
+        self.hibernation_store = store
+        self.hibernated = True
+
+        self.initialized = False
+        self.state = ApplicationState()
+        self.ui_prop_state = UIPropState(self.state)
+        self.cache = Cache(
+            pinned_keys=[self.app_function.cache_key], stats=self.cache.stats
+        )
+        self.storage = dict()
+        self.previous_root_container = None
+        self.gc_generation = set()
+        self.gc_previous_generation = set()
+        self.gc_generation_runs = 0
+        with self.connection_lock:
+            self.sent_messages.clear()
+
+        logger.debug(f"Session {self.session_id} hibernated.")
+        return True
+
+    def rehydrate(self):
+        """
+        Called only by the internal thread.
+
+        Restores the state of a hibernated session and re-runs the
+        app, sending the full dom to the browser. If the snapshot is
+        gone, because the store was closed, the session restarts from
+        its initial state.
+        """
+        snapshot = self.hibernation_store.take(self.session_id)
+        self.hibernated = False
+        self.hibernation_store = None
+        if snapshot is None:
+            logger.warning(
+                f"The snapshot of session {self.session_id} is gone. "
+                "The session restarts from its initial state."
+            )
+            snapshot = dict(values=dict(), storage=dict())
+        else:
+            snapshot = pickle.loads(snapshot)
+
+        self.state = ApplicationState(restored_values=snapshot["values"])
+        self.ui_prop_state = UIPropState(self.state)
+        self.storage = snapshot["storage"]
+        # The full dom sent by the run below brings an out-of-sync
+        # browser up to date.
+        self.resync_requested = False
+
+        self.initialize()
+        self.run(set())
+        logger.debug(f"Session {self.session_id} rehydrated.")
+
+    def run_step(self, timeout=1, block=True):
+        """
+        Called only by the internal thread.
+
+        Grabs one batch of updates from the queue and runs the app in
+        the context of those updates. Returns `True` if the runner
+        should exit.
+        """
+        try:
+            # Grab updates from the queue.
+            return self.run_batch(*self.process_queue(timeout=timeout, block=block))
+        finally:
+            # Mark the items taken off the queue as processed.
+            for _ in range(self.num_taken_items):
+                self.input_queue.task_done()
+            self.num_taken_items = 0
+
+    def run_batch(self, stop, ui_updates, task_mutations):
+        """
+        Called only by the internal thread.
+
+        Runs the app in the context of a batch of updates returned
+        by `process_queue`. Returns `True` if the runner should exit.
+        """
+        if self.pending_attach:
+            self.complete_attach(*self.pending_attach)
+
+        if self.hibernated:
+            if stop:
+                self.hibernation_store.delete(self.session_id)
+                self.hibernated = False
+                return stop
+            if ui_updates or task_mutations or self.resync_requested:
+                self.rehydrate()
+
+        if self.resync_requested:
+            self.resync()
+
+        if ui_updates or task_mutations:
+            self.run_id += 1
+
+            logger.debug(
+                colored(
+                    f"######## Run {self.run_id} ########",
+                    "magenta",
+                    attrs=["bold"],
+                )
+            )
+            with timing(f"Run {self.run_id}"):
+                mutations = set(task_mutations)
+                ui_event_mutations = None
+                # First apply the UI updates
+                if ui_updates:
+                    (
+                        ui_mutations,
+                        ui_event_mutations,
+                    ) = self.apply_ui_updates(ui_updates)
+                    mutations.update(ui_mutations)
+                # Then run the app once in the context of both the UI
+                # and task mutations, producing a single reply.
+                seq = self.seq
+                num_frames = self.run(mutations, event_mutations=ui_event_mutations)
+                logger.debug(f"{num_frames} frames ran the app.")
+
+                self.stats["runs"] += 1
+                if ui_updates and task_mutations:
+                    # Running the app separately for the UI updates
+                    # and the task mutations would have taken one
+                    # more run, and possibly sent one more message.
+                    self.stats["runs_saved"] += 1
+                    if self.seq > seq:
+                        self.stats["messages_saved"] += 1
+
+        if self.hibernation_request:
+            store = self.hibernation_request
+            self.hibernation_request = None
+            if (
+                not self.hibernated
+                and not stop
+                and self.input_queue.empty()
+                and not self.ui_updates
+            ):
+                self.hibernate(store)
+
+        return stop
+
     def run_loop(self):
         """
         Called only by the internal thread.
@@ -362,52 +762,28 @@ class AppRunner:
         the corresponding websocket is connected. When the websocket
         closes, it calls `AppRunner.stop()`, causing the run loop to
         exit.
+
+        The thread also exits when the session hibernates, in which
+        case `run_loop` returns `True`, and is restarted by
+        `put_input` when new input arrives.
         """
 
         # 1st frame
-        with StateAccessFrame(self):
-            # Add these 'singletons' to the state, because the
-            # UI will update them immediately, and their props
-            # need to be added to state in order to be
-            # updated.
-            SingletonCollector.create_singletons()
+        if not self.hibernated:
+            self.initialize()
 
         # This loop runs indefinitely, until stop() is called, or it
         # exits due to an uncaught exception in user code.
         while True:
-            # Grab updates from the queue.
-            stop, ui_updates, task_mutations = self.process_queue(timeout=1)
-
-            if ui_updates or task_mutations:
-                self.run_id += 1
-
-                logger.debug(
-                    colored(
-                        f"######## Run {self.run_id} ########",
-                        "magenta",
-                        attrs=["bold"],
-                    )
-                )
-                with timing(f"Run {self.run_id}"):
-                    # Run the app in the context of ui updates
-                    if ui_updates:
-                        # First apply the UI updates
-                        (
-                            ui_mutations,
-                            ui_event_mutations,
-                        ) = self.apply_ui_updates(ui_updates)
-                        # Then run the app in the context of those
-                        # mutations
-                        num_frames = self.run(
-                            ui_mutations, event_mutations=ui_event_mutations
-                        )
-                        logger.debug(f"{num_frames} frames ran the app.")
-                    # Run the app in the context of task mutations
-                    if task_mutations:
-                        self.run(task_mutations)
             # Exit the thread
-            if stop:
-                break
+            if self.run_step(timeout=1):
+                return False
+
+            if self.hibernated:
+                with self.schedule_lock:
+                    if self.input_queue.empty():
+                        self.thread = None
+                        return True
 
     def run_loop_wrapper(self):
         """
@@ -416,17 +792,57 @@ class AppRunner:
         exceptions, prints a stacktrace, and gracefully exits the
         thread.
         """
+        hibernated = False
         try:
-            self.run_loop()
+            hibernated = self.run_loop()
         except Stop:
             pass
         except Exception as e:
-            message = (
-                "INTERNAL ERROR!\n"
-                + dedent("".join(traceback.format_tb(e.__traceback__)))
-                + f"{e.__class__.__name__}: {e}"
-            )
-            print(colored(message, "red"))
+            self.print_internal_error(e)
+        finally:
+            if not hibernated:
+                self.done.set()
+
+    def run_scheduled(self):
+        """
+        Called by a scheduler worker thread, which at this point plays
+        the role of the internal thread.
+
+        Processes one batch of updates and re-schedules the runner if
+        more updates are pending. Like `run_loop_wrapper`, it catches
+        unhandled exceptions, prints a stacktrace, and causes the
+        runner to exit.
+        """
+        try:
+            if not self.initialized and not self.hibernated:
+                self.initialize()
+            stop = self.run_step(block=False)
+        except Stop:
+            stop = True
+        except Exception as e:
+            self.print_internal_error(e)
+            stop = True
+
+        if stop:
+            # `self.scheduled` stays `True`, so the runner is never
+            # scheduled again.
+            self.done.set()
+            return
+
+        with self.schedule_lock:
+            if self.input_queue.empty() and not self.ui_updates:
+                self.scheduled = False
+                return
+
+        self.scheduler.schedule(self)
+
+    def print_internal_error(self, e):
+        message = (
+            "INTERNAL ERROR!\n"
+            + dedent("".join(traceback.format_tb(e.__traceback__)))
+            + f"{e.__class__.__name__}: {e}"
+        )
+        print(colored(message, "red"))
 
     def _internal_sync(self):
         """
@@ -442,7 +858,12 @@ class AppRunner:
         tasks or simulating ui events.
         """
         while True:
-            if self.input_queue.qsize() == 0 and self.task_runtime.is_empty():
+            if (
+                self.input_queue.unfinished_tasks == 0
+                and not self.ui_updates
+                and not (self.scheduler and self.scheduled)
+                and self.task_runtime.is_empty()
+            ):
                 return
             time.sleep(0.01)
 
@@ -455,13 +876,123 @@ class AppRunner:
         Enqueue a stop message, which will cause the internal thread to exit.
         """
         self.enqueue_ui_updates([(lifecycle._key, "app_stopped", True)])
-        self.input_queue.put(("stop",))
+        self.put_input(("stop",))
+
+    def detach(self):
+        """
+        Detaches the runner from its connection. The runner keeps
+        running, and messages sent while detached are kept for replay
+        by `attach`.
+        """
+        with self.connection_lock:
+            self.connection = None
+            self.attaching_connection = None
+
+    def attach(self, connection, last_seq, ui_updates):
+        """
+        Attaches the runner to a new connection from the same client.
+
+        `last_seq` is the sequence number of the last message the
+        browser received. The connection is attached by the internal
+        thread, which replays the messages the browser missed, or
+        sends the full DOM. See `complete_attach`. `ui_updates` are
+        the initial updates sent by the browser on reconnect.
+        """
+        with self.connection_lock:
+            self.attaching_connection = connection
+        self.put_input(("attach", connection, last_seq))
+        if ui_updates:
+            self.enqueue_ui_updates(ui_updates)
+
+    def complete_attach(self, connection, last_seq):
+        """
+        Called only by the internal thread.
+
+        Attaches the connection passed to `attach`, unless it was
+        detached in the meantime. If the browser missed messages that
+        are still in the replay buffer, they are replayed, bringing
+        the browser up to date. They are encoded on this thread, like
+        any other message. Otherwise, the full DOM is sent.
+        """
+        self.pending_attach = None
+        with self.connection_lock:
+            if self.attaching_connection is not connection:
+                return
+            self.attaching_connection = None
+            self.connection = connection
+            missed = [m for m in self.sent_messages if m["seq"] > (last_seq or 0)]
+            in_sync = last_seq is not None and (
+                last_seq == self.seq or (missed and missed[0]["seq"] == last_seq + 1)
+            )
+            if in_sync:
+                for message in missed:
+                    connection.send(message)
+
+        if not in_sync:
+            self.resync_requested = True
 
     def wait(self):
         """
         Wait on the internal thread to exit.
         """
-        self.thread.join()
+        self.done.wait()
+
+    def put_input(self, item):
+        """
+        Adds `item` to the input queue. When using a scheduler, it
+        also schedules the runner, unless it is already scheduled.
+        """
+        self.input_queue.put(item)
+        if item[0] != "hibernate":
+            self.last_input_time = time.monotonic()
+
+        if not self.scheduler:
+            with self.schedule_lock:
+                # Restart the thread if it exited on hibernation.
+                if self.thread is None and not self.done.is_set():
+                    self.thread = threading.Thread(target=self.run_loop_wrapper)
+                    self.thread.start()
+            return
+
+        with self.schedule_lock:
+            if self.scheduled:
+                return
+            self.scheduled = True
+
+        self.scheduler.schedule(self)
+
+    def hibernate_if_idle(self, store, idle_timeout):
+        """
+        Requests the hibernation of the session into `store`, if it
+        hasn't received input for `idle_timeout` seconds.
+        """
+        if self.hibernated or self.done.is_set():
+            return
+        if time.monotonic() - self.last_input_time >= idle_timeout:
+            self.put_input(("hibernate", store))
+
+    def get_stats(self):
+        """
+        Returns a snapshot of the session's counters, in `runner`, and
+        of the hit, miss, and eviction counters of its cached
+        functions, by qualified name, in `cache`. Can be called from
+        any thread, while the session runs.
+        """
+        return dict(
+            runner=dict(self.stats),
+            cache={
+                qualname: dict(stats)
+                for qualname, stats in list(self.cache.stats.items())
+            },
+        )
+
+    def task_started(self):
+        with self.tasks_lock:
+            self.active_tasks += 1
+
+    def task_finished(self):
+        with self.tasks_lock:
+            self.active_tasks -= 1
 
     def enqueue_ui_updates(self, ui_updates):
         """
@@ -472,7 +1003,7 @@ class AppRunner:
         They can also be simulated UI events, triggered by user code
         via `self.trigger_event`.
         """
-        self.input_queue.put(
+        self.put_input(
             (
                 "ui_updates",
                 [
@@ -494,7 +1025,7 @@ class AppRunner:
         case the task mutated any props that the application function
         depends on.
         """
-        self.input_queue.put(("task_mutations", mutations))
+        self.put_input(("task_mutations", mutations))
 
     def trigger_event(self, prop, value):
         """
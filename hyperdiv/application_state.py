@@ -3,46 +3,238 @@ from .prop import StoredProp
 
 
 class ApplicationState:
-    """Holds persistent prop state."""
+    """Holds persistent prop state.
 
-    def __init__(self):
+    A component's props declared on its class are stored lazily: a
+    prop is stored only once it is initialized with a value other
+    than its default, or mutated. Until then, reads resolve to the
+    prop's shared `Prop.default_stored_prop()`, so the many props
+    that stay at their defaults, like most style props, cost no
+    per-component memory or per-frame work.
+    """
+
+    def __init__(self, restored_values=None):
+        # Maps keys to dicts of the stored props of the component at
+        # that key.
         self.state = dict()
+        # Maps the keys of components with lazily stored props to
+        # dicts of all the components' `Prop`s, by name.
+        self.prop_defs = dict()
         self.state_lock = threading.RLock()
+        # Maps (key, prop_name) to the mutated values of props
+        # restored from a hibernated session. A value is applied,
+        # and removed from this dict, when its prop is created.
+        self.restored_values = restored_values or dict()
+        # The keys of components whose props were created or changed
+        # since they were last diffed. See `hyperdiv.diff.Differ`.
+        self.dirty_keys = set()
+        # The keys of components whose props were created or changed
+        # since the renderings memoized by `UIPropState` were last
+        # checked. See `UIPropState.drop_stale_fragments`.
+        self.changed_keys = set()
+        # Maps the key of a component held in a prop, like a `style`
+        # part, to the keys of the components holding it. A change
+        # in the held component's props is a change in the holding
+        # component's prop.
+        self.component_holders = dict()
+        # The keys of components whose state is kept when they are
+        # no longer rendered. See `Component.persist()`.
+        self.persistent_keys = set()
+
+    def mark_dirty(self, key):
+        self.dirty_keys.add(key)
+        self.changed_keys.add(key)
+        holders = self.component_holders.get(key)
+        if holders:
+            self.dirty_keys.update(holders)
+            self.changed_keys.update(holders)
+
+    def take_changed_keys(self):
+        with self.state_lock:
+            changed_keys = self.changed_keys
+            self.changed_keys = set()
+            return changed_keys
+
+    def persist(self, key):
+        with self.state_lock:
+            self.persistent_keys.add(key)
+
+    def sweep(self, keys):
+        """
+        Drops the state of the components at `keys`, which are no
+        longer rendered. See `AppRunner.collect_garbage`.
+        """
+        with self.state_lock:
+            for key in keys:
+                self.state.pop(key, None)
+                self.prop_defs.pop(key, None)
+                self.component_holders.pop(key, None)
+            self.dirty_keys.difference_update(keys)
+            for held_key, holders in list(self.component_holders.items()):
+                holders.difference_update(keys)
+                if not holders:
+                    del self.component_holders[held_key]
+
+    def get_mutated_values(self):
+        """
+        Returns a dict mapping (key, prop_name) to the values of the
+        mutated props, including restored values that haven't yet
+        been applied.
+        """
+        with self.state_lock:
+            values = dict(self.restored_values)
+            for key, props in self.state.items():
+                for prop_name, stored_prop in props.items():
+                    if stored_prop.mutated and not stored_prop.is_event_prop:
+                        values[(key, prop_name)] = stored_prop.value
+            return values
+
+    def _materialize(self, key, prop_name):
+        """
+        Returns the stored prop with the given name, storing it at its
+        default value if it is not yet stored.
+        """
+        stored_props = self.state[key]
+        stored_prop = stored_props.get(prop_name)
+        if stored_prop is None:
+            prop = self.prop_defs.get(key, {})[prop_name]
+            stored_prop = StoredProp.create(key, prop)
+            stored_prop.init(prop.default_value)
+            stored_props[prop_name] = stored_prop
+        return stored_prop
 
     def _update(self, key, prop_name, value):
         with self.state_lock:
-            return self.state[key][prop_name].update(value)
+            updated = self._materialize(key, prop_name).update(value)
+            if updated:
+                self.mark_dirty(key)
+            return updated
 
     def _reset(self, key, prop_name):
         with self.state_lock:
-            prop = self.state[key][prop_name]
-            return prop.reset()
+            prop = self.state[key].get(prop_name)
+            if prop is None:
+                # The prop holds its default value and was never
+                # mutated.
+                return False
+            updated = prop.reset()
+            if updated:
+                self.mark_dirty(key)
+            return updated
 
     def _get(self, key, prop_name):
         with self.state_lock:
-            return self.state[key][prop_name].value
+            return self.peek_prop(key, prop_name).value
 
     def get_props(self, key):
+        """
+        Returns a dict of all the props of the component at `key`,
+        including default props that are not stored.
+        """
+        with self.state_lock:
+            stored_props = self.state[key]
+            prop_defs = self.prop_defs.get(key)
+            if prop_defs is None or len(stored_props) == len(prop_defs):
+                return stored_props
+            return {
+                prop_name: stored_props.get(prop_name) or prop.default_stored_prop()
+                for prop_name, prop in prop_defs.items()
+            }
+
+    def get_stored_props(self, key):
+        """
+        Returns a dict of the stored props of the component at `key`.
+        The props that are not stored have held their default values
+        since the component was created.
+        """
         with self.state_lock:
             return self.state[key]
 
     def get_prop(self, key, prop_name):
+        """
+        Returns the stored prop with the given name, storing it if
+        it is not yet stored.
+        """
+        with self.state_lock:
+            return self._materialize(key, prop_name)
+
+    def peek_prop(self, key, prop_name):
+        """
+        Like `get_prop`, but does not store the prop. If it is not
+        stored, returns its shared `Prop.default_stored_prop()`, which
+        must not be mutated.
+        """
         with self.state_lock:
-            return self.state[key][prop_name]
+            stored_prop = self.state[key].get(prop_name)
+            if stored_prop is None:
+                return self.prop_defs.get(key, {})[prop_name].default_stored_prop()
+            return stored_prop
 
     def has_prop(self, key, prop_name):
         with self.state_lock:
+            if prop_name in self.prop_defs.get(key, {}):
+                return True
             return prop_name in self.state.get(key, {})
 
-    def init_props(self, key, props_with_values):
+    def init_props(self, key, props_with_values, prop_defs=None):
+        """
+        Initializes the props of the component at `key` with the
+        given (prop, value) pairs. If `prop_defs`, a dict of all the
+        component's `Prop`s by name, is given, the props not in
+        `props_with_values` are initialized to their defaults, and are
+        stored lazily.
+        """
         with self.state_lock:
-            if key not in self.state:
-                self.state[key] = dict()
+            changed = False
+            stored_props = self.state.get(key)
+            if stored_props is None:
+                stored_props = self.state[key] = dict()
+                changed = True
+                if prop_defs is not None and self.restored_values:
+                    # Store the props with restored values.
+                    props_with_values = list(props_with_values)
+                    initialized = set(prop.name for prop, _ in props_with_values)
+                    for prop_name, prop in prop_defs.items():
+                        if (key, prop_name) in self.restored_values and (
+                            prop_name not in initialized
+                        ):
+                            props_with_values.append((prop, prop.default_value))
+
+            if prop_defs is not None:
+                self.prop_defs[key] = prop_defs
+                if stored_props:
+                    # Stored props that are no longer initialized with
+                    # a value return to their defaults.
+                    props_with_values = list(props_with_values)
+                    initialized = set(prop.name for prop, _ in props_with_values)
+                    for prop_name, stored_prop in stored_props.items():
+                        if prop_name not in initialized:
+                            props_with_values.append(
+                                (stored_prop.prop, stored_prop.prop.default_value)
+                            )
 
             for prop, init_value in props_with_values:
-                stored_prop = self.state[key].get(prop.name)
+                stored_prop = stored_props.get(prop.name)
                 if not stored_prop:
                     stored_prop = StoredProp.create(key, prop)
-                    self.state[key][prop.name] = stored_prop
-                stored_prop.init(init_value)
-            return self.state[key]
+                    stored_props[prop.name] = stored_prop
+                    stored_prop.init(init_value)
+                    restored_value = self.restored_values.pop(
+                        (key, prop.name), StoredProp.Unset
+                    )
+                    if restored_value is not StoredProp.Unset:
+                        stored_prop.value = restored_value
+                        stored_prop.mutated = True
+                    changed = True
+                elif stored_prop.init(init_value):
+                    changed = True
+
+                held_key = getattr(stored_prop.value, "_key", None)
+                if held_key is not None:
+                    self.component_holders.setdefault(held_key, set()).add(key)
+                    if held_key in self.dirty_keys:
+                        changed = True
+
+            if changed:
+                self.mark_dirty(key)
+            return stored_props
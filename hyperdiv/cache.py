@@ -1,6 +1,7 @@
+import time
 import traceback
+from collections import Counter, OrderedDict
 from functools import wraps
-from cachetools.keys import hashkey
 from textwrap import dedent
 from termcolor import colored
 from .frame import AppRunnerFrame
@@ -8,34 +9,171 @@ from .debug import timing
 from .collector import ShadowCollector
 from .component_keys import get_component_key
 from .component_base import Component
+from .hashers import content_hashkey
 from .exceptions import Stop
 
+# The default bounds of a session's `Cache`. The cache evicts its
+# least recently used entries when it holds more than
+# `max_cache_entries` entries, or more than `max_cache_bytes` bytes as
+# estimated by `estimate_entry_bytes`. Pinned entries don't count
+# toward `max_cache_bytes`.
+max_cache_entries = 10_000
+max_cache_bytes = 64 * 1024 * 1024
+
+# Rough per-object sizes used to estimate the memory held by a cache
+# entry.
+entry_bytes = 1000
+component_bytes = 1000
+dep_bytes = 150
+
+
+def estimate_entry_bytes(entry):
+    """
+    Estimates the memory held by a cache entry, from the number of
+    components it created and the number of its read dependencies.
+    Components created by nested cached calls are held by the nested
+    calls' entries, so they are not counted again.
+    """
+    return (
+        entry_bytes
+        + entry.get("num_components", len(entry["keys"])) * component_bytes
+        + len(entry["deps"]) * dep_bytes
+    )
+
+
+def get_qualname(cache_key):
+    """
+    Returns the qualified name of the function whose call produced
+    the entry with the given key.
+    """
+    return cache_key[0] if isinstance(cache_key, tuple) else cache_key
+
 
 class Cache:
-    NotFound = object()
+    """
+    Holds the results of `@cached` and `cached_app` calls, evicting
+    the least recently used entries when over its bounds. Entries
+    whose keys are in `pinned_keys`, like the `cached_app` entry, are
+    never evicted, and don't count toward `max_bytes`. A large app
+    would otherwise fill the budget, leaving no room for the entries
+    of its `@cached` calls.
+
+    `stats` maps the qualified name of each cached function to a
+    `Counter` of its `hits`, `misses`, `evictions`, and `build_time`,
+    the time in seconds spent re-running the function on misses.
+    """
 
-    def __init__(self):
-        self.cache = dict()
+    NotFound = object()
 
-    def put(self, key, value):
+    def __init__(
+        self,
+        max_entries=None,
+        max_bytes=None,
+        pinned_keys=(),
+        stats=None,
+    ):
+        self.max_entries = max_entries or max_cache_entries
+        self.max_bytes = max_bytes or max_cache_bytes
+        self.pinned_keys = set(pinned_keys)
+        self.stats = stats if stats is not None else dict()
+        # The entries, from least to most recently used.
+        self.cache = OrderedDict()
+        # The total estimated size of the entries that are not
+        # pinned.
+        self.num_bytes = 0
+        # Maps each (key, prop_name) read dependency to the set of
+        # keys of the entries that depend on it, so mutations eject
+        # the affected entries without scanning the cache.
+        self.dependents = dict()
+
+    def get_stats(self, cache_key):
+        qualname = get_qualname(cache_key)
+        stats = self.stats.get(qualname)
+        if stats is None:
+            stats = self.stats[qualname] = Counter()
+        return stats
+
+    def put(self, key, value, build_time=0):
+        if key in self.cache:
+            self.pop(key)
+        value["num_bytes"] = estimate_entry_bytes(value)
         self.cache[key] = value
+        if key not in self.pinned_keys:
+            self.num_bytes += value["num_bytes"]
+        for dep in value["deps"]:
+            cache_keys = self.dependents.get(dep)
+            if cache_keys is None:
+                self.dependents[dep] = {key}
+            else:
+                cache_keys.add(key)
+        self.get_stats(key)["build_time"] += build_time
+        self.evict()
 
     def get(self, key):
-        if key not in self.cache:
-            return Cache.NotFound
-        return self.cache[key]
+        """
+        Returns the entry with the given key, or `Cache.NotFound`,
+        counting a hit or a miss and marking the entry as recently
+        used.
+        """
+        entry = self.cache.get(key, Cache.NotFound)
+        if entry is Cache.NotFound:
+            self.get_stats(key)["misses"] += 1
+        else:
+            self.get_stats(key)["hits"] += 1
+            self.cache.move_to_end(key)
+        return entry
+
+    def peek(self, key):
+        """Like `get`, but counts nothing, and doesn't mark the entry."""
+        return self.cache.get(key, Cache.NotFound)
+
+    def pop(self, key):
+        entry = self.cache.pop(key)
+        if key not in self.pinned_keys:
+            self.num_bytes -= entry["num_bytes"]
+        for dep in entry["deps"]:
+            cache_keys = self.dependents.get(dep)
+            if cache_keys is not None:
+                cache_keys.discard(key)
+                if not cache_keys:
+                    del self.dependents[dep]
+        return entry
+
+    def evict(self):
+        """
+        Evicts the least recently used entries until the cache is
+        within its bounds.
+        """
+        while len(self.cache) > self.max_entries or self.num_bytes > self.max_bytes:
+            key = next((key for key in self.cache if key not in self.pinned_keys), None)
+            if key is None:
+                return
+            self.pop(key)
+            self.get_stats(key)["evictions"] += 1
+
+    def eject_entries_for_keys(self, keys):
+        """
+        Ejects the entries that created, or read the state of, the
+        components at `keys`, whose state was dropped.
+        """
+        keys_to_eject = [
+            cache_key
+            for cache_key, entry in self.cache.items()
+            if not keys.isdisjoint(entry["keys"])
+            or any(key in keys for key, _ in entry["deps"])
+        ]
+        for key_to_eject in keys_to_eject:
+            self.pop(key_to_eject)
 
     def eject_entries_for_mutated_props(self, mutations):
         with timing("Cache ejection"):
             keys_to_eject = set()
-            for key, entry in self.cache.items():
-                deps = entry["deps"]
-                for mutation in mutations:
-                    if mutation in deps:
-                        keys_to_eject.add(key)
-                        break
+            for mutation in mutations:
+                cache_keys = self.dependents.get(mutation)
+                if cache_keys:
+                    keys_to_eject.update(cache_keys)
             for key_to_eject in keys_to_eject:
-                self.cache.pop(key_to_eject)
+                self.pop(key_to_eject)
 
 
 def cached_wrapper(cache_key, fn, *args, **kwargs):
@@ -44,7 +182,11 @@ def cached_wrapper(cache_key, fn, *args, **kwargs):
     cached_value = frame.cache_get(cache_key)
 
     if cached_value == Cache.NotFound:
+        start_time = time.perf_counter()
         saved_deps = frame.deps
+        num_seen_keys = len(frame.seen_keys)
+        saved_nested_keys = frame.nested_cached_keys
+        frame.nested_cached_keys = 0
         fn_deps = set()
         frame.deps = fn_deps
         collector = ShadowCollector()
@@ -92,13 +234,30 @@ def cached_wrapper(cache_key, fn, *args, **kwargs):
         frame.collector_stack.pop()
         frame.deps = saved_deps
 
+        keys = tuple(frame.seen_keys[num_seen_keys:])
         cached_value = dict(
             result=result,
             collector=collector,
             deps=fn_deps,
+            keys=keys,
+            components=[frame.components[key] for key in keys],
+            # The components created by this call, rather than by
+            # nested cached calls.
+            num_components=len(keys) - frame.nested_cached_keys,
         )
+        frame.nested_cached_keys = saved_nested_keys
 
-        frame.cache_put(cache_key, cached_value)
+        frame.cache_put(
+            cache_key, cached_value, build_time=time.perf_counter() - start_time
+        )
+    else:
+        # The components created by the cached call are reused.
+        frame.seen_keys.extend(cached_value["keys"])
+        frame.components.update(
+            (component._key, component) for component in cached_value["components"]
+        )
+
+    frame.nested_cached_keys += len(cached_value["keys"])
 
     frame.collector_stack.internal_current()._extend(cached_value["collector"])
     frame.deps.update(cached_value["deps"])
@@ -144,13 +303,18 @@ def cached(fn):
     call to `my_function("Counter")` will not rerun. Instead, the
     cached UI generated by the previous call to the function will be
     reused.
+
+    Cached functions can take lists, dicts, sets, and, when installed,
+    NumPy arrays and Pandas data frames as arguments. These are
+    compared by their contents. Hashers for other types can be added
+    with `register_hasher`.
     """
 
     @wraps(fn)
     def wrapper(*args, **kwargs):
         call_stack_key = get_component_key()
         qualname = f"{fn.__module__}.{fn.__name__}"
-        cache_key = (qualname,) + hashkey(call_stack_key, *args, **kwargs)
+        cache_key = (qualname, call_stack_key) + content_hashkey(args, kwargs)
 
         return cached_wrapper(cache_key, fn, *args, **kwargs)
 
@@ -174,7 +338,7 @@ def cached_app(app_fn):
         return f"{app_fn.__module__}.{app_fn.__name__}"
 
     def get_deps(*args, **kwargs):
-        cached_value = AppRunnerFrame.current().cache_get(make_cache_key())
+        cached_value = AppRunnerFrame.current().cache_peek(make_cache_key())
         if cached_value == Cache.NotFound:
             return None
         return cached_value["deps"]
@@ -194,6 +358,7 @@ def cached_app(app_fn):
         return frame.filter_dirty_deps(deps)
 
     wrapper.is_dirty = is_dirty
+    wrapper.cache_key = make_cache_key()
 
     # Useful for debugging:
     wrapper.deps = get_deps
@@ -8,9 +8,14 @@ class Collector:
 
     def __init__(self):
         self._children = []
+        # The component this component was last collected into. A
+        # component reused from the cache is collected into the
+        # component using it.
+        self._parent = None
 
     def _collect_child(self, child):
         self._children.append(child)
+        child._parent = self
 
     def _extend(self, other_collector):
         for child in other_collector._children:
@@ -54,6 +54,9 @@ class Component(Collector):
             self._key = get_component_key()
             register_component_key(self._key)
 
+        if isinstance(frame, AppRunnerFrame):
+            frame.components[self._key] = self
+
         # Hyperdiv internal component name -- normally derived from the class name
         self._name = getattr(type(self), "_name", None) or type(self).__name__
         # The component's HTML tag as rendered in the UI
@@ -133,6 +136,14 @@ class Component(Collector):
         format. This function is used internally, but may be useful
         for debugging.
         """
+        return StateAccessFrame.current().render_component(self)
+
+    def _render(self):
+        """
+        Renders the component, bypassing the memoized renderings kept
+        by `UIPropState`. Components that add fields to the rendered
+        output override this method.
+        """
         return render_component(self)
 
     def _get_props(self):
@@ -158,9 +169,14 @@ class Component(Collector):
         camlcase_props = getattr(cls, "_camlcase_props", True)
         if not camlcase_props:
             for prop in props:
-                prop.camlcase_ui_name = False
+                prop.set_ui_name(camlcase_ui_name=False)
         return props
 
+    @classmethod
+    @cache
+    def _get_static_prop_defs(cls):
+        return {prop.name: prop for prop in cls._get_static_props()}
+
     @classmethod
     @cache
     def _get_static_slots(cls):
@@ -191,12 +207,44 @@ class Component(Collector):
     sentinel = object()
 
     def _init_props(self, **prop_kwargs):
+        if self._props is not type(self)._get_static_props():
+            # Props created per instance, like those of `state`, are
+            # all stored.
+            return self._init_all_props(**prop_kwargs)
+
+        # Props declared on the class are stored lazily, so only the
+        # props initialized with non-default values are passed on.
+        # See `ApplicationState`.
+        prop_defs = type(self)._get_static_prop_defs()
+        props_with_values = []
+
+        for prop_name, value in prop_kwargs.items():
+            prop = prop_defs.get(prop_name)
+            if prop is None:
+                invalid = [name for name in prop_kwargs if name not in prop_defs]
+                raise Exception(
+                    f"Invalid keyword arguments on {self._name}: "
+                    f"{', '.join(invalid)}"
+                )
+            if isinstance(prop.prop_type, Event):
+                raise Exception(
+                    f"Cannot initialize the event prop '{prop.name}' "
+                    f"on component '{self._name}'"
+                )
+            if value is not prop.default_value:
+                props_with_values.append((prop, value))
+
+        StateAccessFrame.current().init_props(
+            self._key, props_with_values, prop_defs=prop_defs
+        )
+
+    def _init_all_props(self, **prop_kwargs):
         props_with_values = []
 
         for prop in self._props:
             value = prop.default_value
             new_value = prop_kwargs.pop(prop.name, Component.sentinel)
-            if new_value != Component.sentinel:
+            if new_value is not Component.sentinel:
                 if isinstance(prop.prop_type, Event):
                     raise Exception(
                         f"Cannot initialize the event prop '{prop.name}' "
@@ -213,6 +261,23 @@ class Component(Collector):
 
         StateAccessFrame.current().init_props(self._key, props_with_values)
 
+    def persist(self):
+        """
+        Keeps the state of this component when it is no longer
+        rendered. This only has an effect if the app is run with
+        `hd.run(app, state_gc_runs=...)`, which drops the state of
+        components that are not rendered for `state_gc_runs` runs,
+        including their mutated props.
+
+        ```py-nodemo
+        state = hd.state(draft="").persist()
+        ```
+
+        Returns the component.
+        """
+        StateAccessFrame.current().persist(self._key)
+        return self
+
     def set_prop_delayed(self, prop_name, prop_value, delay=1):
         """
         Sets the prop with `prop_name` to the value `prop_value` after a
@@ -259,8 +324,9 @@ class Component(Collector):
         """
         Reset all component props.
         """
-        props = self._get_stored_props()
         frame = StateAccessFrame.current()
+        # Props that are not stored were never mutated.
+        props = frame.get_stored_props(self._key)
 
         with frame.state_lock:
             for prop in props.values():
@@ -23,6 +23,125 @@ def register_component_key(key):
     if key in hyperdiv_frame.keys:
         raise Exception("Duplicate key, perhaps missing scope()")
     hyperdiv_frame.keys.add(key)
+    hyperdiv_frame.seen_keys.append(key)
+
+
+# Frames of generators and coroutines can be resumed from different
+# callers, so their call chains cannot be memoized.
+generator_flags = (
+    inspect.CO_GENERATOR | inspect.CO_COROUTINE | inspect.CO_ASYNC_GENERATOR
+)
+# Bounds on the number of cached call chains, and on the number of
+# cached keys per call chain. A cache exceeding its bound is cleared.
+max_call_chains = 100_000
+max_keys_per_call_chain = 10_000
+# Bound on the number of stack frames memoized by a run.
+max_memoized_frames = 1000
+
+
+class CallChain:
+    """
+    A node in the tree of call chains leading from the user's app
+    function to component constructors. A chain is identified by its
+    parent chain and the code object and instruction offset of its
+    innermost stack frame, which determine the filenames, line
+    numbers, and function names the key is generated from.
+    """
+
+    num_chains = 0
+
+    def __init__(self, parent=None, stack_frame=None):
+        CallChain.num_chains += 1
+        self.parent = parent
+        # Holding the code object prevents its id, which identifies
+        # this chain in its parent, from being reused.
+        self.code = stack_frame.f_code if stack_frame else None
+        # Maps (code object id, instruction offset) to child chains.
+        self.children = dict()
+        # Maps scope strings to the keys generated by this chain.
+        self.keys = dict()
+        # The part of the key string identifying the call chain.
+        self.suffix = ""
+        if stack_frame:
+            self.suffix = (
+                f"::{self.code.co_filename}:{stack_frame.f_lineno}"
+                f":{self.code.co_name}{parent.suffix}"
+            )
+
+    def child(self, stack_frame):
+        chain_id = (id(stack_frame.f_code), stack_frame.f_lasti)
+        child = self.children.get(chain_id)
+        if child is None:
+            child = CallChain(self, stack_frame)
+            self.children[chain_id] = child
+        return child
+
+    def get_key(self, scope_str):
+        key = self.keys.get(scope_str)
+        if key is None:
+            if len(self.keys) >= max_keys_per_call_chain:
+                self.keys.clear()
+            # Prepend `a` because these keys are used as DOM IDs and a
+            # DOM ID with a leading number is not valid.
+            key = "a" + xxhash.xxh32(scope_str + self.suffix).hexdigest()
+            self.keys[scope_str] = key
+        return key
+
+
+root_call_chain = CallChain()
+
+
+def get_call_chain(hyperdiv_frame, stack_frame):
+    """
+    Returns the call chain of `stack_frame`. A frame's call chain
+    does not change while the frame is suspended at the same
+    instruction offset, so the chains of the frames on the stack are
+    memoized in the current run. Typically only the innermost frame
+    is inspected.
+    """
+    global root_call_chain
+
+    memoized_frames = hyperdiv_frame.call_chains
+    new_frames = []
+    call_chain = None
+
+    while stack_frame:
+        entry = memoized_frames.get(id(stack_frame))
+        if (
+            entry is not None
+            and entry[0] is stack_frame
+            and entry[1] == stack_frame.f_lasti
+        ):
+            call_chain = entry[2]
+            break
+        code = stack_frame.f_code
+        # It stops when it encounters `run_user_app`, which the function
+        # from which the user's app function is called.
+        if code.co_name == "run_user_app" and code.co_filename == runtime_py_path:
+            break
+        new_frames.append(stack_frame)
+        stack_frame = stack_frame.f_back
+
+    if call_chain is None:
+        if CallChain.num_chains >= max_call_chains:
+            CallChain.num_chains = 0
+            root_call_chain = CallChain()
+        call_chain = root_call_chain
+
+    if len(memoized_frames) + len(new_frames) > max_memoized_frames:
+        memoized_frames.clear()
+
+    for stack_frame in reversed(new_frames):
+        call_chain = call_chain.child(stack_frame)
+        if not stack_frame.f_code.co_flags & generator_flags:
+            # Holding the frame prevents its id from being reused.
+            memoized_frames[id(stack_frame)] = (
+                stack_frame,
+                stack_frame.f_lasti,
+                call_chain,
+            )
+
+    return call_chain
 
 
 def get_component_key(key=None):
@@ -30,6 +149,10 @@ def get_component_key(key=None):
     of the pertinent functions currently on the stack. It tries to
     limit the search to user-defined code and avoid traversing the
     whole stack.
+
+    The filenames and line numbers are determined by the code objects
+    and instruction offsets on the stack, so the keys are cached per
+    chain of (code object, instruction offset) and scope stack.
     """
 
     # Assumes `get_component_key` is called from a hyperdiv component
@@ -40,22 +163,9 @@ def get_component_key(key=None):
     hyperdiv_frame = AppRunnerFrame.current()
 
     if not key:
-        stack_frame = inspect.currentframe().f_back.f_back
-        key = ""
-        while stack_frame:
-            filename = stack_frame.f_code.co_filename
-            lineno = stack_frame.f_lineno
-            funcname = stack_frame.f_code.co_name
-            # It stops when it encounters `run_loop`, which the function
-            # from which the user's app function is called.
-            if filename == runtime_py_path and funcname == "run_user_app":
-                break
-            key += f"::{filename}:{lineno}:{funcname}"
-            stack_frame = stack_frame.f_back
-
-        key = str(hyperdiv_frame.scope_stack) + key
-        # Prepend `a` because these keys are used as DOM IDs and a DOM ID
-        # with a leading number is not valid.
-        key = "a" + xxhash.xxh32(key).hexdigest()
+        call_chain = get_call_chain(
+            hyperdiv_frame, inspect.currentframe().f_back.f_back
+        )
+        key = call_chain.get_key(hyperdiv_frame.scope_str)
 
     return key
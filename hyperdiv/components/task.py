@@ -6,14 +6,15 @@ from ..debug import logger
 from .async_command import async_command
 
 
-def run_asynchronously(result_callback, fn, *args, **kwargs):
+def run_asynchronously(result_callback, fn, args=(), kwargs=None, batch_window=None):
     frame = AppRunnerFrame.current()
+    kwargs = kwargs or dict()
 
     if asyncio.iscoroutinefunction(fn):
         # If task is an async function, run it on the ioloop
         async def run_async_task():
             try:
-                with frame.task_frame():
+                with frame.task_frame(batch_window):
                     try:
                         result = await fn(*args, **kwargs)
                         result_callback(result)
@@ -29,7 +30,7 @@ def run_asynchronously(result_callback, fn, *args, **kwargs):
         # If task is a regular function, run it in the threadpool
         def run_task():
             try:
-                with frame.task_frame():
+                with frame.task_frame(batch_window):
                     try:
                         result = fn(*args, **kwargs)
                         result_callback(result=result)
@@ -174,13 +175,40 @@ class task(async_command):
     may need to use your own locks if you need coarser-granularity
     locking. You can store a lock in state and pass that state to tasks.
 
+    ## Batching Updates
+
+    By default, every prop update made by a task function causes the
+    app function to re-run and the UI to update. A task that updates
+    a prop in a tight loop, like a progress indicator, can cause
+    many re-runs per second. Passing `batch_window` (in seconds)
+    batches the updates made by the task within that window, so they
+    cause a single re-run. The default batch window for all tasks can
+    be set with the `task_batch_window` argument of @component(run).
+
+    ```py
+    def process(state):
+        import time
+        for i in range(1000):
+            time.sleep(0.001)
+            state.progress = i
+
+    state = hd.state(progress=0)
+    task = hd.task(batch_window=0.05)
+    task.run(process, state)
+
+    hd.text("Progress:", state.progress)
+    ```
+
+    Pending updates are delivered when the task function finishes.
+
     """
 
     _run_number = Prop(Int, 0)
     finished = Prop(BoolEvent, False)
 
-    def __init__(self, *, key=None):
+    def __init__(self, *, key=None, batch_window=None):
         super().__init__(key=key)
+        self._batch_window = batch_window
 
     def run(self, fn, *args, **kwargs):
         """
@@ -205,7 +233,13 @@ class task(async_command):
 
         if not self.running and not self.done:
             self.running = True
-            run_asynchronously(result_callback, fn, *args, **kwargs)
+            run_asynchronously(
+                result_callback,
+                fn,
+                args=args,
+                kwargs=kwargs,
+                batch_window=self._batch_window,
+            )
 
     def rerun(self, fn, *args, **kwargs):
         """Just like `run` but calls `self.clear()` before running."""
@@ -1,8 +1,43 @@
 import uuid
 import json
+import struct
+import zlib
+from tornado.ioloop import IOLoop
 from tornado.websocket import WebSocketHandler, WebSocketClosedError
 from .debug import logger
 from .app_runner import AppRunner
+from .encoding import encode_message, CompactEncoder
+
+# The default message compression settings. `level` and `mem_level`
+# are passed to `zlib.compressobj`. Messages smaller than `min_size`
+# bytes are sent uncompressed.
+default_compression = dict(level=6, mem_level=8, min_size=1024)
+
+
+def get_compression_settings(compression):
+    """
+    Returns the compression settings for the `compression` argument of
+    `hyperdiv.run`: `None` if compression is disabled, or the default
+    settings updated with the given settings.
+    """
+    if not compression:
+        return None
+    if compression is True:
+        compression = dict()
+    invalid_keys = set(compression) - set(default_compression)
+    if invalid_keys:
+        raise ValueError(f"Invalid compression settings: {sorted(invalid_keys)}")
+    return default_compression | compression
+
+
+def new_compressor(compression):
+    """
+    Returns a zlib stream compressing messages with the given
+    compression settings.
+    """
+    return zlib.compressobj(
+        compression["level"], zlib.DEFLATED, zlib.MAX_WBITS, compression["mem_level"]
+    )
 
 
 class Connection(WebSocketHandler):
@@ -18,25 +53,63 @@ class Connection(WebSocketHandler):
     AppRunner, which will run application frames and reply to the
     frontend with new 'dom'.
 
-    TODO: The websocket connection may disconnect randomly, without
-    the user closing the browser tab. When a client disconnects, we
-    will need to store the state of their AppRunner, and when it
-    reconnects, we will need to retrieve/reify their
-    AppRunner. Currently the AppRunner is lost on disconnect, so
-    application state resets on reconnect.
+    The websocket connection may disconnect randomly, without the
+    user closing the browser tab. When a client disconnects, its
+    AppRunner is stopped, unless `resume_timeout` is set. Then, the
+    AppRunner is detached and parked for `resume_timeout` seconds. If
+    the client reconnects within that time, passing back the
+    `clientId` it was given on its first connection, the parked
+    AppRunner is attached to the new connection and the session
+    continues where it left off. The browser also passes the
+    sequence number of the last message it received, so the
+    AppRunner can replay the messages it missed, or resend the full
+    'dom' if they are no longer available. If the client doesn't
+    reconnect in time, the AppRunner is stopped.
     """
 
     _active_connections: dict[uuid.UUID, "Connection"] = dict()
+    # Maps the client ID of each parked AppRunner to the runner and
+    # the ioloop timeout that will stop it.
+    _parked_runners: dict[uuid.UUID, tuple[AppRunner, object]] = dict()
 
-    def __init__(self, application, request, app_function, task_runtime, ioloop):
+    def __init__(
+        self,
+        application,
+        request,
+        app_function,
+        task_runtime,
+        ioloop,
+        scheduler=None,
+        resume_timeout=None,
+        state_gc_runs=None,
+        compact_protocol=False,
+        compression=None,
+    ):
         super().__init__(application, request)
         self.ioloop = ioloop
-        self.client_id = uuid.uuid4()
-        Connection._active_connections[self.client_id] = self
+        self.resume_timeout = resume_timeout
+        # The settings returned by `get_compression_settings`, set if
+        # the server enables compression, and the browser asks for it.
+        self.compression = None
+        # The zlib stream compressing the messages of the connection,
+        # shared by its messages so each message is compressed in the
+        # context of the previous ones.
+        self.compressor = None
+        if compression and self.get_argument("compression", None) == "deflate":
+            self.compression = compression
+            self.compressor = new_compressor(compression)
+        # The bytes of the messages written, the bytes written after
+        # compression, and the number of compressed messages. Only
+        # updated and read on the ioloop.
+        self.message_bytes = 0
+        self.sent_bytes = 0
+        self.compressed_messages = 0
+        # Set if the server enables the compact protocol, and the
+        # browser asks for it.
+        self.compact_encoder = None
+        if compact_protocol and self.get_argument("protocol", None) == "compact":
+            self.compact_encoder = CompactEncoder()
 
-        # client_id = self.get_argument("clientId", None)
-        # TODO: sync client_id (client_id) with client and restore
-        # AppRunner on reconnect based on client_id.
         updates_arg = self.get_argument("updates", None)
         updates = []
         if updates_arg:
@@ -44,16 +117,82 @@ class Connection(WebSocketHandler):
                 updates = json.loads(updates_arg)
             except Exception as e:
                 logger.warn(f"Corrupted `updates` argument: {e}")
-        self.runner = AppRunner(self, task_runtime, app_function, updates)
-        self.runner.start()
+
+        client_id = self.get_argument("clientId", None)
+        last_seq = self.get_argument("lastSeq", None)
+        try:
+            client_id = uuid.UUID(client_id) if client_id else None
+            last_seq = int(last_seq) if last_seq else None
+        except ValueError as e:
+            logger.warn(f"Corrupted `clientId` or `lastSeq` argument: {e}")
+            client_id = None
+
+        self.runner = self.take_runner(client_id) if client_id else None
+        if self.runner:
+            # The client already knows its ID.
+            self.client_id = client_id
+            self.sent_client_id = True
+            self.runner.attach(self, last_seq, updates)
+        else:
+            self.client_id = uuid.uuid4()
+            self.sent_client_id = False
+            self.runner = AppRunner(
+                self,
+                task_runtime,
+                app_function,
+                updates,
+                scheduler=scheduler,
+                state_gc_runs=state_gc_runs,
+            )
+            self.runner.start()
+
+        Connection._active_connections[self.client_id] = self
         logger.info(
-            f"Connection opened. {len(Connection._active_connections)} connections open."
+            f"Connection {'resumed' if self.sent_client_id else 'opened'}. "
+            f"{len(Connection._active_connections)} connections open."
         )
 
+    def take_runner(self, client_id):
+        """
+        Returns the AppRunner of the given client, if it is parked or
+        still attached to a connection that hasn't noticed it has
+        dropped, or `None` if the session is gone.
+        """
+        parked = Connection._parked_runners.pop(client_id, None)
+        if parked:
+            runner, timeout = parked
+            self.ioloop.remove_timeout(timeout)
+            # The runner may have exited due to an error while parked.
+            return None if runner.done.is_set() else runner
+
+        stale_connection = Connection._active_connections.get(client_id)
+        if stale_connection and stale_connection.runner:
+            runner = stale_connection.runner
+            stale_connection.runner = None
+            runner.detach()
+            stale_connection.close()
+            return runner
+
+        return None
+
+    def park_runner(self):
+        self.runner.detach()
+        client_id = self.client_id
+
+        def expire():
+            parked = Connection._parked_runners.pop(client_id, None)
+            if parked:
+                parked[0].stop()
+
+        timeout = self.ioloop.call_later(self.resume_timeout, expire)
+        Connection._parked_runners[client_id] = (self.runner, timeout)
+
     def open(self):
         pass
 
     def on_message(self, messages):
+        if not self.runner:
+            return
         messages = json.loads(messages)
         ui_updates = []
         for m in messages:
@@ -61,26 +200,136 @@ class Connection(WebSocketHandler):
         self.runner.enqueue_ui_updates(ui_updates)
 
     def on_close(self):
-        self.runner.stop()
-        Connection._active_connections.pop(self.client_id)
+        if Connection._active_connections.get(self.client_id) is self:
+            Connection._active_connections.pop(self.client_id)
+        if self.compression:
+            logger.debug(
+                f"Connection sent {self.message_bytes} message bytes "
+                f"in {self.sent_bytes} bytes, compressing "
+                f"{self.compressed_messages} messages."
+            )
+        if self.runner:
+            if self.resume_timeout:
+                self.park_runner()
+            else:
+                self.runner.stop()
+            self.runner = None
         logger.info(
             f"Connection closed. {len(Connection._active_connections)} connections open."
         )
 
     def send(self, message):
-        async def _send():
-            try:
-                await self.write_message(json.dumps(message))
-            except WebSocketClosedError:
-                logger.exception("Connection closed error.")
-            except Exception as e:
-                logger.exception(f"Failed to write to client: {e}")
+        """
+        Encodes and compresses the message on the calling thread,
+        usually the session's runner thread, and schedules writing it
+        on the ioloop. Encoding or compressing a large DOM on the
+        ioloop would hold up the network I/O of every other session.
+
+        Called with the runner's `connection_lock` held, so the
+        messages are compressed in the order they are written.
+        """
+        if not self.sent_client_id:
+            message = dict(message, clientId=str(self.client_id))
+            self.sent_client_id = True
+
+        data = encode_message(message, self.compact_encoder)
+        num_message_bytes = len(data)
+        # Messages smaller than the `min_size` setting are sent
+        # uncompressed, since compressing them costs more time than it
+        # saves.
+        is_compressed = (
+            self.compression is not None
+            and num_message_bytes >= self.compression["min_size"]
+        )
+        if is_compressed:
+            data = self.compress(data)
+
+        self.ioloop.add_callback(
+            self.write_encoded_message, data, num_message_bytes, is_compressed
+        )
 
-        self.ioloop.add_callback(_send)
+    def compress(self, data):
+        """
+        Returns the binary frame of a compressed message: the length
+        of `data`, as a 4-byte big-endian integer, followed by the
+        chunk of the connection's zlib stream compressing `data`. The
+        stream is flushed at the end of each message, so the browser,
+        which decompresses the stream with a single
+        `DecompressionStream("deflate")`, can decode the message
+        without waiting for the next one.
+        """
+        return (
+            struct.pack(">I", len(data))
+            + self.compressor.compress(data)
+            + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        )
+
+    async def write_encoded_message(self, data, num_message_bytes, is_compressed):
+        """
+        Writes an encoded message, compressed messages as binary
+        frames, counting its bytes on the connection.
+        """
+        self.message_bytes += num_message_bytes
+        self.sent_bytes += len(data)
+        if is_compressed:
+            self.compressed_messages += 1
+        try:
+            await self.write_message(data, binary=is_compressed)
+        except WebSocketClosedError:
+            logger.exception("Connection closed error.")
+        except Exception as e:
+            logger.exception(f"Failed to write to client: {e}")
+
+    @staticmethod
+    def hibernate_idle_sessions(store, idle_timeout):
+        """
+        Hibernates the sessions, connected or parked, that haven't
+        received input for `idle_timeout` seconds.
+        """
+        for conn in Connection._active_connections.values():
+            if conn.runner:
+                conn.runner.hibernate_if_idle(store, idle_timeout)
+        for runner, _ in Connection._parked_runners.values():
+            runner.hibernate_if_idle(store, idle_timeout)
+
+    @staticmethod
+    def get_session_stats():
+        """
+        Returns the stats of the sessions, connected or parked, as a
+        list of dicts holding the `AppRunner.get_stats` of each
+        session, along with its client ID and whether it is connected.
+        Connected sessions also hold the byte counters of their
+        connection, in `connection`.
+        """
+        sessions = []
+        for conn in Connection._active_connections.values():
+            if conn.runner:
+                sessions.append(
+                    dict(
+                        client_id=str(conn.client_id),
+                        connected=True,
+                        connection=dict(
+                            message_bytes=conn.message_bytes,
+                            sent_bytes=conn.sent_bytes,
+                            compressed_messages=conn.compressed_messages,
+                        ),
+                        **conn.runner.get_stats(),
+                    )
+                )
+        for client_id, (runner, _) in Connection._parked_runners.items():
+            sessions.append(
+                dict(client_id=str(client_id), connected=False, **runner.get_stats())
+            )
+        return sessions
 
     @staticmethod
     def close_all_connections():
         # TODO: Actually call close() on the connections?
         logger.info(f"Closing {len(Connection._active_connections)} connections.")
         for conn in Connection._active_connections.values():
-            conn.runner.stop()
+            if conn.runner:
+                conn.runner.stop()
+        for runner, timeout in Connection._parked_runners.values():
+            IOLoop.current().remove_timeout(timeout)
+            runner.stop()
+        Connection._parked_runners.clear()
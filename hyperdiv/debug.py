@@ -35,6 +35,9 @@ PROFILE_RENDER = False if not DEBUG else get_bool_env_var("HD_PROFILE_RENDER", F
 PROFILE_DIFF = False if not DEBUG else get_bool_env_var("HD_PROFILE_DIFF", False)
 PROFILE_RUN = False if not DEBUG else get_bool_env_var("HD_PROFILE_RUN", False)
 PRINT_OUTPUT = False if not DEBUG else get_bool_env_var("HD_PRINT_OUTPUT", False)
+# Serves the stats of the sessions at `/hyperdiv-stats`. On by
+# default in debug mode, and can be turned on in production.
+SERVE_STATS = get_bool_env_var("HD_SERVE_STATS", DEBUG)
 
 
 logger.setLevel(logging.INFO)
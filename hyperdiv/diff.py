@@ -1,9 +1,13 @@
+from operator import attrgetter
 from .frame import RenderFrame
 
 
 class Diff:
     def __init__(self):
         self._diff = []
+        # The components deleted from the browser's DOM by the diff,
+        # whose descendants are deleted with them.
+        self.deleted = []
 
     def add_component_diff(self, component_diff):
         self._diff.append(component_diff)
@@ -19,9 +23,13 @@ class Diff:
 
 
 class ComponentDiff:
-    def __init__(self, key, props):
+    def __init__(self, key, props, css_props=None):
         self.key = key
+        # The changed props, including changed CSS props.
         self.props = props
+        # If any CSS prop changed, all the CSS props of the component,
+        # from which its style class is rendered.
+        self.css_props = css_props or []
         self.children = []
 
     def add_command(self, command):
@@ -34,8 +42,11 @@ class ComponentDiff:
         from .renderer import render_props
 
         output = dict()
-        if len(self.props) > 0:
-            output |= render_props(self.key, self.props)
+        normal_props = [prop for prop in self.props if not prop.is_css_prop]
+        if len(normal_props) > 0:
+            output |= render_props(self.key, normal_props)
+        if len(self.css_props) > 0:
+            output |= RenderFrame.current().render_style_diff(self.key, self.css_props)
         if len(self.children) > 0:
             output["children"] = [command.render() for command in self.children]
         return output
@@ -63,10 +74,136 @@ class Delete:
         return ("delete", self.start_idx, self.num_items)
 
 
+class Move:
+    """
+    Removes the child at `from_idx`, and re-inserts it before the
+    child at `to_idx` in the resulting list.
+    """
+
+    def __init__(self, from_idx, to_idx):
+        self.from_idx = from_idx
+        self.to_idx = to_idx
+
+    def render(self):
+        return ("move", self.from_idx, self.to_idx)
+
+
+def longest_increasing_subsequence(values):
+    """
+    Returns the indices in `values` of a longest strictly increasing
+    subsequence of `values`.
+    """
+    # tails[k] is the index of the smallest value ending an
+    # increasing subsequence of length k + 1.
+    tails = []
+    predecessors = [None] * len(values)
+
+    for i, value in enumerate(values):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if values[tails[mid]] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            predecessors[i] = tails[lo - 1]
+        if lo == len(tails):
+            tails.append(i)
+        else:
+            tails[lo] = i
+
+    result = []
+    i = tails[-1] if tails else None
+    while i is not None:
+        result.append(i)
+        i = predecessors[i]
+    result.reverse()
+    return result
+
+
+class OccupiedSlots:
+    """
+    A Fenwick tree counting the occupied slots among `size` slots,
+    so that the number of occupied slots before a slot is found in
+    O(log n).
+    """
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, slot, delta):
+        i = slot + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def count_before(self, slot):
+        count = 0
+        i = slot
+        while i > 0:
+            count += self.tree[i]
+            i -= i & -i
+        return count
+
+
+get_key = attrgetter("_key")
+
+
+def get_child_keys(component):
+    return tuple(map(get_key, component._children))
+
+
 class Differ:
-    def __init__(self):
+    """
+    Diffs the previous and current component trees.
+
+    The props of a component are diffed only if its key is in the
+    state's `dirty_keys` -- the keys of components whose props were
+    created or changed since they were last diffed or sent to the
+    browser.
+
+    If `components`, the components of the current tree by key, is
+    given, the walk visits only the components whose props are dirty
+    or whose children changed since they were sent to the browser,
+    and their ancestors. The other subtrees are unchanged, and
+    skipped. The children held by the browser are looked up in
+    `UIPropState.child_keys`, which the diff updates as it changes
+    them.
+    """
+
+    def __init__(self, components=None):
         self.frame = RenderFrame.current()
+        self.dirty_keys = self.frame.get_dirty_keys()
+        self.child_keys = self.frame.get_child_keys()
         self.diff = Diff()
+        # The components inserted in the browser's DOM by the diff.
+        self.inserted = []
+        self.components = components
+        self.visited_keys = None
+        if components is not None:
+            self.visited_keys = self.get_visited_keys(components)
+
+    def get_visited_keys(self, components):
+        """
+        Returns the keys of the components in `components` whose props
+        are dirty or whose children changed, and of their ancestors.
+        """
+        changed = [
+            components[key] for key in list(self.dirty_keys) if key in components
+        ]
+        for key, component in components.items():
+            if component._has_children and self.child_keys.get(key) != get_child_keys(
+                component
+            ):
+                changed.append(component)
+
+        visited_keys = set()
+        for component in changed:
+            while component is not None and component._key not in visited_keys:
+                visited_keys.add(component._key)
+                component = component._parent
+        return visited_keys
 
     def diff_component(self, src_component, dest_component):
         if src_component == dest_component:
@@ -76,122 +213,237 @@ class Differ:
 
         key = dest_component._key
 
-        props = self.frame.get_props(key).values()
-
-        # TODO: We currently don't properly diff CSS. If any CSS prop
-        # changed, we re-render all CSS props.
-        css_was_updated = False
-        for prop in props:
-            if self.frame.prop_changed(prop) and prop.is_css_prop:
-                css_was_updated = True
-                break
+        if (
+            self.visited_keys is not None
+            and key not in self.visited_keys
+            and self.components.get(key) is dest_component
+        ):
+            # Neither the component nor its descendants changed.
+            return
 
-        changed_props = [
-            prop
-            for prop in props
-            if not prop.internal
-            and self.frame.prop_changed(prop)
-            or (prop.is_css_prop and css_was_updated)
-        ]
+        if key in self.dirty_keys:
+            # The key is discarded before reading the props, so that
+            # a concurrent change by a task is either seen here, or
+            # marks the key dirty again.
+            self.dirty_keys.discard(key)
+            changed_props, css_props = self.diff_props(key)
+        else:
+            changed_props, css_props = [], []
 
-        diff = ComponentDiff(key, changed_props)
+        diff = ComponentDiff(key, changed_props, css_props)
 
         if src_component._has_children:
             self.diff_children(diff, src_component._children, dest_component._children)
+            self.child_keys[key] = get_child_keys(dest_component)
 
         if not diff.is_empty():
             self.diff.add_component_diff(diff)
 
+    def diff_props(self, key):
+        # Props that are not stored have held their default values
+        # since the component was created, so they are unchanged.
+        props = self.frame.get_stored_props(key).values()
+
+        # Components held in props, like `style` parts, are diffed
+        # along with the holding component.
+        for prop in props:
+            held_key = getattr(prop.value, "_key", None)
+            if held_key is not None:
+                self.dirty_keys.discard(held_key)
+
+        return self.changed_props(key, props)
+
+    def changed_props(self, key, props):
+        """
+        Returns the changed props among `props`, which are props of
+        the component with the given key, and, if any CSS prop
+        changed, all the CSS props of the component. The style class of
+        the component is re-rendered from all its CSS props, and if
+        the browser does not hold the class, only its difference from
+        the component's previous class is sent.
+        """
+        changed_props = [
+            prop
+            for prop in props
+            if not prop.internal and self.frame.prop_changed(prop)
+        ]
+        css_props = []
+        if any(prop.is_css_prop for prop in changed_props):
+            css_props = [
+                prop for prop in self.frame.get_props(key).values() if prop.is_css_prop
+            ]
+        return changed_props, css_props
+
     def diff_children(self, diff, src, dest):
-        src_idx = 0
-        dest_idx = 0
-
-        def emit_insert(start_idx, component_list):
-            diff.add_command(Insert(start_idx, component_list))
-
-        def emit_delete(start_idx, num_items):
-            diff.add_command(Delete(start_idx, num_items))
-
-        while True:
-            try:
-                src_elem = src[src_idx]
-            except IndexError:
-                if dest_idx < len(dest):
-                    emit_insert(dest_idx, dest[dest_idx:])
-                break
-
-            try:
-                dest_elem = dest[dest_idx]
-            except IndexError:
-                emit_delete(dest_idx, len(src) - src_idx)
-                break
-
-            if src_elem._key == dest_elem._key:
-                self.diff_component(src_elem, dest_elem)
-                src_idx += 1
-                dest_idx += 1
-            else:
-                si = src_idx
-                di = dest_idx
-
-                # maps key to index in the array
-                seen_in_source = dict()
-                seen_in_dest = dict()
-
-                found = False
-
-                while di < len(dest) or si < len(src):
-                    if si < len(src):
-                        if src[si]._key in seen_in_dest:
-                            di = seen_in_dest[src[si]._key]
-                            found = True
-                            break
-                        else:
-                            seen_in_source[src[si]._key] = si
-                            si += 1
-
-                    if di < len(dest):
-                        if dest[di]._key in seen_in_source:
-                            si = seen_in_source[dest[di]._key]
-                            found = True
-                            break
-                        else:
-                            seen_in_dest[dest[di]._key] = di
-                            di += 1
-
-                if found:
-                    if si - src_idx > 0:
-                        emit_delete(dest_idx, si - src_idx)
-
-                    to_insert = dest[dest_idx:di]
-                    if len(to_insert) > 0:
-                        emit_insert(dest_idx, to_insert)
-
-                    src_idx = si
-                    dest_idx = di
-
-                    continue
-
-                emit_delete(dest_idx, len(src) - src_idx)
-                emit_insert(dest_idx, dest[dest_idx:])
-                break
+        """
+        Emits the commands that transform the browser's list of
+        children, which matches `src`, into `dest`, matching children
+        by key. The commands are applied in order, and the indices in
+        a command refer to the list as modified by the preceding
+        commands.
+
+        Children that are in both lists are diffed recursively, and
+        are moved rather than deleted and re-inserted. The children
+        that form the longest run keeping their relative order stay
+        in place, so the number of moves is minimal.
+        """
+
+        # Diff the common prefix and suffix in place.
+        start = 0
+        while (
+            start < len(src)
+            and start < len(dest)
+            and src[start]._key == dest[start]._key
+        ):
+            self.diff_component(src[start], dest[start])
+            start += 1
+
+        src_end = len(src)
+        dest_end = len(dest)
+        while (
+            src_end > start
+            and dest_end > start
+            and src[src_end - 1]._key == dest[dest_end - 1]._key
+        ):
+            src_end -= 1
+            dest_end -= 1
+            self.diff_component(src[src_end], dest[dest_end])
+
+        if start == src_end:
+            if start < dest_end:
+                diff.add_command(Insert(start, dest[start:dest_end]))
+                self.inserted.extend(dest[start:dest_end])
+            return
 
-    def diff_mutations(self, mutations):
-        for key, prop_name in mutations:
-            props = self.frame.get_props(key)
+        if start == dest_end:
+            diff.add_command(Delete(start, src_end - start))
+            self.diff.deleted.extend(src[start:src_end])
+            return
 
-            prop = props[prop_name]
+        dest_indices = {dest[i]._key: i for i in range(start, dest_end)}
+
+        # Delete the children that are not in `dest`, back to front,
+        # so the indices of the runs not yet deleted stay valid.
+        run_end = None
+        for i in range(src_end - 1, start - 2, -1):
+            deleted = i >= start and src[i]._key not in dest_indices
+            if deleted and run_end is None:
+                run_end = i + 1
+            elif not deleted and run_end is not None:
+                diff.add_command(Delete(i + 1, run_end - i - 1))
+                self.diff.deleted.extend(src[i + 1 : run_end])
+                run_end = None
+
+        src_components = {
+            src[i]._key: src[i]
+            for i in range(start, src_end)
+            if src[i]._key in dest_indices
+        }
+        src_indices = {src[i]._key: i for i in range(start, src_end)}
+        src_keys = list(src_components)
+        stable = set(
+            src_keys[i]
+            for i in longest_increasing_subsequence(
+                [dest_indices[key] for key in src_keys]
+            )
+        )
 
-            if prop.internal:
+        # The middle section of the browser's list, as modified by the
+        # commands emitted so far, is tracked as a set of occupied
+        # slots, in a static order. A child of `src` that is not
+        # moved occupies its slot `(src_index, 1)`. A child that is
+        # placed, by a move or an insert, is placed before the next
+        # stable child in `dest`, after the children of `src` that
+        # precede that stable child. It occupies the slot
+        # `(stable_src_index, 0, dest_index)`, where
+        # `stable_src_index` is `src_end` if no stable child follows.
+        placed_slots = dict()
+        next_stable = src_end
+        for j in range(dest_end - 1, start - 1, -1):
+            key = dest[j]._key
+            if key in stable:
+                next_stable = src_indices[key]
+            else:
+                placed_slots[j] = (next_stable, 0, j)
+        slots = sorted(
+            [(src_indices[key], 1) for key in src_keys] + list(placed_slots.values())
+        )
+        slot_indices = {slot: i for i, slot in enumerate(slots)}
+        live = OccupiedSlots(len(slots))
+        for key in src_keys:
+            live.add(slot_indices[(src_indices[key], 1)], 1)
+
+        def insert(first, last):
+            i = live.count_before(slot_indices[placed_slots[first]])
+            diff.add_command(Insert(start + i, dest[first:last]))
+            self.inserted.extend(dest[first:last])
+            for k in range(first, last):
+                live.add(slot_indices[placed_slots[k]], 1)
+
+        # Place the children back to front, so each child is placed
+        # before the next child in `dest`.
+        insert_end = None
+        for j in range(dest_end - 1, start - 1, -1):
+            key = dest[j]._key
+            src_component = src_components.get(key)
+
+            if src_component is None:
+                if insert_end is None:
+                    insert_end = j + 1
                 continue
 
-            if self.frame.prop_changed(prop):
-                changed_props = [prop]
-                if prop.is_css_prop:
-                    for prop in props:
-                        if prop.is_css_prop:
-                            changed_props.append(prop)
-                self.diff.add_component_diff(ComponentDiff(key, changed_props))
+            if insert_end is not None:
+                insert(j + 1, insert_end)
+                insert_end = None
+
+            self.diff_component(src_component, dest[j])
+
+            if key not in stable:
+                src_slot = slot_indices[(src_indices[key], 1)]
+                from_idx = live.count_before(src_slot)
+                live.add(src_slot, -1)
+                dest_slot = slot_indices[placed_slots[j]]
+                to_idx = live.count_before(dest_slot)
+                live.add(dest_slot, 1)
+                diff.add_command(Move(start + from_idx, start + to_idx))
+
+        if insert_end is not None:
+            insert(start, insert_end)
+
+    def update_removed_and_inserted(self):
+        """
+        Forgets the dirty props and children of the components deleted
+        from the browser's DOM, and their descendants, and sets the
+        children of the inserted components. Deleted components first,
+        since a component moved to a new parent is deleted and
+        inserted.
+        """
+        stack = list(self.diff.deleted)
+        while stack:
+            component = stack.pop()
+            self.dirty_keys.discard(component._key)
+            self.child_keys.pop(component._key, None)
+            if component._has_children:
+                stack.extend(component._children)
+
+        for component in self.inserted:
+            self.frame.set_child_keys(component)
+
+    def diff_mutations(self, mutations):
+        mutated_props = dict()
+        for key, prop_name in mutations:
+            mutated_props.setdefault(key, []).append(prop_name)
+
+        for key, prop_names in mutated_props.items():
+            props = self.frame.get_stored_props(key)
+            changed_props, css_props = self.changed_props(
+                key,
+                [props[prop_name] for prop_name in prop_names if prop_name in props],
+            )
+            if changed_props:
+                self.diff.add_component_diff(
+                    ComponentDiff(key, changed_props, css_props)
+                )
 
 
 def diff_mutations(mutations):
@@ -201,8 +453,9 @@ def diff_mutations(mutations):
         return d.diff
 
 
-def diff(previous_component, component):
-    d = Differ()
+def diff(previous_component, component, components=None):
+    d = Differ(components)
     d.diff_component(previous_component, component)
+    d.update_removed_and_inserted()
     if not d.diff.is_empty():
         return d.diff
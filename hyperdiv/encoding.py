@@ -0,0 +1,154 @@
+import json
+
+
+def stdlib_json_encoder(message):
+    return json.dumps(message, separators=(",", ":")).encode()
+
+
+try:
+    import orjson
+
+    def orjson_encoder(message):
+        try:
+            return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson rejects some values that `json` accepts, like
+            # integers wider than 64 bits.
+            return stdlib_json_encoder(message)
+
+    json_encoder = orjson_encoder
+except ImportError:
+    json_encoder = stdlib_json_encoder
+
+
+def set_json_encoder(fn):
+    """
+    Sets the function used to encode the messages sent to the
+    browser. The function takes a message, made of dicts, lists,
+    tuples, strings, numbers, booleans and `None`, and returns its
+    JSON encoding as UTF-8 `bytes`.
+
+    By default, messages are encoded with
+    [orjson](https://github.com/ijl/orjson) when it is installed, and
+    with Python's `json` module otherwise.
+
+    Messages are encoded on the session's thread, so encoding large
+    messages doesn't hold up the other sessions' network I/O.
+    """
+    global json_encoder
+    json_encoder = fn
+
+
+def encode_message(message, compact_encoder=None):
+    """
+    Encodes a message sent to the browser, compacting it first with
+    `compact_encoder`, a `CompactEncoder`, if one is given.
+    """
+    if compact_encoder:
+        message = compact_encoder.compact(message)
+    return json_encoder(message)
+
+
+# The maximum number of style class names in the table of a
+# `CompactEncoder`. Must match `maxStyleClasses` in
+# `frontend/src/compact.js`.
+max_style_classes = 10_000
+
+
+class CompactEncoder:
+    """
+    Rewrites the messages sent on a connection into the compact form
+    decoded by `frontend/src/compact.js`, before they are encoded.
+
+    A rendered component is a dict holding its `key`, `name`, `tag`,
+    `classes`, `props`, and optionally `styleClass` and `children`. In
+    the compact form, it is a list:
+
+        [key, schema, prop_values, style_class, children]
+
+    where `schema` indexes the table of the (name, tag, classes, prop
+    names) combinations sent on the connection, and `prop_values`
+    lists the prop values in the order of the schema's prop names.
+    `style_class` and `children` are left out when they are absent,
+    and `style_class` is `None` if only `children` is present.
+
+    Components of the same kind usually share their style class, so
+    each class name is sent once, and then referenced by its index in
+    the table of class names sent on the connection. The decoder adds
+    the class names to its table in the order it decodes them. The
+    class definitions, in `styleClasses` and `derivedStyleClasses`, and
+    the released classes, in `releasedStyleClasses`, are sent as they
+    are.
+
+    A message that uses new schemas carries their definitions in
+    `schemas`, in the order of their indexes. The schema table starts
+    empty on every connection, so replayed messages are compacted
+    again by the new connection's encoder.
+    """
+
+    def __init__(self):
+        self.schemas = dict()
+        self.new_schemas = []
+        self.style_classes = dict()
+
+    def compact(self, message):
+        message = dict(message)
+        if "dom" in message:
+            message["dom"] = self.compact_component(message["dom"])
+        if "diff" in message:
+            message["diff"] = {
+                key: self.compact_component_diff(component_diff)
+                for key, component_diff in message["diff"].items()
+            }
+        if self.new_schemas:
+            message["schemas"] = self.new_schemas
+            self.new_schemas = []
+        return message
+
+    def compact_component(self, component):
+        props = component["props"]
+        classes = component["classes"]
+        schema_key = (component["name"], component["tag"], tuple(classes), *props)
+        schema = self.schemas.get(schema_key)
+        if schema is None:
+            schema = self.schemas[schema_key] = len(self.schemas)
+            self.new_schemas.append(
+                (component["name"], component["tag"], classes, tuple(props))
+            )
+
+        output = [component["key"], schema, tuple(props.values())]
+
+        style_class = component.get("styleClass")
+        children = component.get("children")
+        if style_class is not None or children is not None:
+            output.append(
+                self.compact_style_class(style_class)
+                if style_class is not None
+                else None
+            )
+        if children is not None:
+            output.append([self.compact_component(child) for child in children])
+        return output
+
+    def compact_style_class(self, style_class):
+        index = self.style_classes.get(style_class)
+        if index is not None:
+            return index
+        if len(self.style_classes) < max_style_classes:
+            self.style_classes[style_class] = len(self.style_classes)
+        return style_class
+
+    def compact_component_diff(self, component_diff):
+        children = component_diff.get("children")
+        if not children:
+            return component_diff
+        return dict(
+            component_diff,
+            children=[self.compact_children_command(command) for command in children],
+        )
+
+    def compact_children_command(self, command):
+        if command[0] != "insert":
+            return command
+        name, start_idx, components = command
+        return (name, start_idx, [self.compact_component(c) for c in components])
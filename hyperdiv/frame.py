@@ -18,8 +18,10 @@ attempt to use the wrong frame type.
 """
 
 import contextvars
+import threading
 from .debug import logger
 from .collector import CollectorStack
+from .renderer import render_css
 
 
 class Frame:
@@ -66,7 +68,7 @@ class StateAccessFrame(Frame):
         return self._app_runner.state._get(key, prop_name)
 
     def update_state(self, key, prop_name, value):
-        prop = self._app_runner.state.get_prop(key, prop_name)
+        prop = self._app_runner.state.peek_prop(key, prop_name)
 
         if prop.is_event_prop or prop.backend_immutable:
             raise ValueError(f"Prop {prop_name} cannot be mutated.")
@@ -74,15 +76,15 @@ class StateAccessFrame(Frame):
         return self._app_runner.state._update(key, prop_name, value)
 
     def reset_state(self, key, prop_name):
-        prop = self._app_runner.state.get_prop(key, prop_name)
+        prop = self._app_runner.state.peek_prop(key, prop_name)
 
         if prop.is_event_prop:
             raise ValueError(f"Event prop {prop_name} cannot be reset.")
 
         return self._app_runner.state._reset(key, prop_name)
 
-    def init_props(self, key, props_with_values):
-        self._app_runner.state.init_props(key, props_with_values)
+    def init_props(self, key, props_with_values, prop_defs=None):
+        self._app_runner.state.init_props(key, props_with_values, prop_defs=prop_defs)
 
     def has_prop(self, key, prop_name):
         return self._app_runner.state.has_prop(key, prop_name)
@@ -90,12 +92,30 @@ class StateAccessFrame(Frame):
     def get_props(self, key):
         return self._app_runner.state.get_props(key)
 
+    def get_stored_props(self, key):
+        return self._app_runner.state.get_stored_props(key)
+
+    def persist(self, key):
+        self._app_runner.state.persist(key)
+
     def trigger_event(self, key, prop_name, value):
         self._app_runner.trigger_event(
             self._app_runner.state.get_prop(key, prop_name),
             value,
         )
 
+    def render_style(self, key, css_props):
+        """
+        Returns the fields holding the CSS of a rendered component.
+        Outside of a session, the CSS is rendered in `style`, scoped
+        to the component's key.
+        """
+        style = render_css(key, css_props)
+        return dict() if style is None else dict(style=style)
+
+    def render_component(self, component):
+        return component._render()
+
 
 class AppRunnerFrame(StateAccessFrame):
     """
@@ -116,6 +136,14 @@ class AppRunnerFrame(StateAccessFrame):
         self.collector_stack = CollectorStack()
         # The keys generated/used by the app function.
         self.keys = set()
+        # The keys of the components created by the app function,
+        # including the components reused from cache hits, in order
+        # of creation. See `AppRunner.collect_garbage`.
+        self.seen_keys = []
+        # The components created by the app function, including the
+        # components reused from cache hits, by key. See
+        # `hyperdiv.diff.Differ`.
+        self.components = dict()
         # The read dependencies generated by the app function. A set
         # of (key, prop_name) tuples.
         self.deps = set()
@@ -125,19 +153,33 @@ class AppRunnerFrame(StateAccessFrame):
         # The event mutations that need to be reset at the end of the
         # run.
         self.scope_stack = []
+        # `str(self.scope_stack)`, maintained as scopes are pushed and
+        # popped, and the previous values of it.
+        self.scope_str = "[]"
+        self.scope_strs = []
+        # The call chains of the stack frames that created
+        # components, memoized by `component_keys.get_call_chain`.
+        self.call_chains = dict()
+        # The number of keys in `seen_keys` created by `@cached`
+        # calls nested in the `@cached` call being run. See
+        # `cache.estimate_entry_bytes`.
+        self.nested_cached_keys = 0
 
     # Cache access
 
     def cache_get(self, cache_key):
         return self._app_runner.cache.get(cache_key)
 
-    def cache_put(self, cache_key, value):
-        self._app_runner.cache.put(cache_key, value)
+    def cache_peek(self, cache_key):
+        return self._app_runner.cache.peek(cache_key)
+
+    def cache_put(self, cache_key, value, build_time=0):
+        self._app_runner.cache.put(cache_key, value, build_time=build_time)
 
     # Running tasks
 
-    def task_frame(self):
-        return TaskFrame(self._app_runner)
+    def task_frame(self, batch_window=None):
+        return TaskFrame(self._app_runner, batch_window=batch_window)
 
     def run_task_on_ioloop(self, coro):
         self._app_runner.task_runtime.run_on_ioloop(coro)
@@ -153,10 +195,14 @@ class AppRunnerFrame(StateAccessFrame):
     # Scope management
 
     def push_scope(self, scope_key):
+        self.scope_strs.append(self.scope_str)
+        separator = ", " if self.scope_stack else ""
+        self.scope_str = f"{self.scope_str[:-1]}{separator}{scope_key!r}]"
         self.scope_stack.append(scope_key)
 
     def pop_scope(self):
         self.scope_stack.pop()
+        self.scope_str = self.scope_strs.pop()
 
     # Commands
 
@@ -197,10 +243,64 @@ class TaskFrame(StateAccessFrame):
 
     Tasks cannot create UI components. That check is done by the base
     Component class.
+
+    Each mutation is normally registered with the app runner as soon
+    as it happens. If `batch_window` is set (or the task runtime has a
+    default batch window), the mutations made within `batch_window`
+    seconds of the first pending mutation are registered together,
+    causing a single app run. Pending mutations are also registered
+    when the frame exits.
     """
 
+    def __init__(self, app_runner, batch_window=None):
+        super().__init__(app_runner)
+        self.batch_window = (
+            batch_window
+            if batch_window is not None
+            else app_runner.task_runtime.batch_window
+        )
+        # The mutations made within the current batch window, as an
+        # ordered set of (key, prop_name) tuples.
+        self.pending_mutations = dict()
+        self.flush_scheduled = False
+        self.mutations_lock = threading.Lock()
+
+    def __enter__(self):
+        self._app_runner.task_started()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super().__exit__(exc_type, exc_val, exc_tb)
+        self.flush_mutations()
+        self._app_runner.task_finished()
+
+    def add_mutation(self, key, prop_name):
+        # Register the task mutation with the app runner, triggering
+        # an app-rerun if the app depends on the mutated prop.
+        if not self.batch_window:
+            self._app_runner.enqueue_task_mutations([(key, prop_name)])
+            return
+
+        with self.mutations_lock:
+            self.pending_mutations[(key, prop_name)] = True
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+
+        self._app_runner.task_runtime.call_later(
+            self.batch_window, self.flush_mutations
+        )
+
+    def flush_mutations(self):
+        with self.mutations_lock:
+            mutations = list(self.pending_mutations)
+            self.pending_mutations.clear()
+            self.flush_scheduled = False
+        if mutations:
+            self._app_runner.enqueue_task_mutations(mutations)
+
     def get_state(self, key, prop_name):
-        prop = self._app_runner.state.get_prop(key, prop_name)
+        prop = self._app_runner.state.peek_prop(key, prop_name)
 
         if prop.is_event_prop:
             raise ValueError(f"Event prop '{prop_name}' cannot be accessed in a task.")
@@ -210,15 +310,12 @@ class TaskFrame(StateAccessFrame):
     def update_state(self, key, prop_name, value):
         updated = super().update_state(key, prop_name, value)
         if updated:
-            # Register the task mutation with the app runner,
-            # triggering an app-rerun if the app depends on the
-            # mutated prop.
-            self._app_runner.enqueue_task_mutations([(key, prop_name)])
+            self.add_mutation(key, prop_name)
 
     def reset_state(self, key, prop_name):
         updated = super().reset_state(key, prop_name)
         if updated:
-            self._app_runner.enqueue_task_mutations([(key, prop_name)])
+            self.add_mutation(key, prop_name)
 
 
 class UIUpdatesFrame(StateAccessFrame):
@@ -255,7 +352,7 @@ class UIUpdatesFrame(StateAccessFrame):
             self._app_runner.ui_prop_state.set_prop_value(prop)
 
     def reset_state(self, key, prop_name):
-        prop = self._app_runner.state.get_prop(key, prop_name)
+        prop = self._app_runner.state.peek_prop(key, prop_name)
 
         updated = self._app_runner.state._reset(key, prop_name)
         if updated:
@@ -278,7 +375,7 @@ class ResetUIEventsFrame(StateAccessFrame):
     def get_state(self, key, prop_name):
         raise Exception("Cannot access state.")
 
-    def init_props(self, key, props_with_values):
+    def init_props(self, key, props_with_values, prop_defs=None):
         raise Exception("Cannot access state.")
 
     def has_prop(self, key, prop_name):
@@ -290,11 +387,14 @@ class ResetUIEventsFrame(StateAccessFrame):
     def get_props(self, key):
         raise Exception("Cannot access state.")
 
+    def get_stored_props(self, key):
+        raise Exception("Cannot access state.")
+
     def trigger_event(self, prop, value):
         raise Exception("Cannot access state.")
 
     def reset_state(self, key, prop_name):
-        prop = self._app_runner.state.get_prop(key, prop_name)
+        prop = self._app_runner.state.peek_prop(key, prop_name)
         if not prop.is_event_prop:
             raise ValueError(f"Cannot reset non-event prop {prop_name}.")
         self._app_runner.state._reset(key, prop_name)
@@ -322,3 +422,21 @@ class RenderFrame(StateAccessFrame):
 
     def prop_changed(self, prop):
         return self._app_runner.ui_prop_state.prop_changed(prop)
+
+    def render_style(self, key, css_props):
+        return self._app_runner.ui_prop_state.render_style(key, css_props)
+
+    def render_component(self, component):
+        return self._app_runner.ui_prop_state.render_component(component)
+
+    def render_style_diff(self, key, css_props):
+        return self._app_runner.ui_prop_state.render_style_diff(key, css_props)
+
+    def get_dirty_keys(self):
+        return self._app_runner.state.dirty_keys
+
+    def get_child_keys(self):
+        return self._app_runner.ui_prop_state.child_keys
+
+    def set_child_keys(self, component):
+        self._app_runner.ui_prop_state.set_child_keys(component)
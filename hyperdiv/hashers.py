@@ -0,0 +1,205 @@
+import marshal
+import xxhash
+from cachetools.keys import hashkey
+
+hashers = dict()
+
+# The hashers of types, including the hashers inherited from base
+# types, resolved by `get_hasher`.
+resolved_hashers = dict()
+
+# Values of these types are used in cache keys as they are.
+scalar_types = frozenset((str, int, float, bool, type(None), bytes))
+
+container_types = (list, tuple, set, frozenset, dict)
+
+
+def register_hasher(typ, fn):
+    """
+    `@cached` functions, and `shared_cache` functions, are re-run
+    when they are called with new arguments. Hashable arguments are
+    compared with `==`, and lists, tuples, sets and dicts are compared
+    by their contents. Arguments of other unhashable types are
+    rejected, unless a hasher is registered for their type with
+    `register_hasher`.
+
+    The hasher function takes a value of the given type, or of one of
+    its subclasses, and returns a hashable summary of the value's
+    contents, like a tuple or a digest. Values with equal summaries
+    are considered the same argument.
+
+    For example, Hyperdiv automatically adds a hasher for
+    `numpy.ndarray`, like this:
+
+    ```py-nodemo
+    hd.register_hasher(
+        numpy.ndarray,
+        lambda a: (a.dtype.str, a.shape, xxhash.xxh3_128_digest(a.tobytes())),
+    )
+    ```
+
+    A value passed multiple times to the same call, like a value
+    referenced by several arguments, is only hashed once.
+    """
+    hashers[typ] = fn
+    resolved_hashers.clear()
+
+
+def get_hasher(typ):
+    try:
+        return resolved_hashers[typ]
+    except KeyError:
+        pass
+    hasher = None
+    for base in typ.__mro__:
+        hasher = hashers.get(base)
+        if hasher is not None:
+            break
+    resolved_hashers[typ] = hasher
+    return hasher
+
+
+class ContentKey:
+    """
+    The cache key of an unhashable value, made of its type and a
+    hashable summary of its contents.
+    """
+
+    __slots__ = ("typ", "content", "hash")
+
+    def __init__(self, typ, content):
+        self.typ = typ
+        self.content = content
+        self.hash = hash((typ, content))
+
+    def __eq__(self, other):
+        return (
+            type(other) is ContentKey
+            and self.typ is other.typ
+            and self.hash == other.hash
+            and self.content == other.content
+        )
+
+    def __hash__(self):
+        return self.hash
+
+    def __repr__(self):
+        return f"ContentKey({self.typ.__name__}, {self.content!r})"
+
+
+def digest(value):
+    """
+    Digests a container, made of nested lists, tuples, sets and dicts
+    of scalars, in a single call into C. Raises `ValueError` if the
+    container holds other types.
+
+    Version 2 of the marshal format is used because it doesn't
+    reference repeated objects, so the output depends only on the
+    contents of the container.
+    """
+    return xxhash.xxh3_128_digest(marshal.dumps(value, 2))
+
+
+def hash_container(value, memo):
+    typ = type(value)
+    try:
+        return ContentKey(typ, digest(value))
+    except ValueError:
+        pass
+    if isinstance(value, dict):
+        return ContentKey(
+            typ,
+            tuple((hash_value(k, memo), hash_value(v, memo)) for k, v in value.items()),
+        )
+    if isinstance(value, (set, frozenset)):
+        return ContentKey(typ, frozenset(hash_value(item, memo) for item in value))
+    return ContentKey(typ, tuple(hash_value(item, memo) for item in value))
+
+
+def make_key(value, memo):
+    typ = type(value)
+    hasher = get_hasher(typ)
+    if hasher is not None:
+        return ContentKey(typ, hasher(value))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+    if isinstance(value, container_types):
+        return hash_container(value, memo)
+    raise TypeError(
+        f"Cannot use a value of unhashable type {typ.__name__} as a cache key. "
+        "You can register a hasher for it with `hd.register_hasher`."
+    )
+
+
+def hash_value(value, memo=None):
+    """
+    Returns a hashable key identifying `value`: the value itself if
+    it is hashable, or a `ContentKey` summarizing its contents.
+
+    `memo` optionally maps the ids of values to their keys, so a value
+    referenced multiple times is hashed once. The caller is
+    responsible for discarding the memo before the values in it may
+    be mutated.
+    """
+    if type(value) in scalar_types:
+        return value
+    if memo is not None:
+        memoized = memo.get(id(value))
+        if memoized is not None and memoized[0] is value:
+            return memoized[1]
+    key = make_key(value, memo)
+    if memo is not None and key is not value:
+        memo[id(value)] = (value, key)
+    return key
+
+
+def content_hashkey(args, kwargs):
+    """
+    Like `cachetools.keys.hashkey(*args, **kwargs)`, but supports
+    unhashable arguments, using `hash_value`.
+
+    The memo of hashed values is scoped to this call, since arguments
+    may be mutated in place between calls.
+    """
+    memo = dict()
+    return hashkey(
+        *[hash_value(arg, memo) for arg in args],
+        **{name: hash_value(arg, memo) for name, arg in kwargs.items()},
+    )
+
+
+try:
+    import numpy
+
+    def hash_ndarray(array):
+        if array.dtype.hasobject:
+            return hash_value(array.tolist())
+        return (
+            array.dtype.str,
+            array.shape,
+            xxhash.xxh3_128_digest(numpy.ascontiguousarray(array)),
+        )
+
+    register_hasher(numpy.ndarray, hash_ndarray)
+except Exception:
+    pass
+
+try:
+    from pandas import DataFrame, Series
+    from pandas.util import hash_pandas_object
+
+    def hash_pandas(value):
+        dtypes = value.dtypes if isinstance(value, DataFrame) else [value.dtype]
+        return (
+            hash_value(list(getattr(value, "columns", [value.name]))),
+            tuple(str(dtype) for dtype in dtypes),
+            xxhash.xxh3_128_digest(hash_pandas_object(value, index=True).to_numpy()),
+        )
+
+    register_hasher(DataFrame, hash_pandas)
+    register_hasher(Series, hash_pandas)
+except Exception:
+    pass
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import threading
+from .sqlite import sqlite, sqlite_tx, retry
+
+
+class HibernationStore:
+    """
+    A local sqlite store holding the snapshots of hibernated user
+    sessions, keyed by session ID. A snapshot is an opaque blob,
+    produced by `AppRunner.hibernate`.
+
+    The store lives in a temporary database file, since hibernated
+    sessions do not outlive the process that hibernated them. The
+    snapshots are unpickled when sessions are rehydrated, so the file
+    is created in a new directory readable only by the current user,
+    rather than at a predictable path in the shared temp directory.
+    `close()` removes the file, along with that directory.
+    """
+
+    def __init__(self, db_path=None):
+        # The private directory created for the database, if no
+        # `db_path` was given.
+        self.db_dir = None
+        if not db_path:
+            self.db_dir = tempfile.mkdtemp(prefix="hyperdiv-sessions-")
+            db_path = os.path.join(self.db_dir, "sessions.db")
+        self.db_path = db_path
+        # Guards `closed`, so that runners stopping concurrently with
+        # `close()` do not recreate the removed database file.
+        self.lock = threading.Lock()
+        self.closed = False
+
+        with sqlite_tx(self.db_path) as (_, cursor):
+            cursor.execute(
+                "create table if not exists Session "
+                "(session_id text primary key, snapshot blob not null)"
+            )
+
+    @retry
+    def put(self, session_id, snapshot):
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("The hibernation store is closed.")
+            with sqlite(self.db_path) as (_, cursor):
+                cursor.execute(
+                    "insert or replace into Session (session_id, snapshot) "
+                    "values (?, ?)",
+                    (session_id, snapshot),
+                )
+
+    @retry
+    def take(self, session_id):
+        """
+        Removes the snapshot of the given session from the store and
+        returns it, or returns `None` if there is no such snapshot.
+        """
+        with self.lock:
+            if self.closed:
+                return None
+            with sqlite_tx(self.db_path) as (_, cursor):
+                cursor.execute(
+                    "select snapshot from Session where session_id = ?",
+                    (session_id,),
+                )
+                rows = cursor.fetchall()
+                cursor.execute(
+                    "delete from Session where session_id = ?", (session_id,)
+                )
+        return rows[0]["snapshot"] if rows else None
+
+    @retry
+    def delete(self, session_id):
+        with self.lock:
+            if self.closed:
+                return
+            with sqlite(self.db_path) as (_, cursor):
+                cursor.execute(
+                    "delete from Session where session_id = ?", (session_id,)
+                )
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if self.db_dir:
+                shutil.rmtree(self.db_dir, ignore_errors=True)
+                return
+            try:
+                os.remove(self.db_path)
+            except FileNotFoundError:
+                pass
@@ -5,8 +5,12 @@ import socket
 import time
 import sys
 import os
+from tornado.netutil import bind_sockets
 from .server import Server
+from .prefork import WorkerPool
 from .task_runtime import TaskRuntime
+from .session_scheduler import SessionScheduler
+from .hibernation import HibernationStore
 from .index_page import index_page as create_index_page
 from .debug import PRODUCTION_LOCAL
 
@@ -61,16 +65,51 @@ def wait_for_port(port):
         time.sleep(0.05)
 
 
+def announce(port, workers=None):
+    print(
+        f"Running at http://{os.environ.get('HD_HOST', 'localhost')}:{port}"
+        + (f" with {workers} workers" if workers else ""),
+        file=sys.stderr,
+    )
+    print("Ctrl-C to exit", file=sys.stderr)
+
+
+def exit_with_port_error(port, e):
+    print(f"Failed to start on port {port}. {e}")
+    print(
+        "Try using a different port:",
+        colored(f"HD_PORT=[port] python {sys.argv[0]}", "blue"),
+    )
+    sys.exit(1)
+
+
+def browse(port):
+    webbrowser.open(f"http://{os.environ.get('HD_HOST', 'localhost')}:{port}")
+
+
 def open_browser(port):
     def run():
         wait_for_port(port)
-        webbrowser.open(f"http://{os.environ.get('HD_HOST', 'localhost')}:{port}")
+        browse(port)
 
     thread = threading.Thread(target=run)
     thread.start()
 
 
-def run(app_function, task_threads=10, executor=None, index_page=None):
+def run(
+    app_function,
+    task_threads=10,
+    executor=None,
+    index_page=None,
+    session_threads=None,
+    workers=None,
+    resume_timeout=None,
+    hibernate_after=None,
+    task_batch_window=None,
+    state_gc_runs=None,
+    compact_protocol=False,
+    compression=None,
+):
     """
     The entrypoint into Hyperdiv.
 
@@ -94,39 +133,169 @@ def run(app_function, task_threads=10, executor=None, index_page=None):
     * `executor`: A
       [ThreadPoolExecutor](https://docs.python.org/3/library/concurrent.futures.html)
       in which to run @component(task) functions. If this argument is
-      non-`None`, `task_threads` will be ignored.
+      non-`None`, `task_threads` will be ignored. Can't be combined
+      with `workers`, since the threads of an executor created before
+      forking don't exist in the forked workers.
+
+    * `task_batch_window`: By default, every prop update made by a
+      @component(task) function immediately causes the app function
+      to re-run. If `task_batch_window` is set, the updates made by a
+      task within `task_batch_window` seconds are batched into a
+      single re-run. Individual tasks can override this setting with
+      their own `batch_window`.
 
     * `index_page`: An index page generated with @component(index_page).
 
+    * `session_threads`: By default, each connected user session runs
+      the app function on its own thread. If `session_threads` is
+      set, user sessions instead share a pool of `session_threads`
+      threads, and a session occupies a thread only while it is
+      processing updates. This keeps the thread count bounded when
+      many sessions are connected, most of which are idle.
+
+    * `workers`: By default, Hyperdiv serves all user sessions from a
+      single process. If `workers` is set, Hyperdiv forks `workers`
+      worker processes that share the listening socket, so user
+      sessions are spread across multiple CPU cores. The parent
+      process supervises the workers: it restarts workers that exit
+      unexpectedly, and when it receives SIGINT or SIGTERM, it lets
+      the workers close their connections and waits for them to
+      exit. The state of a user session lives in the worker that
+      accepted its connection, so a browser that reconnects to a
+      different worker starts a new session. Each worker creates its
+      own task threads, so `executor` can't be set. Requires a
+      platform that supports `os.fork()`.
+
+    * `resume_timeout`: By default, a user session ends as soon as
+      its connection drops, and a reconnecting browser starts a new
+      session. If `resume_timeout` is set, the session is instead
+      kept for `resume_timeout` seconds after its connection drops.
+      If the browser reconnects within that time, the session
+      resumes with its state intact, and the browser only receives
+      the updates it missed.
+
+    * `hibernate_after`: If set, user sessions that receive no input
+      for `hibernate_after` seconds, like sessions in background
+      tabs, are hibernated: the values of their mutated props are
+      saved to a local sqlite database, and the session's state,
+      cache, and thread are released. The next event or reconnect
+      restores the saved values and re-runs the app, and the session
+      continues transparently. Sessions with running tasks, or whose
+      state can't be pickled, are not hibernated.
+
+    * `state_gc_runs`: By default, the state of every component ever
+      rendered in a user session, like every row of every table page
+      ever shown, is kept until the session ends. If `state_gc_runs`
+      is set, the state of components that have not been rendered in
+      the last `state_gc_runs` runs of the app is dropped, including
+      their mutated props, and a component rendered again later
+      starts from its initial state. Components whose state should
+      survive can be marked with `component.persist()`. The state of
+      singletons and of @component(global_state) components is
+      always kept.
+
+    * `compact_protocol`: If `True`, browsers that support it are sent
+      the UI in a compact form, in which the component type, CSS
+      classes, and prop names shared by components are sent once per
+      connection, instead of once per component. This makes the
+      messages of pages rendering many similar components, like large
+      tables, several times smaller.
+
+    * `compression`: If set, messages sent to browsers that support
+      it are compressed with zlib. Either `True`, or a dict overriding
+      the default settings, `dict(level=6, mem_level=8,
+      min_size=1024)`: `level` and `mem_level` are the zlib
+      compression level and memory level, and messages smaller than
+      `min_size` bytes are sent uncompressed. The messages of a
+      connection are compressed as a single zlib stream, so repeated
+      content across messages compresses well, at the cost of up to
+      about 256KB of zlib state per connection with the default
+      settings. Messages are compressed on the thread of the session
+      sending them. This helps users on slow links, at the cost of
+      CPU time spent compressing.
+
     * `port`: The port on which to start the web server. By default,
       the port is `8888`. Alternatively, the port can be set with the
       `HD_PORT` environment variable.
 
     """
+    if workers and executor is not None:
+        raise ValueError("`executor` can't be combined with `workers`.")
+
     port = get_port()
+    index_page = index_page or create_index_page()
 
-    task_runtime = TaskRuntime(task_threads, executor=executor)
-    server = Server(
-        port,
-        app_function,
-        task_runtime,
-        index_page=index_page or create_index_page(),
-    )
-    try:
-        server.listen()
-    except Exception as e:
-        print(f"Failed to start on port {server.port}. {e}")
-        print(
-            "Try using a different port:",
-            colored(f"HD_PORT=[port] python {sys.argv[0]}", "blue"),
+    def serve(sockets=None):
+        task_runtime = TaskRuntime(
+            task_threads, executor=executor, batch_window=task_batch_window
         )
+        scheduler = SessionScheduler(session_threads) if session_threads else None
+        hibernation_store = HibernationStore() if hibernate_after else None
+        server = Server(
+            port,
+            app_function,
+            task_runtime,
+            index_page=index_page,
+            scheduler=scheduler,
+            resume_timeout=resume_timeout,
+            hibernate_after=hibernate_after,
+            hibernation_store=hibernation_store,
+            state_gc_runs=state_gc_runs,
+            compact_protocol=compact_protocol,
+            compression=compression,
+        )
+        try:
+            if sockets is None:
+                server.listen()
+            else:
+                server.add_sockets(sockets)
+        except Exception as e:
+            task_runtime.shutdown()
+            if scheduler:
+                scheduler.shutdown()
+            if hibernation_store:
+                hibernation_store.close()
+            exit_with_port_error(port, e)
+
+        if sockets is None:
+            announce(port)
+            if PRODUCTION_LOCAL:
+                open_browser(server.port)
+
+        server.start()
+
+        # At this point, the server has shut down.
         task_runtime.shutdown()
-        sys.exit(1)
+        if scheduler:
+            scheduler.shutdown()
+        if hibernation_store:
+            hibernation_store.close()
+
+    if not workers:
+        serve()
+        return
+
+    # Bind the listening sockets in the parent process, so they are
+    # shared by all the forked workers.
+    try:
+        sockets = bind_sockets(
+            port, address=os.environ.get("HD_HOST", "localhost"), reuse_port=True
+        )
+    except Exception as e:
+        exit_with_port_error(port, e)
 
-    if PRODUCTION_LOCAL:
-        open_browser(server.port)
+    announce(port, workers=workers)
 
-    server.start()
+    # The browser is opened once the workers are forked, from the
+    # parent's own thread. A thread started before forking would not
+    # exist in the workers, and could leave them holding its locks.
+    # The sockets are already listening, so there is no need to wait
+    # for the port.
+    WorkerPool(
+        workers,
+        lambda: serve(sockets),
+        on_start=(lambda: browse(port)) if PRODUCTION_LOCAL else None,
+    ).run()
 
-    # At this point, the server has shut down.
-    task_runtime.shutdown()
+    for sock in sockets:
+        sock.close()
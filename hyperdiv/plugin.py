@@ -179,7 +179,7 @@ class Plugin(Component, Styled, metaclass=PluginAssetsCollector):
         """Helper to define a CSS link asset."""
         return ("css-link", asset)
 
-    def render(self):
+    def _render(self):
         """
         The JSON-rendered form of the plugin that is sent to the browser.
         """
@@ -191,7 +191,7 @@ class Plugin(Component, Styled, metaclass=PluginAssetsCollector):
         assets_root = plugin_config.get("assets_root")
         assets_paths = plugin_config.get("assets", [])
 
-        output = super().render()
+        output = super()._render()
 
         if assets_root:
             output["assetsRoot"] = f"{PLUGINS_PREFIX}/{plugin_name}"
@@ -0,0 +1,148 @@
+import gc
+import os
+import random
+import signal
+import sys
+import time
+import traceback
+from .debug import logger
+
+
+class WorkerPool:
+    """
+    Forks `num_workers` worker processes that each run `worker_fn`,
+    and supervises them until the pool is stopped.
+
+    The parent process is expected to have imported the app and bound
+    the listening sockets before starting the pool, so that the
+    workers inherit them. Before forking, the parent freezes the
+    garbage collector, so the objects allocated by the import are
+    shared copy-on-write between workers instead of being copied into
+    each worker when the collector touches them.
+
+    While the pool is running, a worker that exits is restarted. On
+    SIGINT or SIGTERM, the parent forwards SIGTERM to the workers,
+    letting each one drain its connections and exit, and waits for
+    them. Workers that are still alive after `drain_timeout` seconds
+    are killed.
+
+    If given, `on_start` is called in the parent once the workers are
+    forked. It must not start threads, since the parent forks again
+    to restart workers.
+    """
+
+    # If a worker exits sooner than this many seconds after it was
+    # started, wait this long before restarting it, to avoid a tight
+    # restart loop when workers crash on startup.
+    restart_delay = 1
+
+    def __init__(self, num_workers, worker_fn, drain_timeout=30, on_start=None):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Running multiple workers requires os.fork().")
+        if num_workers < 1:
+            raise ValueError("A worker pool needs at least one worker.")
+        self.num_workers = num_workers
+        self.worker_fn = worker_fn
+        self.drain_timeout = drain_timeout
+        self.on_start = on_start
+        # Maps the pid of each live worker to its start time.
+        self.workers = dict()
+        self.stopping = False
+        self.stop_time = None
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self.run_worker()
+        self.workers[pid] = time.monotonic()
+
+    def run_worker(self):
+        """
+        Runs in the forked worker process and never returns.
+        """
+        exit_code = 0
+        try:
+            # The worker sets up its own signal handling.
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # Avoid all workers sharing the parent's random state.
+            random.seed()
+            self.worker_fn()
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def stop(self, sig, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        self.stop_time = time.monotonic()
+        logger.info(f"Stopping {len(self.workers)} workers with signal {sig}.")
+        self.signal_workers(signal.SIGTERM)
+
+    def signal_workers(self, sig):
+        for pid in self.workers:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        """
+        Collects exited workers and restarts them, unless the pool is
+        stopping.
+        """
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            start_time = self.workers.pop(pid, None)
+            if start_time is None:
+                continue
+
+            exit_code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                continue
+
+            if exit_code == 0:
+                logger.warning(f"Worker {pid} exited. Restarting.")
+            else:
+                logger.error(f"Worker {pid} exited with code {exit_code}. Restarting.")
+
+            if time.monotonic() - start_time < WorkerPool.restart_delay:
+                time.sleep(WorkerPool.restart_delay)
+            self.spawn()
+
+    def run(self):
+        """
+        Forks the workers and supervises them. Returns after the pool
+        is stopped and all the workers have exited.
+        """
+        gc.freeze()
+
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        for _ in range(self.num_workers):
+            self.spawn()
+
+        if self.on_start:
+            self.on_start()
+
+        while self.workers:
+            self.reap()
+            if (
+                self.stopping
+                and self.workers
+                and time.monotonic() - self.stop_time > self.drain_timeout
+            ):
+                logger.error(f"Killing {len(self.workers)} workers that did not exit.")
+                self.signal_workers(signal.SIGKILL)
+                self.stop_time = time.monotonic()
+            time.sleep(0.1)
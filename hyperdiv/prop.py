@@ -2,6 +2,20 @@ from .frame import StateAccessFrame
 from .prop_types import Event, CSS
 from .equalities import equalities
 
+# The types of init values that are immutable, so a `StoredProp`
+# initialized with the same value as on the previous frame can skip
+# parsing it.
+immutable_types = (str, int, float, bool, type(None), bytes)
+# Memoizes the results of `HyperdivType.parse` on scalar values,
+# keyed by (prop type, value type, value). The value type is part of
+# the key since equal values of different types, like `1` and `True`,
+# can parse differently. The memo is cleared when it exceeds its
+# bound. Long strings, like text content, are not memoized.
+parse_memo = dict()
+max_parse_memo_size = 10_000
+max_memoized_str_len = 100
+memoized_types = (str, int, float, bool)
+
 
 def to_caml_case(name):
     parts = name.split("_")
@@ -37,11 +51,44 @@ class Prop:
         self.backend_immutable = backend_immutable
         self.internal = internal
 
+        # Metadata shared by all the `StoredProp`s of this prop.
+
+        # Whether this prop is a resettable event prop like `clicked`
+        self.is_event_prop = isinstance(prop_type, Event)
+        # Whether this is a CSS/style prop, which will get translated
+        # to CSS instead of a component attribute.
+        self.is_css_prop = isinstance(prop_type, CSS)
+        # Event props are never shipped to the UI.
+        self.is_internal = internal or self.is_event_prop
+        # The name that is shipped to the UI. Set in `set_ui_name()`.
+        self.resolved_ui_name = None
+        self.set_ui_name()
+
+        # See `default_stored_prop()`.
+        self._default_stored_prop = None
+
+    def set_ui_name(self, camlcase_ui_name=None):
+        """Computes the name that is shipped to the UI. Some shoelace
+        attributes are named `type` and `open` which are Python
+        keywords/built-ins. In that case, they'll be named
+        `item_type`, `opened` etc. on the Python side, and given an
+        explicit `ui_name`.
+        """
+        if camlcase_ui_name is not None:
+            self.camlcase_ui_name = camlcase_ui_name
+        if self.ui_name:
+            self.resolved_ui_name = self.ui_name
+        elif self.camlcase_ui_name and self.name:
+            self.resolved_ui_name = to_caml_case(self.name)
+        else:
+            self.resolved_ui_name = self.name
+
     def __set_name__(self, klass, name):
         """Called when the definition of `klass` is interpreted by Python, on
         module load. `name` is the prop's attribute name.
         """
         self.name = name
+        self.set_ui_name()
 
     def __get__(self, component, objtype):
         """Called when the prop attribute is read."""
@@ -53,31 +100,40 @@ class Prop:
         """Called when the prop attribute is written."""
         return StateAccessFrame.current().update_state(component._key, self.name, value)
 
+    def default_stored_prop(self):
+        """Returns a `StoredProp` holding the default value of this prop,
+        which stands in for the prop in components that don't store
+        it. See `ApplicationState`. It is shared, and never mutated.
+        """
+        if self._default_stored_prop is None:
+            stored_prop = StoredProp(None, self)
+            stored_prop.init(self.default_value)
+            self._default_stored_prop = stored_prop
+        return self._default_stored_prop
+
 
 class StoredProp:
     """A `StoredProp` is the runtime representation of a prop. A
     `StoredProp` is what is actually stored in `State` and holds the
     current value of the prop.
+
+    There is a `StoredProp` per prop per component, so it only holds
+    per-component state. The static metadata of the prop, like its
+    name and type, is read from its `Prop`.
     """
 
+    __slots__ = ("key", "prop", "value", "mutated", "init_value", "raw_init_value")
+
     Unset = object()
 
     def __init__(self, key, prop):
         """`key` is the key of the component to which this prop is
-        attached. The other args come from `Prop`. See `create()`
+        attached. `prop` is the `Prop` describing it. See `create()`
         below.
         """
         self.key = key
         self.prop = prop
 
-        self.name = prop.name
-        self.ui_name = prop.ui_name
-        self.camlcase_ui_name = prop.camlcase_ui_name
-        self.prop_type = prop.prop_type
-        self.default_value = prop.default_value
-        self.backend_immutable = prop.backend_immutable
-        self.internal = prop.internal
-
         # The value of the prop. This value starts off as Unset and is
         # set in init() when the component is first instantiated.
         self.value = StoredProp.Unset
@@ -91,43 +147,108 @@ class StoredProp:
         # component is first instantiated.
         self.init_value = StoredProp.Unset
 
-        # Whether this prop is a resettable event prop like `clicked`
-        self.is_event_prop = isinstance(prop.prop_type, Event)
-        if self.is_event_prop:
-            self.internal = True
+        # The unparsed value `init_value` was parsed from.
+        self.raw_init_value = StoredProp.Unset
 
-        # Whether this is a CSS/style prop, which will get translated
-        # to CSS instead of a component attribute.
-        self.is_css_prop = isinstance(prop.prop_type, CSS)
-
-        # The name that is shipped to the UI. Some shoelace attributes
-        # are named `type` and `open` which are Python
-        # keywords/built-ins. In that case, they'll be named
-        # `item_type`, `opened` etc. on the Python side.
-        if prop.ui_name:
-            self.ui_name = prop.ui_name
-        elif self.camlcase_ui_name:
-            self.ui_name = to_caml_case(prop.name)
-        else:
-            self.ui_name = prop.name
+    @property
+    def name(self):
+        return self.prop.name
+
+    @property
+    def ui_name(self):
+        return self.prop.resolved_ui_name
+
+    @property
+    def camlcase_ui_name(self):
+        return self.prop.camlcase_ui_name
+
+    @property
+    def prop_type(self):
+        return self.prop.prop_type
+
+    @property
+    def default_value(self):
+        return self.prop.default_value
+
+    @property
+    def backend_immutable(self):
+        return self.prop.backend_immutable
+
+    @property
+    def internal(self):
+        return self.prop.is_internal
+
+    @property
+    def is_event_prop(self):
+        return self.prop.is_event_prop
+
+    @property
+    def is_css_prop(self):
+        return self.prop.is_css_prop
 
     def init(self, value):
-        """Called on every frame."""
+        """
+        Called on every frame. Returns whether the value of the prop
+        changed.
+        """
         # Keep tracking the latest init value to use when resetting
         # this prop.
-        parsed = self.parse(value)
+        raw_init_value = self.raw_init_value
+        if (
+            type(value) in immutable_types
+            and type(value) is type(raw_init_value)
+            and (value is raw_init_value or value == raw_init_value)
+        ):
+            parsed = self.init_value
+        else:
+            parsed = self.parse(value)
+            self.raw_init_value = value
         self.init_value = parsed
-        if not self.mutated:
-            self.value = parsed
+        if self.mutated:
+            return False
+        changed = self.value is StoredProp.Unset or self.init_value_changed(
+            self.value, parsed
+        )
+        self.value = parsed
+        return changed
+
+    def init_value_changed(self, old, new):
+        if old is new:
+            return False
+        # Component values, like `style` parts, are re-created on
+        # every frame. Their own props are tracked under their own
+        # key, so they are compared by key.
+        old_key = getattr(old, "_key", None)
+        if old_key is not None and type(old) is type(new):
+            return old_key != new._key
+        return self.value_changed(old, new)
 
     def parse(self, value):
+        prop_type = self.prop.prop_type
+        memo_key = None
+        if (
+            type(value) in memoized_types
+            and prop_type.memoize_parse
+            and (type(value) is not str or len(value) <= max_memoized_str_len)
+        ):
+            memo_key = (prop_type, type(value), value)
+            parsed = parse_memo.get(memo_key, StoredProp.Unset)
+            if parsed is not StoredProp.Unset:
+                return parsed
+
         try:
-            return self.prop_type.parse(value)
+            parsed = prop_type.parse(value)
         except Exception as e:
-            raise ValueError(f"Parse error in prop '{self.name}': {e}") from e
+            raise ValueError(f"Parse error in prop '{self.prop.name}': {e}") from e
+
+        if memo_key is not None:
+            if len(parse_memo) >= max_parse_memo_size:
+                parse_memo.clear()
+            parse_memo[memo_key] = parsed
+        return parsed
 
     def render(self):
-        return self.prop_type.render(self.value)
+        return self.prop.prop_type.render(self.value)
 
     def value_changed(self, old, new):
         try:
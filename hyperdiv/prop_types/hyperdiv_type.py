@@ -18,8 +18,14 @@ class HyperdivType:
 
     Custom types used to define internal state props don't have
     to implement `render`.
+
+    `parse` is expected to depend only on `value`, so the results of
+    parsing scalar values are memoized. Types whose `parse` has other
+    inputs should set `memoize_parse` to `False`.
     """
 
+    memoize_parse = True
+
     def parse(self, value):
         return value
 
@@ -1,5 +1,6 @@
 from jinja2 import Template
 import json
+import xxhash
 from .prop_types import Bool
 
 selector_template = "{selector}"
@@ -40,7 +41,12 @@ def flatten_style(style):
     return output
 
 
-def render_css(key, css_props):
+def render_css_declarations(root_selector, css_props):
+    """
+    Renders the CSS of a component, selected by `root_selector`, into
+    a dict mapping each selector to a dict of CSS declarations.
+    Selectors with no declarations are left out.
+    """
     # TODO: fix circular import
     from .style_part import StylePart
 
@@ -59,8 +65,6 @@ def render_css(key, css_props):
         else:
             root_props.append(prop)
 
-    root_selector = f"#{key}"
-
     # Render the root style
     style = {
         css_key.format(selector=root_selector): css_value
@@ -103,9 +107,59 @@ def render_css(key, css_props):
                 style[base_selector][attr_name] = attr_value
                 root_style.pop(attr_name)
 
+    return {selector: css for selector, css in style.items() if css}
+
+
+def render_css(key, css_props):
+    style = render_css_declarations(f"#{key}", css_props)
+    if style is None:
+        return None
     return flatten_style(style)
 
 
+def render_style_class(css_props):
+    """
+    Renders the CSS of a component as a style class shared by the
+    components with identical CSS. Returns `None` if the component
+    has no CSS, or a `(class_name, style)` tuple, where `style` maps
+    selector suffixes, like `""`, `":hover"`, or `"::part(base)"`,
+    to dicts of CSS declarations, and `class_name` is derived from a
+    hash of `style`.
+    """
+    style = render_css_declarations("", css_props)
+    if not style:
+        return None
+    digest = xxhash.xxh3_64_hexdigest(
+        "".join(f"{suffix}{{{css}}}" for suffix, css in flatten_style(style).items())
+    )
+    return f"s{digest}", style
+
+
+def diff_css(old_style, new_style):
+    """
+    Given two styles, as returned by `render_css_declarations`,
+    returns a dict mapping each changed selector to `None`, if the
+    selector was removed, or to a dict of its changed declarations.
+    In that dict, a removed declaration maps to `None`.
+    """
+    output = dict()
+
+    for selector in old_style:
+        if selector not in new_style:
+            output[selector] = None
+
+    for selector, css in new_style.items():
+        old_css = old_style.get(selector, dict())
+        changes = {name: None for name in old_css if name not in css}
+        for name, value in css.items():
+            if old_css.get(name) != value:
+                changes[name] = value
+        if changes:
+            output[selector] = changes
+
+    return output
+
+
 def render_slot_name(name):
     return name.replace("_", "-")
 
@@ -123,9 +177,10 @@ def render_props(key, props):
 
     output = dict(props={prop.ui_name: prop.render() for prop in normal_props})
 
-    style = render_css(key, css_props)
-    if style is not None:
-        output["style"] = style
+    # TODO: fix circular import
+    from .frame import StateAccessFrame
+
+    output |= StateAccessFrame.current().render_style(key, css_props)
 
     return output
 
@@ -2,11 +2,12 @@ import datetime
 import os
 import sys
 import signal
-from tornado.web import Application, StaticFileHandler, HTTPError
+from collections import Counter
+from tornado.web import Application, StaticFileHandler, RequestHandler, HTTPError
 from tornado.httpserver import HTTPServer
-from tornado.ioloop import IOLoop
-from .debug import logger, PRODUCTION
-from .connection import Connection
+from tornado.ioloop import IOLoop, PeriodicCallback
+from .debug import logger, PRODUCTION, SERVE_STATS
+from .connection import Connection, get_compression_settings
 from .plugin import PluginAssetsCollector, PLUGINS_PREFIX
 from .frontend import get_frontend_public_path
 
@@ -14,14 +15,48 @@ from .frontend import get_frontend_public_path
 class Server:
     _instance = None
 
-    def __init__(self, port, app_function, task_runtime, index_page):
+    # The websocket ping interval and timeout, in seconds. A
+    # connection whose peer doesn't answer a ping within the timeout
+    # is closed, so sessions of abandoned sockets are reclaimed
+    # without waiting for TCP to time out. The timeout can't be
+    # longer than the interval.
+    ping_interval = 10
+    ping_timeout = 10
+
+    def __init__(
+        self,
+        port,
+        app_function,
+        task_runtime,
+        index_page,
+        scheduler=None,
+        resume_timeout=None,
+        hibernate_after=None,
+        hibernation_store=None,
+        state_gc_runs=None,
+        compact_protocol=False,
+        compression=None,
+    ):
         if Server._instance:
             raise Exception("Hyperdiv is already running.")
         Server._instance = self
         self.port = port
         self.app_function = app_function
         self.task_runtime = task_runtime
+        self.scheduler = scheduler
+        self.resume_timeout = resume_timeout
+        self.state_gc_runs = state_gc_runs
+        self.compact_protocol = compact_protocol
+        self.compression = get_compression_settings(compression)
         self.ioloop = IOLoop.current()
+        self.hibernation_checker = None
+        if hibernate_after:
+            self.hibernation_checker = PeriodicCallback(
+                lambda: Connection.hibernate_idle_sessions(
+                    hibernation_store, hibernate_after
+                ),
+                min(hibernate_after / 2, 60) * 1000,
+            )
         self.app = self.create_application(index_page)
         self.server = HTTPServer(self.app)
         self.stopping = False
@@ -29,16 +64,16 @@ class Server:
     def listen(self):
         self.server.listen(self.port, address=os.environ.get("HD_HOST", "localhost"))
 
-    def start(self):
-        print(
-            f"Running at http://{os.environ.get('HD_HOST', 'localhost')}:{self.port}",
-            file=sys.stderr,
-        )
-        print("Ctrl-C to exit", file=sys.stderr)
+    def add_sockets(self, sockets):
+        self.server.add_sockets(sockets)
 
+    def start(self):
         signal.signal(signal.SIGINT, self.stop)
         signal.signal(signal.SIGTERM, self.stop)
 
+        if self.hibernation_checker:
+            self.hibernation_checker.start()
+
         try:
             self.ioloop.start()
         except Exception:
@@ -53,6 +88,8 @@ class Server:
         self.stopping = True
 
         logger.info(f"Stopping with signal {sig}.")
+        if self.hibernation_checker:
+            self.ioloop.add_callback_from_signal(self.hibernation_checker.stop)
         # Stop the server from accepting new connections:
         self.ioloop.add_callback_from_signal(self.server.stop)
         # Close all connections
@@ -122,6 +159,20 @@ class Server:
                         return super().get_absolute_path(root, path)
                 raise HTTPError(404)
 
+        class HyperdivStatsHandler(RequestHandler):
+            """
+            Serves the stats of the sessions, and the cache counters of
+            each cached function summed over the sessions, as JSON.
+            """
+
+            def get(self):
+                sessions = Connection.get_session_stats()
+                cache = dict()
+                for session in sessions:
+                    for qualname, stats in session["cache"].items():
+                        cache.setdefault(qualname, Counter()).update(stats)
+                self.write(dict(sessions=sessions, cache=cache))
+
         public_path = get_frontend_public_path()
 
         routes = []
@@ -133,6 +184,9 @@ class Server:
         assets_dir = os.path.join(
             os.path.dirname(os.path.abspath(sys.argv[0])), "assets"
         )
+        if SERVE_STATS:
+            routes.append((r"/hyperdiv-stats", HyperdivStatsHandler))
+
         if os.path.isdir(assets_dir):
             routes.append(
                 (
@@ -151,6 +205,11 @@ class Server:
                         app_function=self.app_function,
                         task_runtime=self.task_runtime,
                         ioloop=self.ioloop,
+                        scheduler=self.scheduler,
+                        resume_timeout=self.resume_timeout,
+                        state_gc_runs=self.state_gc_runs,
+                        compact_protocol=self.compact_protocol,
+                        compression=self.compression,
                     ),
                 ),
                 (
@@ -160,4 +219,9 @@ class Server:
                 ),
             ]
         )
-        return Application(routes, debug=not PRODUCTION)
+        return Application(
+            routes,
+            debug=not PRODUCTION,
+            websocket_ping_interval=Server.ping_interval,
+            websocket_ping_timeout=Server.ping_timeout,
+        )
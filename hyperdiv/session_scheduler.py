@@ -0,0 +1,70 @@
+import threading
+from queue import SimpleQueue
+
+
+class SessionScheduler:
+    """
+    Runs user sessions on a shared, bounded pool of worker threads, as
+    an alternative to giving each `AppRunner` its own thread.
+
+    An `AppRunner` using a scheduler does not own a thread. When
+    updates are enqueued on the runner, the runner schedules itself
+    by adding itself to the scheduler's ready queue. A worker thread
+    picks it up, processes one batch of updates, and re-schedules the
+    runner at the back of the ready queue if it has more input. Idle
+    sessions are not in the ready queue and cost nothing.
+
+    A runner is in the ready queue at most once, and is processed by
+    at most one worker at a time, so updates within a session are
+    processed in order.
+    """
+
+    def __init__(self, num_threads):
+        if num_threads < 1:
+            raise ValueError("A session scheduler needs at least one thread.")
+        self.ready_queue = SimpleQueue()
+        # The number of runners in the ready queue or being processed
+        # by a worker.
+        self.num_pending = 0
+        self.idle = threading.Condition()
+        self.threads = [
+            threading.Thread(target=self.worker, daemon=True)
+            for _ in range(num_threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def schedule(self, app_runner):
+        """
+        Adds `app_runner` to the ready queue. Called by
+        `AppRunner`, which guarantees that a runner is scheduled at
+        most once at a time.
+        """
+        with self.idle:
+            self.num_pending += 1
+        self.ready_queue.put(app_runner)
+
+    def worker(self):
+        while True:
+            app_runner = self.ready_queue.get()
+            if app_runner is None:
+                return
+            try:
+                app_runner.run_scheduled()
+            finally:
+                with self.idle:
+                    self.num_pending -= 1
+                    if self.num_pending == 0:
+                        self.idle.notify_all()
+
+    def shutdown(self):
+        """
+        Waits for the scheduled runners to finish processing their
+        pending updates, and stops the worker threads.
+        """
+        with self.idle:
+            self.idle.wait_for(lambda: self.num_pending == 0)
+        for _ in self.threads:
+            self.ready_queue.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,257 @@
+import asyncio
+import copy
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+from functools import wraps
+from .hashers import content_hashkey
+
+# The `SharedCache`s of all the functions decorated with
+# `shared_cache`, for invalidation by tag.
+shared_caches = weakref.WeakSet()
+shared_caches_lock = threading.Lock()
+
+
+class Flight:
+    """A computation of a shared cache entry, awaited by its callers."""
+
+    def __init__(self, tags):
+        # The tags of the computed entry.
+        self.tags = tags
+        # Set if the entry is invalidated while it is computed, so
+        # the result is not stored.
+        self.invalidated = False
+        # The thread running the computation.
+        self.thread = threading.current_thread()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def copy_error(error):
+    """
+    Returns a copy of `error`, or a `RuntimeError` describing it if
+    it can't be copied.
+    """
+    try:
+        return copy.copy(error)
+    except Exception:
+        return RuntimeError(f"Shared-cached call failed: {error!r}")
+
+
+class SharedCache:
+    """
+    Holds the results of a function decorated with `shared_cache`,
+    shared by all user sessions in the process.
+
+    Concurrent calls with the same arguments are single-flight: the
+    first call computes the result, and the others wait for it.
+
+    `stats` counts `hits`, `misses`, the `waits` of calls that waited
+    for a concurrent computation, and the `evictions` and
+    `invalidations` of entries.
+    """
+
+    def __init__(self, fn, ttl=None, maxsize=128, tags=None):
+        self.fn = fn
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.tags = tags
+        self.lock = threading.Lock()
+        # Maps call keys to (result, expiration time, tags) entries,
+        # from least to most recently used.
+        self.entries = OrderedDict()
+        # Maps call keys to the `Flight`s computing them.
+        self.flights = dict()
+        self.stats = Counter()
+
+    def get_tags(self, args, kwargs):
+        if self.tags is None:
+            return frozenset()
+        if callable(self.tags):
+            return frozenset(self.tags(*args, **kwargs))
+        return frozenset(self.tags)
+
+    def call(self, args, kwargs):
+        key = content_hashkey(args, kwargs)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                result, expiration_time, _ = entry
+                if expiration_time is None or time.monotonic() < expiration_time:
+                    self.entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return result
+                del self.entries[key]
+
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = self.flights[key] = Flight(self.get_tags(args, kwargs))
+                self.stats["misses"] += 1
+                leader = True
+            else:
+                self.stats["waits"] += 1
+                leader = False
+
+        if not leader:
+            if flight.thread is threading.current_thread():
+                raise RuntimeError(
+                    f"Recursive call to shared-cached function {self.fn.__name__}."
+                )
+            flight.done.wait()
+            if flight.error is not None:
+                # Each waiter raises its own copy of the error, since
+                # raising the same exception object in several
+                # threads interleaves their tracebacks.
+                raise copy_error(flight.error) from flight.error
+            return flight.result
+
+        try:
+            flight.result = self.fn(*args, **kwargs)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                if flight.error is None and not flight.invalidated:
+                    self.put(key, flight.result, flight.tags)
+            flight.done.set()
+
+    def put(self, key, result, tags):
+        expiration_time = time.monotonic() + self.ttl if self.ttl else None
+        self.entries[key] = (result, expiration_time, tags)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, *args, **kwargs):
+        """Drops the entry of the call with the given arguments."""
+        key = content_hashkey(args, kwargs)
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.invalidated = True
+            if self.entries.pop(key, None):
+                self.stats["invalidations"] += 1
+
+    def invalidate_tags(self, tags):
+        """Drops the entries tagged with any of the given tags."""
+        with self.lock:
+            for flight in self.flights.values():
+                if not flight.tags.isdisjoint(tags):
+                    flight.invalidated = True
+            keys = [
+                key
+                for key, (_, _, entry_tags) in self.entries.items()
+                if not entry_tags.isdisjoint(tags)
+            ]
+            for key in keys:
+                del self.entries[key]
+            self.stats["invalidations"] += len(keys)
+
+    def clear(self):
+        """Drops all entries."""
+        with self.lock:
+            for flight in self.flights.values():
+                flight.invalidated = True
+            self.stats["invalidations"] += len(self.entries)
+            self.entries.clear()
+
+
+def shared_cache(ttl=None, maxsize=128, tags=None):
+    """
+    `@cached` caches UI per user session. `shared_cache` is a
+    decorator that memoizes the results of expensive functions that
+    don't generate UI, like database queries or data aggregations,
+    across all user sessions in the process. The function is called
+    once per combination of arguments, and its result is returned to
+    every session calling it with those arguments.
+
+    ```py-nodemo
+    @hd.shared_cache(ttl=60)
+    def sales_by_region(year):
+        return run_query("select ... where year = ?", year)
+
+    def main():
+        for region, total in sales_by_region(2024):
+            with hd.scope(region):
+                hd.text(region, total)
+    ```
+
+    If a session calls the function while another session is calling
+    it with the same arguments, it waits for that call's result
+    instead of calling the function again.
+
+    A shared-cached function can be called from the app function, or
+    from a @component(task) function. It should not create UI
+    components or read component props, and its result should not be
+    mutated, since it is shared between sessions.
+
+    Parameters:
+
+    * `ttl`: If set, results expire `ttl` seconds after they are
+      computed.
+
+    * `maxsize`: The maximum number of results held. When it is
+      exceeded, the least recently used results are dropped.
+
+    * `tags`: Tags used to drop results with
+      `invalidate_shared_cache`. Either a list of tags, or a function
+      that takes the arguments of a call and returns the tags of its
+      result:
+
+    ```py-nodemo
+    @hd.shared_cache(tags=lambda user_id: ["users", f"user-{user_id}"])
+    def get_user(user_id):
+        ...
+
+    def rename_user(user_id, name):
+        ...
+        hd.invalidate_shared_cache(f"user-{user_id}")
+    ```
+
+    The decorated function also has an `invalidate(*args, **kwargs)`
+    method, dropping the result of the call with the given arguments,
+    and a `clear()` method, dropping all its results.
+
+    `shared_cache` can also be used without arguments, as
+    `@hd.shared_cache`.
+    """
+    if callable(ttl):
+        return shared_cache()(ttl)
+
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            raise ValueError("shared_cache cannot be used with async functions.")
+
+        cache = SharedCache(fn, ttl=ttl, maxsize=maxsize, tags=tags)
+        with shared_caches_lock:
+            shared_caches.add(cache)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return cache.call(args, kwargs)
+
+        wrapper.invalidate = cache.invalidate
+        wrapper.clear = cache.clear
+        wrapper.shared_cache = cache
+        return wrapper
+
+    return decorator
+
+
+def invalidate_shared_cache(*tags):
+    """
+    Drops the results of `shared_cache` functions tagged
+    with any of the given tags. Calls in progress when the results are
+    dropped complete, but their results are not cached.
+    """
+    tags = frozenset(tags)
+    with shared_caches_lock:
+        caches = list(shared_caches)
+    for cache in caches:
+        cache.invalidate_tags(tags)
@@ -4,8 +4,12 @@ import threading
 
 
 class TaskRuntime:
-    def __init__(self, pool_max_workers, executor=None):
+    def __init__(self, pool_max_workers, executor=None, batch_window=None):
         self.threadpool = executor or ThreadPoolExecutor(max_workers=pool_max_workers)
+        # The default number of seconds during which the state
+        # mutations made by a task are batched. See
+        # `hyperdiv.frame.TaskFrame`.
+        self.batch_window = batch_window
         self.ioloop = asyncio.new_event_loop()
         self.thread_futures = []  # Store futures for threadpool tasks
 
@@ -19,6 +23,12 @@ class TaskRuntime:
     def run_on_ioloop(self, coro):
         asyncio.run_coroutine_threadsafe(coro, self.ioloop)
 
+    def call_later(self, delay, fn):
+        """
+        Calls `fn()` on the ioloop thread after `delay` seconds.
+        """
+        self.ioloop.call_soon_threadsafe(self.ioloop.call_later, delay, fn)
+
     def run_in_threadpool(self, fn):
         future = self.threadpool.submit(fn)
         self.thread_futures.append(future)
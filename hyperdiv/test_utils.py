@@ -17,6 +17,8 @@ class MockTaskRuntime:
     def __init__(self):
         self.ioloop_fns = []
         self.threadpool_fns = []
+        self.delayed_fns = []
+        self.batch_window = None
 
     def run_on_ioloop(self, fn):
         self.ioloop_fns.append(fn)
@@ -24,6 +26,9 @@ class MockTaskRuntime:
     def run_in_threadpool(self, fn):
         self.threadpool_fns.append(fn)
 
+    def call_later(self, delay, fn):
+        self.delayed_fns.append((delay, fn))
+
 
 class MockConnection:
     def __init__(self):
@@ -55,9 +60,10 @@ class MockRunner:
     until the updates are fully processed.
     """
 
-    def __init__(self, fn, initial_updates=None):
+    def __init__(self, fn, initial_updates=None, scheduler=None):
         self.initial_updates = initial_updates or mock_initial_updates
         self.fn = fn
+        self.scheduler = scheduler
         self.app_runner = None
         self.task_runtime = None
         self.connection = None
@@ -66,7 +72,11 @@ class MockRunner:
         self.connection = MockConnection()
         self.task_runtime = TaskRuntime(10)
         self.app_runner = AppRunner(
-            self.connection, self.task_runtime, self.fn, self.initial_updates
+            self.connection,
+            self.task_runtime,
+            self.fn,
+            self.initial_updates,
+            scheduler=self.scheduler,
         )
         self.app_runner.start()
         self.app_runner._internal_sync()
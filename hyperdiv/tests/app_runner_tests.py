@@ -1,11 +1,17 @@
+import time
 import pytest
-from ..test_utils import MockRunner, MockManualRunner
+from ..test_utils import MockRunner, MockManualRunner, MockConnection
 from ..components.lifecycle import lifecycle
 from ..components.plaintext import plaintext
 from ..components.local_storage import local_storage
 from ..components.state import state
 from ..components.button import button
+from ..components.slider import slider
+from ..components.task import task
+from ..components.scope import scope
 from ..exceptions import Stop
+from ..session_scheduler import SessionScheduler
+from ..hibernation import HibernationStore
 
 
 def test_queues():
@@ -264,3 +270,349 @@ def test_click_twice():
             ]
         )
         assert mr.get_state(text_key, "content") == "2"
+
+
+def test_scheduler():
+    """
+    Test that sessions sharing a scheduler are processed independently,
+    and that updates within each session are processed in order.
+    """
+    keys = dict()
+
+    def my_app():
+        s = state(count=0)
+        b = button("Click Me")
+        keys["button"] = b._key
+        if b.clicked:
+            s.count += 1
+        t = plaintext(s.count)
+        keys["text"] = t._key
+
+    scheduler = SessionScheduler(2)
+
+    with MockRunner(my_app, scheduler=scheduler) as mr1:
+        with MockRunner(my_app, scheduler=scheduler) as mr2:
+            assert mr1.app_runner.thread is None
+
+            mr1.process_updates([(keys["button"], "clicked", True)] * 3)
+            mr2.process_updates([(keys["button"], "clicked", True)])
+
+            assert mr1.get_state(keys["text"], "content") == "3"
+            assert mr2.get_state(keys["text"], "content") == "1"
+
+            assert not mr1.app_runner.scheduled
+            assert not mr2.app_runner.scheduled
+
+    assert mr1.app_runner.done.is_set()
+    assert mr2.app_runner.done.is_set()
+
+    scheduler.shutdown()
+
+
+def test_resume():
+    """
+    Test that a detached runner keeps its state, and that on attach
+    it replays the messages the browser missed, or resends the full
+    dom when they are no longer available.
+    """
+    keys = dict()
+
+    def my_app():
+        s = state(count=0)
+        b = button("Click Me")
+        keys["button"] = b._key
+        if b.clicked:
+            s.count += 1
+        t = plaintext(s.count)
+        keys["text"] = t._key
+
+    with MockRunner(my_app) as mr:
+        ar = mr.app_runner
+        last_seq = mr.connection.msgs[-1]["seq"]
+
+        ar.detach()
+        mr.process_updates([(keys["button"], "clicked", True)])
+        assert mr.get_state(keys["text"], "content") == "1"
+        assert ar.seq == last_seq + 1
+
+        # The browser missed one message, which is replayed.
+        conn = MockConnection()
+        ar.attach(conn, last_seq, [])
+        ar._internal_sync()
+        assert len(conn.msgs) == 1
+        assert conn.msgs[0]["seq"] == last_seq + 1
+        assert "diff" in conn.msgs[0]
+
+        # The browser is up to date. Nothing is sent.
+        conn = MockConnection()
+        ar.attach(conn, ar.seq, [])
+        ar._internal_sync()
+        assert conn.msgs == []
+
+        # The browser's state is unknown. The full dom is resent.
+        conn = MockConnection()
+        ar.attach(conn, None, [])
+        ar._internal_sync()
+        assert len(conn.msgs) == 1
+        assert "dom" in conn.msgs[0]
+        assert "singletons" in conn.msgs[0]
+        mr.connection = conn
+
+        mr.process_updates([(keys["button"], "clicked", True)])
+        assert mr.get_state(keys["text"], "content") == "2"
+        assert "diff" in conn.msgs[-1]
+
+
+@pytest.mark.parametrize("session_threads", [None, 2])
+def test_hibernation(tmp_path, session_threads):
+    """
+    Test that an idle session hibernates, releasing its state and
+    thread, and that the next event rehydrates it transparently.
+    """
+    keys = dict()
+
+    def my_app():
+        s = state(count=0)
+        b = button("Click Me")
+        keys["button"] = b._key
+        if b.clicked:
+            s.count += 1
+        t = plaintext(s.count)
+        keys["text"] = t._key
+
+    store = HibernationStore(str(tmp_path / "sessions.db"))
+    scheduler = SessionScheduler(session_threads) if session_threads else None
+
+    with MockRunner(my_app, scheduler=scheduler) as mr:
+        ar = mr.app_runner
+        mr.process_updates([(keys["button"], "clicked", True)] * 2)
+
+        # Sessions with running tasks don't hibernate.
+        ar.task_started()
+        ar.hibernate_if_idle(store, 0)
+        ar._internal_sync()
+        assert not ar.hibernated
+        ar.task_finished()
+
+        # Sessions that received input recently don't hibernate.
+        ar.hibernate_if_idle(store, 60)
+        ar._internal_sync()
+        assert not ar.hibernated
+
+        ar.hibernate_if_idle(store, 0)
+        ar._internal_sync()
+        assert ar.hibernated
+        assert ar.state.state == dict()
+        assert ar.previous_root_container is None
+        if not session_threads:
+            ar.done.wait(0.1)
+            assert ar.thread is None
+
+        mr.process_updates([(keys["button"], "clicked", True)])
+        assert not ar.hibernated
+        assert mr.get_state(keys["text"], "content") == "3"
+        assert "dom" in mr.connection.msgs[-2]
+        assert "diff" in mr.connection.msgs[-1]
+        assert store.take(ar.session_id) is None
+
+    if scheduler:
+        scheduler.shutdown()
+    store.close()
+
+
+def test_hibernation_closed_store(tmp_path):
+    """
+    Test that a session doesn't hibernate into a closed store, and
+    that a session whose snapshot is gone restarts from its initial
+    state.
+    """
+    keys = dict()
+
+    def my_app():
+        s = state(count=0)
+        b = button("Click Me")
+        keys["button"] = b._key
+        if b.clicked:
+            s.count += 1
+        t = plaintext(s.count)
+        keys["text"] = t._key
+
+    store = HibernationStore(str(tmp_path / "sessions.db"))
+    store.close()
+
+    with MockRunner(my_app) as mr:
+        ar = mr.app_runner
+        mr.process_updates([(keys["button"], "clicked", True)])
+        ar.hibernate_if_idle(store, 0)
+        ar._internal_sync()
+        assert not ar.hibernated
+        assert mr.get_state(keys["text"], "content") == "1"
+
+    store = HibernationStore(str(tmp_path / "sessions.db"))
+
+    with MockRunner(my_app) as mr:
+        ar = mr.app_runner
+        mr.process_updates([(keys["button"], "clicked", True)])
+        ar.hibernate_if_idle(store, 0)
+        ar._internal_sync()
+        assert ar.hibernated
+        store.close()
+
+        mr.process_updates([(keys["button"], "clicked", True)])
+        assert not ar.hibernated
+        assert mr.get_state(keys["text"], "content") == "1"
+
+
+def test_coalescing():
+    """
+    Test that many updates to a value prop cause a single run, while
+    events are applied one run at a time.
+    """
+    keys = dict()
+
+    def my_app():
+        s = state(count=0, values=())
+        sl = slider()
+        keys["slider"] = sl._key
+        b = button("Click Me")
+        keys["button"] = b._key
+        if b.clicked:
+            s.count += 1
+            s.values = s.values + (sl.value,)
+        t = plaintext(s.count)
+        keys["text"] = t._key
+        keys["state"] = s._key
+
+    with MockRunner(my_app) as mr:
+        run_id = mr.app_runner.run_id
+
+        mr.process_updates([(keys["slider"], "value", i) for i in range(200)])
+        assert mr.app_runner.run_id == run_id + 1
+        assert mr.app_runner.stats["ui_updates_coalesced"] == 199
+        assert mr.get_state(keys["slider"], "value") == 199
+
+        mr.process_updates(
+            [
+                (keys["slider"], "value", 1),
+                (keys["button"], "clicked", True),
+                (keys["slider"], "value", 2),
+                (keys["slider"], "value", 3),
+                (keys["button"], "clicked", True),
+            ]
+        )
+        assert mr.get_state(keys["text"], "content") == "2"
+        assert mr.get_state(keys["state"], "values") == (1, 3)
+
+
+def test_task_batch_window():
+    """
+    Test that the mutations made by a task within its batch window
+    are delivered together.
+    """
+    keys = dict()
+
+    def process(s):
+        for i in range(100):
+            time.sleep(0.001)
+            s.progress = i + 1
+
+    def my_app():
+        s = state(progress=0)
+        task(batch_window=0.05).run(process, s)
+        t = plaintext(s.progress)
+        keys["text"] = t._key
+
+    with MockRunner(my_app) as mr:
+        assert mr.get_state(keys["text"], "content") == "100"
+        assert mr.app_runner.stats["task_mutation_batches"] < 20
+
+
+def test_merged_run():
+    """
+    Test that a batch containing both UI updates and task mutations
+    runs the app once and sends a single reply.
+    """
+    keys = dict()
+
+    def my_app():
+        s = state(count=0)
+        keys["state"] = s._key
+        b = button("Click Me")
+        keys["button"] = b._key
+        if b.clicked:
+            s.count += 1
+        plaintext(s.count)
+        t = plaintext(s.count * 10)
+        keys["text"] = t._key
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    num_msgs = len(mr.connection.msgs)
+
+    mr.app_runner.enqueue_ui_updates([(keys["button"], "clicked", True)])
+    mr.update_state(keys["state"], "count", 5)
+    mr.process_task_mutations([(keys["state"], "count")])
+
+    assert mr.get_state(keys["text"], "content") == "60"
+    assert len(mr.connection.msgs) == num_msgs + 1
+    assert mr.app_runner.stats["runs_saved"] == 1
+    assert mr.app_runner.stats["messages_saved"] == 1
+
+
+def test_state_gc():
+    """
+    Test that the state of components that are no longer rendered is
+    dropped, except for persistent components.
+    """
+    from ..cache import cached
+
+    keys = dict()
+
+    @cached
+    def page(number):
+        row = state(count=0)
+        keys[number] = row._key
+        plaintext(row.count)
+
+    def my_app():
+        nav = state(page=0, tick=0)
+        keys["nav"] = nav._key
+        nav.tick
+        with scope(nav.page):
+            page(nav.page)
+            if nav.page == 0:
+                keys["pinned"] = state(count=0).persist()._key
+
+    def set_nav(prop_name, value):
+        mr.update_state(keys["nav"], prop_name, value)
+        mr.process_task_mutations([(keys["nav"], prop_name)])
+
+    mr = MockManualRunner(my_app)
+    mr.app_runner.state_gc_runs = 2
+    mr.advance()
+
+    mr.update_state(keys[0], "count", 5)
+    mr.update_state(keys["pinned"], "count", 5)
+    mr.process_task_mutations([(keys[0], "count")])
+    state_keys = set(mr.app_runner.state.state)
+
+    # Page 0 is not rendered in the 1st run of the generation, and is
+    # swept at the end of it.
+    set_nav("page", 1)
+    assert keys[0] in mr.app_runner.state.state
+    set_nav("tick", 1)
+
+    assert keys[0] not in mr.app_runner.state.state
+    assert keys[0] not in mr.app_runner.ui_prop_state.props
+    assert mr.app_runner.stats["state_gc_keys"] == 2
+    # The persistent state, and the state with fixed keys, is kept.
+    assert mr.get_state(keys["pinned"], "count") == 5
+    assert mr.get_state("location", "path") == "/"
+    # Only the state and text of page 0 were dropped.
+    assert len(state_keys - set(mr.app_runner.state.state)) == 2
+
+    # Page 0 comes back from its initial state, rather than from the
+    # dropped cache entry.
+    set_nav("page", 0)
+    assert mr.get_state(keys[0], "count") == 0
+    assert mr.get_state(keys["pinned"], "count") == 5
@@ -65,3 +65,35 @@ def test_application_state():
         # Cannot update non-event props while resetting events:
         with pytest.raises(Exception):
             frame.update_state("my-key", "x", 1)
+
+
+def test_lazy_props():
+    from ..components.button import button
+    from ..components.state import state as hd_state
+
+    def app():
+        state = hd_state(primary=True)
+        b = button("Hi", key="b", variant="primary" if state.primary else "default")
+        if b.clicked:
+            state.primary = not state.primary
+
+    mr = MockManualRunner(app)
+    mr.advance()
+    state = mr.app_runner.state
+
+    # Only the props initialized with non-default values are stored.
+    assert set(state.state["b"]) == {"width", "variant"}
+    # Unset props read their defaults, and are rendered.
+    assert mr.get_state("b", "size") == "medium"
+    assert len(state.get_props("b")) == len(button._get_static_props())
+    dom = mr.connection.msgs[-1]["dom"]
+    assert dom["children"][0]["props"]["size"] == "medium"
+
+    # Props that are set by the UI get stored.
+    mr.process_updates([("b", "clicked", True)])
+    assert set(state.state["b"]) == {"width", "variant", "clicked"}
+
+    # A stored prop that is no longer initialized returns to its
+    # default.
+    assert mr.connection.msgs[-1]["diff"]["b"]["props"] == {"variant": "default"}
+    assert mr.get_state("b", "variant") == "default"
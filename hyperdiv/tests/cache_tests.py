@@ -0,0 +1,148 @@
+from ..test_utils import MockManualRunner
+from ..cache import Cache, cached, estimate_entry_bytes
+from ..components.state import state
+from ..components.scope import scope
+from ..components.plaintext import plaintext
+
+
+def entry(*deps):
+    return dict(result=None, collector=None, deps=set(deps), keys=())
+
+
+def test_dependents_index():
+    cache = Cache()
+    cache.put("a", entry(("k1", "x"), ("k2", "x")))
+    cache.put("b", entry(("k2", "x")))
+    cache.put("c", entry(("k3", "x")))
+
+    assert cache.dependents[("k2", "x")] == {"a", "b"}
+
+    cache.eject_entries_for_mutated_props({("k1", "x"), ("k4", "x")})
+    assert set(cache.cache) == {"b", "c"}
+    assert ("k1", "x") not in cache.dependents
+    assert cache.dependents[("k2", "x")] == {"b"}
+
+    # Replacing an entry replaces its dependencies.
+    cache.put("b", entry(("k3", "x")))
+    assert ("k2", "x") not in cache.dependents
+    assert cache.dependents[("k3", "x")] == {"b", "c"}
+
+    cache.eject_entries_for_mutated_props({("k3", "x")})
+    assert cache.cache == dict()
+    assert cache.dependents == dict()
+
+
+def test_eviction():
+    cache = Cache(max_entries=3, pinned_keys=["app"])
+    cache.put("app", entry())
+    cache.put(("f", 1), entry(("k1", "x")))
+    cache.put(("f", 2), entry())
+    assert cache.get(("f", 1)) is not Cache.NotFound
+    cache.put(("g", 1), entry())
+    # The least recently used entry is evicted.
+    assert list(cache.cache) == ["app", ("f", 1), ("g", 1)]
+
+    cache.put(("g", 2), entry())
+    cache.put(("g", 3), entry())
+    # The pinned entry is kept.
+    assert list(cache.cache) == ["app", ("g", 2), ("g", 3)]
+    assert ("k1", "x") not in cache.dependents
+    assert cache.get(("f", 2)) is Cache.NotFound
+    assert cache.stats["f"] == dict(hits=1, misses=1, evictions=2, build_time=0)
+
+    # Peeking doesn't count or mark the entry.
+    cache.peek("app")
+    assert cache.stats["app"]["hits"] == 0
+
+    # The cache is also bounded by the estimated bytes.
+    big_entry = entry(*[(f"k{i}", "x") for i in range(100)])
+    num_bytes = estimate_entry_bytes(big_entry)
+    cache = Cache(max_bytes=num_bytes * 2)
+    for i in range(3):
+        cache.put(("f", i), entry(*[(f"k{i}", "x") for i in range(100)]))
+    assert list(cache.cache) == [("f", 1), ("f", 2)]
+    assert cache.num_bytes == num_bytes * 2
+
+
+def test_cached_ejection():
+    keys = dict()
+    calls = []
+
+    @cached
+    def item(i):
+        calls.append(i)
+        s = state(count=0)
+        keys[i] = s._key
+        plaintext(s.count)
+
+    def my_app():
+        for i in range(10):
+            with scope(i):
+                item(i)
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    assert sorted(calls) == list(range(10))
+
+    calls.clear()
+    mr.update_state(keys[3], "count", 1)
+    mr.process_task_mutations([(keys[3], "count")])
+    assert calls == [3]
+    assert mr.connection.msgs[-1]["diff"]
+
+    stats = mr.app_runner.cache.stats[f"{item.__module__}.{item.__name__}"]
+    assert stats["misses"] == 11
+    assert stats["hits"] == 9
+    assert stats["evictions"] == 0
+    assert stats["build_time"] > 0
+
+    # The same counters are exposed, by qualified name, by the runner's
+    # stats snapshot.
+    cache_stats = mr.app_runner.get_stats()["cache"]
+    assert cache_stats[f"{item.__module__}.{item.__name__}"] == dict(stats)
+
+
+def test_large_pinned_app():
+    keys = dict()
+
+    @cached
+    def row(i):
+        with scope(i):
+            plaintext(f"Row {i}")
+
+    @cached
+    def rows():
+        for i in range(3):
+            row(i)
+
+    def my_app():
+        s = state(count=0)
+        keys["state"] = s._key
+        plaintext(s.count)
+        for i in range(200):
+            with scope(i):
+                plaintext(i)
+        rows()
+
+    mr = MockManualRunner(my_app)
+    app_key = mr.app_runner.app_function.cache_key
+    mr.app_runner.cache = Cache(max_bytes=150_000, pinned_keys=[app_key])
+    mr.advance()
+    cache = mr.app_runner.cache
+    # The pinned app entry doesn't count toward the byte bound, and
+    # the rows are counted once, in the entries of `row`.
+    assert cache.num_bytes == sum(
+        entry["num_bytes"] for key, entry in cache.cache.items() if key != app_key
+    )
+    assert cache.cache[app_key]["num_bytes"] > 150_000
+    (rows_entry,) = [e for k, e in cache.cache.items() if k[0].endswith(".rows")]
+    assert rows_entry["num_components"] == 0
+
+    for count in range(1, 4):
+        mr.update_state(keys["state"], "count", count)
+        mr.process_task_mutations([(keys["state"], "count")])
+
+    stats = cache.stats[f"{rows.__module__}.{rows.__name__}"]
+    assert stats["hits"] == 3
+    assert stats["evictions"] == 0
+    assert cache.stats[f"{row.__module__}.{row.__name__}"]["misses"] == 3
@@ -0,0 +1,77 @@
+import inspect
+from contextlib import contextmanager
+import xxhash
+from ..test_utils import MockManualRunner
+from ..frame import AppRunnerFrame
+from ..component_keys import get_component_key, runtime_py_path
+from ..components.scope import scope
+from ..components.state import state
+
+
+def uncached_component_key():
+    """
+    The key generation of `get_component_key`, without caching.
+    """
+    stack_frame = inspect.currentframe().f_back.f_back
+    key = ""
+    while stack_frame:
+        filename = stack_frame.f_code.co_filename
+        lineno = stack_frame.f_lineno
+        funcname = stack_frame.f_code.co_name
+        if filename == runtime_py_path and funcname == "run_user_app":
+            break
+        key += f"::{filename}:{lineno}:{funcname}"
+        stack_frame = stack_frame.f_back
+
+    key = str(AppRunnerFrame.current().scope_stack) + key
+    return "a" + xxhash.xxh32(key).hexdigest()
+
+
+def test_cached_keys():
+    generated_keys = []
+    keys = dict()
+
+    def make_key():
+        key = get_component_key()
+        assert key == uncached_component_key()
+        generated_keys.append(key)
+
+    def nested(depth):
+        if depth == 0:
+            make_key()
+        else:
+            nested(depth - 1)
+
+    @contextmanager
+    def section():
+        make_key()
+        yield
+        make_key()
+
+    def my_app():
+        s = state(version=0)
+        keys["state"] = s._key
+        s.version
+        make_key()
+        make_key()
+        for i in range(3):
+            with scope(i):
+                make_key()
+                with scope(f"item-{i}"):
+                    make_key()
+                    with scope((i, "x")):
+                        nested(i)
+                make_key()
+        nested(3)
+        with section():
+            make_key()
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    first_run_keys = list(generated_keys)
+    generated_keys.clear()
+    mr.update_state(keys["state"], "version", 1)
+    mr.process_task_mutations([(keys["state"], "version")])
+    # The second run hits the cache and generates the same keys.
+    assert generated_keys == first_run_keys
+    assert len(set(first_run_keys)) == len(first_run_keys) == 18
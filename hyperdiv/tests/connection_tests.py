@@ -0,0 +1,118 @@
+import asyncio
+import json
+import struct
+import zlib
+import pytest
+from tornado.ioloop import IOLoop
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application
+from tornado.websocket import websocket_connect
+from ..connection import Connection, get_compression_settings
+from ..task_runtime import TaskRuntime
+from ..components.plaintext import plaintext
+
+
+def test_get_compression_settings():
+    assert get_compression_settings(None) is None
+    assert get_compression_settings(True) == dict(level=6, mem_level=8, min_size=1024)
+    assert get_compression_settings(dict(min_size=0))["min_size"] == 0
+    with pytest.raises(ValueError):
+        get_compression_settings(dict(size=0))
+
+
+async def receive_messages(content, compression, client_compression):
+    def my_app():
+        plaintext(content)
+
+    task_runtime = TaskRuntime(1)
+    sock, port = bind_unused_port()
+    app = Application(
+        [
+            (
+                r"/ws",
+                Connection,
+                dict(
+                    app_function=my_app,
+                    task_runtime=task_runtime,
+                    ioloop=IOLoop.current(),
+                    compression=get_compression_settings(compression),
+                ),
+            )
+        ]
+    )
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    try:
+        query = "?compression=deflate" if client_compression else ""
+        ws = await websocket_connect(f"ws://localhost:{port}/ws{query}")
+        (connection,) = Connection._active_connections.values()
+        # The messages of a connection are decompressed by a single
+        # zlib stream. Each binary frame starts with the length of the
+        # decompressed message.
+        decompressor = zlib.decompressobj()
+
+        async def read_message():
+            data = await ws.read_message()
+            if not isinstance(data, bytes):
+                return json.loads(data), len(data)
+            (length,) = struct.unpack(">I", data[:4])
+            text = decompressor.decompress(data[4:])
+            assert len(text) == length
+            return json.loads(text), len(data)
+
+        message, frame_size = await read_message()
+        # A second message repeating the first one is compressed in
+        # the context of the first.
+        connection.send(dict(content=content))
+        repeated_message, repeated_frame_size = await read_message()
+        assert repeated_message == dict(content=content)
+        stats = dict(
+            message_bytes=connection.message_bytes,
+            sent_bytes=connection.sent_bytes,
+            compressed_messages=connection.compressed_messages,
+            frame_size=frame_size,
+            repeated_frame_size=repeated_frame_size,
+            sessions=Connection.get_session_stats(),
+        )
+        ws.close()
+        while Connection._active_connections:
+            await asyncio.sleep(0.01)
+    finally:
+        server.stop()
+        task_runtime.shutdown()
+    return message, stats
+
+
+@pytest.mark.parametrize(
+    "content,compression,client_compression,compressed",
+    [
+        ("a" * 10_000, True, True, True),
+        # Small messages are not compressed.
+        ("a", True, True, False),
+        ("a", dict(min_size=0), True, True),
+        # Compression is enabled only if the browser asks for it.
+        ("a" * 10_000, True, False, False),
+        ("a" * 10_000, None, True, False),
+    ],
+)
+def test_compression(content, compression, client_compression, compressed):
+    message, stats = asyncio.run(
+        receive_messages(content, compression, client_compression)
+    )
+    assert "dom" in message
+    assert stats["message_bytes"] > 2 * len(content)
+    assert stats["compressed_messages"] == 2 * int(compressed)
+    if compressed:
+        assert stats["sent_bytes"] < stats["message_bytes"]
+        assert stats["repeated_frame_size"] < stats["frame_size"] / 10
+    else:
+        assert stats["sent_bytes"] == stats["message_bytes"]
+    (session,) = stats["sessions"]
+    assert session["connected"]
+    assert session["runner"]["messages"] == 1
+    assert session["connection"] == dict(
+        message_bytes=stats["message_bytes"],
+        sent_bytes=stats["sent_bytes"],
+        compressed_messages=stats["compressed_messages"],
+    )
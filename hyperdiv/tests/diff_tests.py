@@ -0,0 +1,499 @@
+import random
+from ..test_utils import MockManualRunner
+from ..diff import Differ
+from ..cache import cached
+from ..components.state import state
+from ..components.box import box
+from ..components.text import text
+from ..components.alert import alert
+from ..components.style import style
+from ..components.scope import scope
+from ..components.plaintext import plaintext
+
+
+def test_dirty_keys():
+    keys = dict()
+
+    def my_app():
+        s = state(count=0, color="red", num_items=10)
+        keys["state"] = s._key
+        with box(gap=1) as b:
+            keys["box"] = b._key
+            for i in range(s.num_items):
+                with scope(i):
+                    t = text(s.count if i == 3 else i)
+                    keys[i] = t._key
+        a = alert(
+            "Hello",
+            opened=True,
+            message_style=style(background_color=s.color),
+        )
+        keys["alert"] = a._key
+
+    def update(prop_name, value):
+        mr.update_state(keys["state"], prop_name, value)
+        mr.process_task_mutations([(keys["state"], prop_name)])
+        return mr.connection.msgs[-1]["diff"]
+
+    def tree_keys():
+        return {keys["box"], keys["alert"], *(keys[i] for i in range(10))}
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    dirty_keys = mr.app_runner.state.dirty_keys
+    assert not dirty_keys.intersection(tree_keys())
+
+    # An init value changed.
+    diff = update("count", 1)
+    assert set(diff) == {keys[3]}
+    assert not dirty_keys.intersection(tree_keys())
+
+    # A style part held in a prop changed.
+    diff = update("color", "blue")
+    assert set(diff) == {keys["alert"]}
+    assert not dirty_keys.intersection(tree_keys())
+
+    # The children of a component whose props didn't change changed.
+    diff = update("num_items", 9)
+    assert set(diff) == {keys["box"]}
+    assert "props" not in diff[keys["box"]]
+    assert diff[keys["box"]]["children"] == [("delete", 9, 1)]
+
+
+def apply_children_diff(children, commands):
+    children = list(children)
+    for command in commands:
+        if command[0] == "delete":
+            _, start, num_items = command
+            del children[start : start + num_items]
+        elif command[0] == "insert":
+            _, start, components = command
+            children[start:start] = [c["key"] for c in components]
+        elif command[0] == "move":
+            _, from_idx, to_idx = command
+            children.insert(to_idx, children.pop(from_idx))
+    return children
+
+
+def test_keyed_moves():
+    import random
+
+    keys = dict()
+
+    def my_app():
+        s = state(items=tuple(range(10)))
+        keys["state"] = s._key
+        with box() as b:
+            keys["box"] = b._key
+            for item in s.items:
+                with scope(item):
+                    keys[item] = text(item)._key
+
+    def update(items):
+        browser_children = [keys[item] for item in current_items]
+        mr.update_state(keys["state"], "items", tuple(items))
+        mr.process_task_mutations([(keys["state"], "items")])
+        diff = mr.connection.msgs[-1]["diff"]
+        commands = diff[keys["box"]]["children"] if keys["box"] in diff else []
+        assert apply_children_diff(browser_children, commands) == [
+            keys[item] for item in items
+        ]
+        current_items[:] = items
+        return commands
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    current_items = list(range(10))
+
+    # Moving one item emits a single move, and no re-rendering.
+    assert update([0, 1, 2, 7, 3, 4, 5, 6, 8, 9]) == [("move", 7, 3)]
+    assert update([1, 2, 7, 3, 4, 5, 6, 8, 9, 0]) == [("move", 0, 9)]
+
+    # Reversing moves every item but one.
+    commands = update(list(reversed(current_items)))
+    assert len(commands) == 9
+    assert all(command[0] == "move" for command in commands)
+
+    # Random reorders, insertions, and deletions. Items that are
+    # kept are never re-inserted.
+    rng = random.Random(0)
+    for _ in range(50):
+        previous_keys = set(keys[item] for item in current_items)
+        items = rng.sample(range(30), rng.randint(0, 20))
+        for command in update(items):
+            if command[0] == "insert":
+                assert not previous_keys.intersection(c["key"] for c in command[2])
+
+
+def test_large_reorder():
+    import random
+
+    keys = dict()
+    num_items = 10_000
+
+    def my_app():
+        s = state(items=tuple(range(num_items)))
+        keys["state"] = s._key
+        with box() as b:
+            keys["box"] = b._key
+            for item in s.items:
+                with scope(item):
+                    keys[item] = plaintext(item)._key
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+
+    items = list(range(num_items))
+    random.Random(0).shuffle(items)
+    mr.update_state(keys["state"], "items", tuple(items))
+    mr.process_task_mutations([(keys["state"], "items")])
+    commands = mr.connection.msgs[-1]["diff"][keys["box"]]["children"]
+    assert all(command[0] == "move" for command in commands)
+    assert apply_children_diff([keys[i] for i in range(num_items)], commands) == [
+        keys[item] for item in items
+    ]
+
+
+def test_diff_css():
+    from ..renderer import diff_css
+
+    old = {"": {"color": "red", "width": "1px"}, ":hover": {"color": "blue"}}
+    new = {"": {"color": "green", "height": "1px"}, "::part(a)": {"color": "red"}}
+    assert diff_css(old, new) == {
+        ":hover": None,
+        "": {"width": None, "color": "green", "height": "1px"},
+        "::part(a)": {"color": "red"},
+    }
+    assert diff_css(new, new) == {}
+
+
+def test_style_classes():
+    keys = dict()
+
+    def my_app():
+        s = state(color="red", label_color=None)
+        keys["state"] = s._key
+        with box(gap=1):
+            for i in range(3):
+                with scope(i):
+                    b = box(
+                        background_color=s.color if i == 0 else "red",
+                        hover_background_color="blue",
+                    )
+                    keys[i] = b._key
+        a = alert(
+            "Hello",
+            opened=True,
+            message_style=style(background_color=s.label_color),
+        )
+        keys["alert"] = a._key
+
+    def update(prop_name, value):
+        mr.update_state(keys["state"], prop_name, value)
+        mr.process_task_mutations([(keys["state"], prop_name)])
+        return mr.connection.msgs[-1]
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    msg = mr.connection.msgs[-1]
+    # Identical boxes share a style class, whose rules are sent once.
+    boxes = msg["dom"]["children"][0]["children"]
+    red_class = boxes[0]["styleClass"]
+    assert [b["styleClass"] for b in boxes] == [red_class] * 3
+    assert msg["styleClasses"][red_class] == {
+        "": "background-color:var(--sl-color-red-600)",
+        ":hover": "background-color:var(--sl-color-blue-600)",
+    }
+    assert "styleClass" not in msg["dom"]["children"][1]
+
+    # A changed box switches to a new class, sent with the diff as
+    # the difference from the box's previous class.
+    msg = update("color", "green")
+    green_class = msg["diff"][keys[0]]["styleClass"]
+    assert msg["diff"] == {keys[0]: {"styleClass": green_class}}
+    assert "styleClasses" not in msg
+    assert msg["derivedStyleClasses"] == {
+        green_class: dict(
+            base=red_class,
+            diff={"": {"background-color": "var(--sl-color-green-600)"}},
+        )
+    }
+
+    # Switching back reuses the class the browser already has, and
+    # releases the class no longer used.
+    msg = update("color", "red")
+    assert msg["diff"] == {keys[0]: {"styleClass": red_class}}
+    assert "styleClasses" not in msg
+    assert "derivedStyleClasses" not in msg
+    assert msg["releasedStyleClasses"] == [green_class]
+
+    # A style class is added, and removed.
+    msg = update("label_color", "red")
+    alert_class = msg["diff"][keys["alert"]]["styleClass"]
+    assert msg["styleClasses"][alert_class] == {
+        "::part(message)": "background-color:var(--sl-color-red-600)"
+    }
+    msg = update("label_color", None)
+    assert msg["diff"] == {keys["alert"]: {"styleClass": None}}
+    assert msg["releasedStyleClasses"] == [alert_class]
+
+    # The released class is sent again when it is used again.
+    msg = update("label_color", "red")
+    assert msg["diff"] == {keys["alert"]: {"styleClass": alert_class}}
+    assert list(msg["styleClasses"]) == [alert_class]
+    assert "releasedStyleClasses" not in msg
+
+
+def test_deleted_components_release_style_classes():
+    keys = dict()
+
+    def my_app():
+        s = state(shown=True)
+        keys["state"] = s._key
+        if s.shown:
+            with box(background_color="red"):
+                box(background_color="green")
+        box(background_color="blue")
+
+    def update(prop_name, value):
+        mr.update_state(keys["state"], prop_name, value)
+        mr.process_task_mutations([(keys["state"], prop_name)])
+        return mr.connection.msgs[-1]
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    msg = mr.connection.msgs[-1]
+    outer, blue = msg["dom"]["children"]
+    red_class = outer["styleClass"]
+    green_class = outer["children"][0]["styleClass"]
+    assert {red_class, green_class, blue["styleClass"]} <= set(msg["styleClasses"])
+
+    # Deleting a subtree releases the classes of all its components.
+    msg = update("shown", False)
+    assert sorted(msg["releasedStyleClasses"]) == sorted([red_class, green_class])
+
+    # Inserting it again re-sends them.
+    msg = update("shown", True)
+    assert set(msg["styleClasses"]) == {red_class, green_class}
+    assert "releasedStyleClasses" not in msg
+
+
+def test_style_classes_rendered_once_per_key(monkeypatch):
+    from .. import ui_prop_state
+
+    keys = dict()
+    rendered = []
+    render_style_class = ui_prop_state.render_style_class
+
+    def counting_render_style_class(css_props):
+        output = render_style_class(css_props)
+        if output is not None:
+            rendered.append(output[1])
+        return output
+
+    monkeypatch.setattr(
+        ui_prop_state, "render_style_class", counting_render_style_class
+    )
+
+    def my_app():
+        s = state(color="red", label_color="red", count=0)
+        keys["state"] = s._key
+        b = box(background_color=s.color)
+        keys["box"] = b._key
+        a = alert(
+            f"Hello {s.count}",
+            opened=True,
+            message_style=style(background_color=s.label_color),
+        )
+        keys["alert"] = a._key
+
+    def update(prop_name, value):
+        rendered.clear()
+        mr.update_state(keys["state"], prop_name, value)
+        mr.process_task_mutations([(keys["state"], prop_name)])
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    assert len(rendered) == 3
+
+    # The style classes of unchanged CSS are not rendered again.
+    update("count", 1)
+    assert rendered == []
+
+    # A changed CSS prop renders the class of its component only.
+    update("color", "green")
+    assert rendered == [{"": {"background-color": "var(--sl-color-green-600)"}}]
+
+    # A change in a style part renders the class of its holder.
+    update("label_color", "blue")
+    assert rendered == [
+        {"::part(message)": {"background-color": "var(--sl-color-blue-600)"}}
+    ]
+
+
+def test_skips_unchanged_subtrees(monkeypatch):
+    keys = dict()
+
+    def my_app():
+        s = state(count=0, num_items=100)
+        keys["state"] = s._key
+        for i in range(s.num_items):
+            with scope(i):
+                with box():
+                    with box():
+                        t = plaintext(s.count if i == 50 else i)
+                        keys[i] = t._key
+
+    def update(prop_name, value):
+        mr.update_state(keys["state"], prop_name, value)
+        mr.process_task_mutations([(keys["state"], prop_name)])
+        return mr.connection.msgs[-1]["diff"]
+
+    visited = []
+    diff_component = Differ.diff_component
+
+    def counting_diff_component(self, src_component, dest_component):
+        visited.append(dest_component._key)
+        return diff_component(self, src_component, dest_component)
+
+    monkeypatch.setattr(Differ, "diff_component", counting_diff_component)
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+
+    # Only the path to the changed component is walked.
+    assert update("count", 1) == {keys[50]: {"props": {"content": "1"}}}
+    assert keys[50] in visited
+    assert len(visited) < 110
+
+    # The children of the root container changed.
+    visited.clear()
+    assert list(update("num_items", 99)) == [mr.app_runner.previous_root_container._key]
+    assert len(visited) < 110
+
+
+def test_deleted_components_are_not_dirty():
+    keys = dict()
+
+    def my_app():
+        s = state(shown=True)
+        keys["state"] = s._key
+        if s.shown:
+            t = plaintext("Hello")
+            keys["text"] = t._key
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+
+    # The text changes, and is deleted, in the same run.
+    mr.update_state(keys["text"], "content", "Bye")
+    mr.update_state(keys["state"], "shown", False)
+    mr.process_task_mutations([(keys["text"], "content"), (keys["state"], "shown")])
+    assert "children" in mr.connection.msgs[-1]["diff"].popitem()[1]
+    assert keys["text"] not in mr.app_runner.state.dirty_keys
+
+
+def test_random_trees():
+    """
+    Test that applying the diffs of random changes to a tree, including
+    subtrees reused from `cached` calls, yields the new tree.
+    """
+    keys = dict()
+    rng = random.Random(0)
+
+    @cached
+    def cached_node(node):
+        render_node(node)
+
+    def render_node(node):
+        node_id, content, children = node
+        with scope(node_id):
+            with box():
+                plaintext(content)
+                for child in children:
+                    if child[0] % 3 == 0:
+                        cached_node(child)
+                    else:
+                        render_node(child)
+
+    def my_app():
+        s = state(tree=())
+        keys["state"] = s._key
+        for node in s.tree:
+            render_node(node)
+
+    # Contents are never reused, since a cached call whose arguments
+    # revert to earlier values would reuse components whose props
+    # have changed since.
+    next_id = iter(range(1_000_000))
+
+    def random_tree(depth=0):
+        num_children = rng.randint(0, 4) if depth < 3 else 0
+        return (
+            next(next_id),
+            f"c{next(next_id)}",
+            tuple(random_tree(depth + 1) for _ in range(num_children)),
+        )
+
+    def mutate(nodes, depth=0):
+        nodes = list(nodes)
+        for i, (node_id, content, children) in enumerate(nodes):
+            if rng.random() < 0.1:
+                content = f"c{next(next_id)}"
+            if rng.random() < 0.5:
+                children = mutate(children, depth + 1)
+            nodes[i] = (node_id, content, children)
+        if nodes and rng.random() < 0.2:
+            del nodes[rng.randrange(len(nodes))]
+        if depth < 3 and rng.random() < 0.2:
+            nodes.insert(rng.randint(0, len(nodes)), random_tree(depth))
+        if rng.random() < 0.2:
+            rng.shuffle(nodes)
+        return tuple(nodes)
+
+    browser = dict()
+
+    def add_to_browser(component):
+        # Renderings are memoized, so they are copied, not modified.
+        browser[component["key"]] = dict(
+            name=component["name"],
+            props=dict(component["props"]),
+            children=[add_to_browser(c) for c in component.get("children", [])],
+        )
+        return component["key"]
+
+    def apply_diff(diff):
+        for key, component_diff in diff.items():
+            component = browser[key]
+            component["props"] |= component_diff.get("props", dict())
+            commands = component_diff.get("children", [])
+            for command in commands:
+                if command[0] == "insert":
+                    for child in command[2]:
+                        add_to_browser(child)
+            component["children"] = apply_children_diff(component["children"], commands)
+
+    def browser_tree(key):
+        component = browser[key]
+        if component["name"] == "plaintext":
+            return component["props"]["content"]
+        return tuple(browser_tree(child) for child in component["children"])
+
+    def expected_tree(nodes):
+        return tuple(
+            (content, *expected_tree(children)) for _, content, children in nodes
+        )
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    root_key = add_to_browser(mr.connection.msgs[-1]["dom"])
+
+    tree = ()
+    for _ in range(200):
+        tree = mutate(tree)
+        num_messages = len(mr.connection.msgs)
+        mr.update_state(keys["state"], "tree", tree)
+        mr.process_task_mutations([(keys["state"], "tree")])
+        for message in mr.connection.msgs[num_messages:]:
+            apply_diff(message["diff"])
+        assert browser_tree(root_key) == expected_tree(tree)
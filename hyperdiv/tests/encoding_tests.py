@@ -0,0 +1,184 @@
+import json
+import struct
+import threading
+import zlib
+from .. import encoding
+from ..connection import Connection, get_compression_settings, new_compressor
+from ..encoding import CompactEncoder
+from ..test_utils import MockManualRunner
+from ..components.box import box
+from ..components.text import text
+from ..components.button import button
+from ..components.scope import scope
+from ..components.state import state
+
+
+class MockIOLoop:
+    def __init__(self):
+        self.callbacks = []
+
+    def add_callback(self, fn, *args):
+        self.callbacks.append((fn, args))
+
+
+class MockConnection:
+    send = Connection.send
+    compress = Connection.compress
+
+    def __init__(self, compression=None):
+        self.ioloop = MockIOLoop()
+        self.client_id = "client"
+        self.sent_client_id = False
+        self.compact_encoder = None
+        self.compression = compression
+        self.compressor = new_compressor(compression) if compression else None
+
+    async def write_encoded_message(self, data, num_message_bytes, is_compressed):
+        pass
+
+
+def test_encode_message():
+    message = dict(dom=dict(key="a", props=dict(n=1, x=None)), seq=(1, 2))
+    data = encoding.encode_message(message)
+    assert isinstance(data, bytes)
+    assert json.loads(data) == dict(
+        dom=dict(key="a", props=dict(n=1, x=None)), seq=[1, 2]
+    )
+    assert json.loads(encoding.encode_message(dict(n=2**70))) == dict(n=2**70)
+
+
+def test_send_encodes_on_calling_thread():
+    threads = []
+    original_encoder = encoding.json_encoder
+
+    def encoder(message):
+        threads.append(threading.current_thread())
+        return original_encoder(message)
+
+    encoding.set_json_encoder(encoder)
+    try:
+        connection = MockConnection()
+        connection.send(dict(seq=1))
+        connection.send(dict(seq=2))
+    finally:
+        encoding.set_json_encoder(original_encoder)
+
+    assert threads == [threading.current_thread()] * 2
+    (fn1, (data1, _, _)), (fn2, (data2, _, _)) = connection.ioloop.callbacks
+    assert fn1 == connection.write_encoded_message
+    assert json.loads(data1) == dict(seq=1, clientId="client")
+    assert json.loads(data2) == dict(seq=2)
+
+
+def test_send_compresses_on_calling_thread():
+    connection = MockConnection(get_compression_settings(dict(min_size=100)))
+    connection.send(dict(seq=1))
+    connection.send(dict(seq=2, data="a" * 1000))
+    connection.send(dict(seq=3, data="a" * 1000))
+
+    (
+        (_, (data1, size1, compressed1)),
+        (_, (data2, size2, compressed2)),
+        (_, (data3, size3, compressed3)),
+    ) = connection.ioloop.callbacks
+    assert not compressed1
+    assert size1 == len(data1)
+    assert compressed2 and compressed3
+    assert size2 > 1000 > len(data2)
+    # The compressed messages are chunks of one zlib stream, each
+    # prefixed with the length of the message.
+    decompressor = zlib.decompressobj()
+    for data, size, seq in [(data2, size2, 2), (data3, size3, 3)]:
+        assert struct.unpack(">I", data[:4]) == (size,)
+        message = json.loads(decompressor.decompress(data[4:]))
+        assert message == dict(seq=seq, data="a" * 1000)
+    # The third message is compressed in the context of the second.
+    assert len(data3) < len(data2)
+
+
+class Decoder:
+    """Mirrors `CompactDecoder` in frontend/src/compact.js."""
+
+    def __init__(self):
+        self.schemas = []
+        self.style_classes = []
+
+    def decode_message(self, message):
+        self.schemas.extend(message.pop("schemas", []))
+        if "dom" in message:
+            message["dom"] = self.decode_component(message["dom"])
+        for component_diff in message.get("diff", dict()).values():
+            for command in component_diff.get("children", []):
+                if command[0] == "insert":
+                    command[2] = [self.decode_component(c) for c in command[2]]
+        return message
+
+    def decode_component(self, node):
+        key, schema, values, *rest = node
+        name, tag, classes, prop_names = self.schemas[schema]
+        output = dict(
+            key=key,
+            name=name,
+            tag=tag,
+            classes=classes,
+            props=dict(zip(prop_names, values)),
+        )
+        if rest and rest[0] is not None:
+            output["styleClass"] = self.decode_style_class(rest[0])
+        if len(rest) > 1:
+            output["children"] = [self.decode_component(c) for c in rest[1]]
+        return output
+
+    def decode_style_class(self, style_class):
+        if isinstance(style_class, int):
+            return self.style_classes[style_class]
+        self.style_classes.append(style_class)
+        return style_class
+
+
+def get_style_classes(component):
+    return [
+        *([component["styleClass"]] if "styleClass" in component else []),
+        *[c for child in component["children"] for c in get_style_classes(child)],
+    ]
+
+
+def test_compact_encoder():
+    keys = []
+
+    def my_app():
+        s = state(items=("a", "b"))
+        keys.append(s._key)
+        with box(padding=1, gap=1):
+            for item in s.items:
+                with scope(item):
+                    with box(border="1px solid red"):
+                        text(item, font_color="red")
+                        button(item)
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    # The messages of the browser, as JSON.
+    dom_message = json.loads(json.dumps(mr.connection.msgs[-1]))
+
+    encoder = CompactEncoder()
+    decoder = Decoder()
+    compact_message = json.loads(encoding.encode_message(dom_message, encoder))
+    # The two items share their schemas and style classes.
+    assert len(compact_message["schemas"]) == 4
+    style_classes = get_style_classes(dom_message["dom"])
+    assert set(encoder.style_classes) == set(style_classes)
+    assert len(encoder.style_classes) < len(style_classes)
+    assert compact_message["styleClasses"] == dom_message["styleClasses"]
+    assert decoder.decode_message(compact_message) == dom_message
+    assert len(encoding.encode_message(dom_message, CompactEncoder())) < len(
+        encoding.encode_message(dom_message)
+    )
+
+    mr.update_state(keys[0], "items", ("a", "b", "c"))
+    mr.process_task_mutations([(keys[0], "items")])
+    diff_message = json.loads(json.dumps(mr.connection.msgs[-1]))
+    compact_message = json.loads(encoding.encode_message(diff_message, encoder))
+    # The inserted item reuses the schemas sent with the dom.
+    assert "schemas" not in compact_message
+    assert decoder.decode_message(compact_message) == diff_message
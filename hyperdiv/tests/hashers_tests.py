@@ -0,0 +1,140 @@
+import pytest
+from ..test_utils import MockManualRunner
+from ..hashers import hash_value, register_hasher, hashers, ContentKey
+from ..cache import cached
+from ..components.scope import scope
+from ..components.state import state
+from ..components.plaintext import plaintext
+
+
+class Point:
+    __hash__ = None
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Point3D(Point):
+    pass
+
+
+def test_hash_value():
+    assert hash_value("a") == "a"
+    assert hash_value((1, 2)) == (1, 2)
+
+    assert hash_value([1, "a", None]) == hash_value([1, "a", None])
+    assert hash_value([1, 2]) != hash_value([2, 1])
+    assert hash_value([1, 2]) != hash_value((1, [2]))
+    assert hash_value(dict(a=1)) == hash_value(dict(a=1))
+    assert hash_value(dict(a=1)) != hash_value(dict(a=2))
+    assert hash_value({1, 2}) == hash_value({2, 1})
+
+    nested = dict(a=[1, 2], b=dict(c={3}), d=(4, [5]))
+    key = hash_value(nested)
+    assert isinstance(key, ContentKey)
+    assert key == hash_value(dict(a=[1, 2], b=dict(c={3}), d=(4, [5])))
+    nested["b"]["c"].add(4)
+    assert key != hash_value(nested)
+
+    # A content key never equals a plain value.
+    assert hash_value([1]) != (list, (1,))
+
+    with pytest.raises(TypeError):
+        hash_value(Point(1, 2))
+
+
+def test_register_hasher():
+    num_hashes = 0
+
+    def hash_point(point):
+        nonlocal num_hashes
+        num_hashes += 1
+        return (point.x, point.y)
+
+    register_hasher(Point, hash_point)
+    try:
+        assert hash_value(Point(1, 2)) == hash_value(Point(1, 2))
+        assert hash_value(Point(1, 2)) != hash_value(Point(2, 1))
+        # Subclasses inherit the hasher, but have distinct keys.
+        assert hash_value(Point3D(1, 2)) != hash_value(Point(1, 2))
+
+        # Values in the memo are hashed once.
+        memo = dict()
+        point = Point(1, 2)
+        num_hashes = 0
+        hash_value([point, point], memo)
+        hash_value(point, memo)
+        assert num_hashes == 1
+    finally:
+        del hashers[Point]
+
+
+def test_cached_unhashable_args():
+    calls = []
+
+    @cached
+    def table(rows, options):
+        calls.append(rows)
+        s = state(count=0)
+        plaintext(len(rows), options["title"], s.count)
+
+    rows = [[1, 2], [3, 4]]
+    keys = []
+
+    def my_app():
+        s = state(tick=0)
+        keys.append(s._key)
+        plaintext(s.tick)
+        with scope(1):
+            table(rows, dict(title="Table"))
+        with scope(2):
+            table(list(rows), dict(title="Table"))
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    assert len(calls) == 2
+
+    def rerun(tick):
+        mr.update_state(keys[0], "tick", tick)
+        mr.process_task_mutations([(keys[0], "tick")])
+
+    rerun(1)
+    assert len(keys) == 2
+    assert len(calls) == 2
+
+    # Mutating the argument re-runs the calls.
+    rows.append([5, 6])
+    rerun(2)
+    assert len(calls) == 4
+
+    # An argument mutated in place between two calls in the same run
+    # is hashed again for the second call.
+    calls.clear()
+    keys.clear()
+    items = []
+
+    @cached
+    def item_list(items):
+        calls.append(list(items))
+        plaintext(items)
+
+    def mutating_app():
+        s = state(tick=0)
+        keys.append(s._key)
+        items[:] = [1]
+        with scope(1):
+            item_list(items)
+        if s.tick == 0:
+            items.append(2)
+        with scope(2):
+            item_list(items)
+
+    mr = MockManualRunner(mutating_app)
+    mr.advance()
+    assert calls == [[1], [1, 2]]
+
+    # The second call's result was computed from `[1, 2]`, so it
+    # isn't reused when the second call gets `[1]`.
+    rerun(1)
+    assert calls == [[1], [1, 2], [1]]
@@ -0,0 +1,25 @@
+import os
+import stat
+from ..hibernation import HibernationStore
+
+
+def test_private_db_path():
+    store = HibernationStore()
+    db_dir = os.path.dirname(store.db_path)
+    assert stat.S_IMODE(os.stat(db_dir).st_mode) == 0o700
+
+    store.put("session", b"snapshot")
+    assert store.take("session") == b"snapshot"
+    assert store.take("session") is None
+
+    store.close()
+    assert not os.path.exists(db_dir)
+
+
+def test_closed_store(tmp_path):
+    store = HibernationStore(str(tmp_path / "sessions.db"))
+    store.put("session", b"snapshot")
+    store.close()
+    assert not os.path.exists(store.db_path)
+    assert store.take("session") is None
+    store.delete("session")
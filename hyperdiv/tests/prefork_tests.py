@@ -0,0 +1,118 @@
+import os
+import signal
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from ..prefork import WorkerPool
+from ..main import run
+
+
+def wait_for(condition, timeout=10):
+    start = time.time()
+    while not condition():
+        if time.time() - start > timeout:
+            raise TimeoutError()
+        time.sleep(0.05)
+
+
+def read_pids(path):
+    with open(path) as f:
+        return [int(line) for line in f.read().split()]
+
+
+def pid_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def run_pool(tmp_path):
+    pids_path = os.path.join(tmp_path, "pids")
+    crashed_path = os.path.join(tmp_path, "crashed")
+
+    def worker():
+        with open(pids_path, "a") as f:
+            f.write(f"{os.getpid()}\n")
+
+        # The first worker to start crashes.
+        try:
+            fd = os.open(crashed_path, os.O_CREAT | os.O_EXCL)
+            os.close(fd)
+            os._exit(1)
+        except FileExistsError:
+            pass
+
+        stopped = False
+
+        def stop(sig, frame):
+            nonlocal stopped
+            stopped = True
+
+        signal.signal(signal.SIGTERM, stop)
+        while not stopped:
+            time.sleep(0.05)
+
+    WorkerPool.restart_delay = 0
+    WorkerPool(2, worker).run()
+
+
+def test_worker_pool(tmp_path):
+    pids_path = os.path.join(tmp_path, "pids")
+
+    process = multiprocessing.Process(target=run_pool, args=(str(tmp_path),))
+    process.start()
+
+    # Two workers start, one of them crashes and is restarted.
+    wait_for(lambda: os.path.exists(pids_path) and len(read_pids(pids_path)) == 3)
+    pids = read_pids(pids_path)
+    assert not pid_is_alive(pids[0])
+
+    os.kill(process.pid, signal.SIGTERM)
+    process.join(timeout=10)
+
+    # The pool exits cleanly after all the workers drained.
+    assert process.exitcode == 0
+    for pid in pids:
+        assert not pid_is_alive(pid)
+
+
+def run_started_pool(tmp_path):
+    started_path = os.path.join(tmp_path, "started")
+
+    def worker():
+        signal.signal(signal.SIGTERM, lambda sig, frame: os._exit(0))
+        while True:
+            time.sleep(0.05)
+
+    def on_start():
+        with open(started_path, "w") as f:
+            f.write(f"{os.getpid()} {len(pool.workers)}")
+
+    pool = WorkerPool(2, worker, on_start=on_start)
+    pool.run()
+
+
+def test_worker_pool_on_start(tmp_path):
+    started_path = os.path.join(tmp_path, "started")
+
+    process = multiprocessing.Process(target=run_started_pool, args=(str(tmp_path),))
+    process.start()
+
+    # `on_start` runs in the parent, after the workers are forked.
+    wait_for(lambda: os.path.exists(started_path))
+    time.sleep(0.1)
+    with open(started_path) as f:
+        assert f.read() == f"{process.pid} 2"
+
+    os.kill(process.pid, signal.SIGTERM)
+    process.join(timeout=10)
+    assert process.exitcode == 0
+
+
+def test_executor_with_workers():
+    with ThreadPoolExecutor(1) as executor:
+        with pytest.raises(ValueError):
+            run(lambda: None, executor=executor, workers=2)
@@ -0,0 +1,74 @@
+from .. import prop as prop_module
+from ..prop import Prop, StoredProp
+from ..prop_types import HyperdivType, List, String
+
+
+class CountingType(HyperdivType):
+    def __init__(self, typ):
+        self.typ = typ
+        self.num_parses = 0
+
+    def parse(self, value):
+        self.num_parses += 1
+        return self.typ.parse(value)
+
+
+def test_unchanged_init_values():
+    prop_module.parse_memo.clear()
+    typ = CountingType(String)
+    typ.memoize_parse = False
+    stored_prop = StoredProp(None, Prop(typ, "", name="x"))
+
+    assert stored_prop.init("a") is True
+    assert stored_prop.init("a") is False
+    assert stored_prop.init("".join(["a"])) is False
+    assert typ.num_parses == 1
+
+    # Equal values of different types are parsed.
+    assert stored_prop.init(1) is True
+    assert stored_prop.init(True) is True
+    assert stored_prop.value == "True"
+    assert typ.num_parses == 3
+
+    # Mutable values are parsed on every frame, since they may have
+    # been mutated in place.
+    list_typ = CountingType(List(String))
+    stored_prop = StoredProp(None, Prop(list_typ, (), name="y"))
+    items = ["a"]
+    stored_prop.init(items)
+    items.append("b")
+    assert stored_prop.init(items) is True
+    assert stored_prop.value == ("a", "b")
+    assert list_typ.num_parses == 2
+
+
+def test_parse_memo():
+    prop_module.parse_memo.clear()
+    typ = CountingType(String)
+    prop = Prop(typ, "", name="x")
+
+    for _ in range(3):
+        StoredProp(None, prop).init("a")
+        StoredProp(None, prop).init(1)
+        StoredProp(None, prop).init(True)
+    assert typ.num_parses == 3
+
+    StoredProp(None, prop).update("a")
+    assert typ.num_parses == 3
+
+    # Long strings are not memoized.
+    long_string = "a" * (prop_module.max_memoized_str_len + 1)
+    StoredProp(None, prop).init(long_string)
+    StoredProp(None, prop).init(long_string)
+    assert typ.num_parses == 5
+
+    # Parse errors are not memoized.
+    stored_prop = StoredProp(None, Prop(CountingType(List(String)), (), name="y"))
+    for _ in range(2):
+        try:
+            stored_prop.init("a")
+        except ValueError:
+            pass
+    assert stored_prop.prop.prop_type.num_parses == 2
+
+    prop_module.parse_memo.clear()
@@ -0,0 +1,250 @@
+import threading
+import time
+import pytest
+from ..test_utils import MockRunner
+from ..shared_cache import shared_cache, invalidate_shared_cache
+from ..components.plaintext import plaintext
+from ..components.task import task
+
+
+def test_shared_cache():
+    calls = []
+
+    @shared_cache(maxsize=2)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert square(2) == 4
+    assert square(2) == 4
+    assert square(x=2) == 4
+    assert calls == [2, 2]
+
+    square(3)
+    square(4)
+    # 2 was evicted.
+    square(2)
+    assert calls == [2, 2, 3, 4, 2]
+
+    square.invalidate(2)
+    square(2)
+    assert calls == [2, 2, 3, 4, 2, 2]
+    assert square.shared_cache.stats["hits"] == 1
+
+    square.clear()
+    square(4)
+    assert calls[-1] == 4
+
+
+def test_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    calls = []
+
+    @shared_cache(ttl=10)
+    def f():
+        calls.append(1)
+
+    f()
+    now[0] += 5
+    f()
+    assert len(calls) == 1
+    now[0] += 5
+    f()
+    assert len(calls) == 2
+
+
+def test_errors_are_not_cached():
+    calls = []
+
+    @shared_cache
+    def f():
+        calls.append(1)
+        raise ValueError("Oops")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            f()
+    assert len(calls) == 2
+
+    with pytest.raises(ValueError):
+
+        @shared_cache
+        async def g():
+            pass
+
+
+def test_single_flight():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    @shared_cache
+    def slow(x):
+        calls.append(x)
+        started.set()
+        release.wait()
+        return x + 1
+
+    results = []
+
+    def call():
+        results.append(slow(1))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    while slow.shared_cache.stats["waits"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == [2] * 5
+
+
+def test_invalidate_during_flight():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    @shared_cache(tags=lambda x: [f"x-{x}"])
+    def slow(x):
+        calls.append(x)
+        started.set()
+        release.wait()
+        return x
+
+    def invalidate_during_call(invalidate):
+        """
+        Calls `invalidate` while `slow(1)` is computed, and returns
+        whether the result was stored.
+        """
+        slow.clear()
+        calls.clear()
+        started.clear()
+        release.clear()
+        thread = threading.Thread(target=slow, args=(1,))
+        thread.start()
+        started.wait()
+        invalidate()
+        release.set()
+        thread.join()
+        slow(1)
+        return calls == [1]
+
+    # Invalidating other entries doesn't prevent the result from
+    # being stored.
+    assert invalidate_during_call(lambda: slow.invalidate(2))
+    assert invalidate_during_call(lambda: invalidate_shared_cache("x-2"))
+
+    # Invalidating the entry being computed does.
+    assert not invalidate_during_call(lambda: slow.invalidate(1))
+    assert not invalidate_during_call(lambda: invalidate_shared_cache("x-1"))
+    assert not invalidate_during_call(slow.clear)
+
+
+def test_waiters_raise_copies():
+    started = threading.Event()
+    release = threading.Event()
+    error = ValueError("Oops")
+
+    @shared_cache
+    def fail():
+        started.set()
+        release.wait()
+        raise error
+
+    errors = []
+
+    def call():
+        try:
+            fail()
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    while fail.shared_cache.stats["waits"] < 2:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 3
+    waiter_errors = [e for e in errors if e is not error]
+    assert len(waiter_errors) == 2
+    assert waiter_errors[0] is not waiter_errors[1]
+    for e in waiter_errors:
+        assert e.args == ("Oops",)
+        assert e.__cause__ is error
+
+
+def test_invalidate_tags():
+    calls = []
+
+    @shared_cache(tags=lambda user_id: ["users", f"user-{user_id}"])
+    def get_user(user_id):
+        calls.append(user_id)
+        return dict(id=user_id)
+
+    @shared_cache(tags=["teams"])
+    def get_teams():
+        calls.append("teams")
+
+    get_user(1)
+    get_user(2)
+    get_teams()
+
+    invalidate_shared_cache("user-1")
+    get_user(1)
+    get_user(2)
+    get_teams()
+    assert calls == [1, 2, "teams", 1]
+
+    invalidate_shared_cache("users", "teams")
+    get_user(1)
+    get_user(2)
+    get_teams()
+    assert calls == [1, 2, "teams", 1, 1, 2, "teams"]
+
+    # A result computed while its tag is invalidated is not cached.
+    @shared_cache(tags=["data"])
+    def data():
+        calls.append("data")
+        invalidate_shared_cache("data")
+
+    data()
+    data()
+    assert calls[-2:] == ["data", "data"]
+
+
+def test_app_and_task():
+    calls = []
+
+    @shared_cache
+    def load(x):
+        calls.append(x)
+        return x * 10
+
+    def my_app():
+        plaintext(load(1))
+        t = task()
+        t.run(load, 1)
+        if t.result:
+            plaintext(t.result)
+
+    with MockRunner(my_app) as mr:
+        for _ in range(50):
+            if len(mr.app_runner.previous_root_container._children) == 2:
+                break
+            time.sleep(0.01)
+            mr.process_updates([])
+
+    assert calls == [1]
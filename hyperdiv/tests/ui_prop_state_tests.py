@@ -0,0 +1,119 @@
+from ..test_utils import MockManualRunner
+from ..cache import cached
+from ..component_base import Component
+from ..components.state import state
+from ..components.box import box
+from ..components.text import text
+from ..components.scope import scope
+
+
+def count_renders(monkeypatch):
+    rendered_keys = []
+    render = Component._render
+
+    def counting_render(self):
+        rendered_keys.append(self._key)
+        return render(self)
+
+    monkeypatch.setattr(Component, "_render", counting_render)
+    return rendered_keys
+
+
+def setup_app(is_cached):
+    keys = dict()
+
+    def page(number):
+        s = state(count=0)
+        keys[number] = s._key
+        with box(gap=1) as b:
+            keys[("box", number)] = b._key
+            for i in range(3):
+                with scope(i):
+                    text(f"Page {number}, item {i}: {s.count}")
+
+    if is_cached:
+        page = cached(page)
+
+    def my_app():
+        nav = state(page=0)
+        keys["nav"] = nav._key
+        with box() as root:
+            keys["root"] = root._key
+            with scope(nav.page):
+                page(nav.page)
+
+    def update(key, prop_name, value):
+        mr.update_state(keys[key], prop_name, value)
+        mr.process_task_mutations([(keys[key], prop_name)])
+        return mr.connection.msgs[-1]
+
+    mr = MockManualRunner(my_app)
+    mr.advance()
+    return mr, keys, update
+
+
+def get_page(msg, keys):
+    (root,) = [c for c in msg["dom"]["children"] if c["key"] == keys["root"]]
+    (page,) = root["children"]
+    return page
+
+
+def get_inserted(msg, keys):
+    ((command, _, (inserted,)),) = msg["diff"][keys["root"]]["children"][-1:]
+    assert command == "insert"
+    return inserted
+
+
+def test_cached_subtree(monkeypatch):
+    mr, keys, update = setup_app(is_cached=True)
+    page0 = get_page(mr.connection.msgs[-1], keys)
+
+    rendered_keys = count_renders(monkeypatch)
+    update("nav", "page", 1)
+    assert len(rendered_keys) == 4
+
+    # The cached page is sent again without being rendered.
+    rendered_keys.clear()
+    assert get_inserted(update("nav", "page", 0), keys) is page0
+    assert rendered_keys == []
+
+    # A changed prop drops the memoized renderings that include it.
+    update("nav", "page", 1)
+    text_key = page0["children"][1]["key"]
+    mr.update_state(text_key, "content", "Changed")
+    mr.process_task_mutations([(text_key, "content")])
+    rendered_keys.clear()
+    inserted = get_inserted(update("nav", "page", 0), keys)
+    assert inserted["children"][1]["props"]["content"] == "Changed"
+    assert rendered_keys == [keys[("box", 0)], text_key]
+    # The renderings of the unchanged children are reused.
+    assert inserted["children"][0] is page0["children"][0]
+
+
+def test_new_subtree(monkeypatch):
+    mr, keys, update = setup_app(is_cached=False)
+    page0 = get_page(mr.connection.msgs[-1], keys)
+
+    update("nav", "page", 1)
+
+    # The components are created again, but match the memoized
+    # renderings.
+    rendered_keys = count_renders(monkeypatch)
+    inserted = get_inserted(update("nav", "page", 0), keys)
+    assert inserted is page0
+    assert rendered_keys == []
+
+
+def test_sweep():
+    mr, keys, update = setup_app(is_cached=True)
+    ui_prop_state = mr.app_runner.ui_prop_state
+    assert keys[("box", 0)] in ui_prop_state.fragments
+
+    ui_prop_state.sweep([keys[("box", 0)]])
+    assert keys[("box", 0)] not in ui_prop_state.fragments
+    # The renderings including the swept component are dropped.
+    assert keys["root"] not in ui_prop_state.fragments
+    # The renderings of its children are kept.
+    page0 = get_page(mr.connection.msgs[-1], keys)
+    for child in page0["children"]:
+        assert child["key"] in ui_prop_state.fragments
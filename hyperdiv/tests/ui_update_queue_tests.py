@@ -0,0 +1,113 @@
+import random
+from ..ui_update_queue import UIUpdateQueue
+
+
+def is_event_prop(key, prop_name):
+    return prop_name == "clicked"
+
+
+def test_coalescing():
+    q = UIUpdateQueue(is_event_prop)
+
+    assert q.extend([("s", "value", i) for i in range(200)]) == 199
+    assert q.extend([("t", "value", "a"), ("s", "value", 500)]) == 1
+    assert len(q) == 2
+
+    assert q.take_batch() == [("s", "value", 500), ("t", "value", "a")]
+    assert len(q) == 0
+    assert q.take_batch() == []
+
+
+def test_events_are_not_coalesced():
+    q = UIUpdateQueue(is_event_prop)
+
+    assert q.extend([("b", "clicked", True)] * 3) == 0
+    assert q.take_batch() == [("b", "clicked", True)]
+    assert q.take_batch() == [("b", "clicked", True)]
+    assert q.take_batch() == [("b", "clicked", True)]
+    assert q.take_batch() == []
+
+
+def test_events_are_barriers():
+    q = UIUpdateQueue(is_event_prop)
+
+    num_coalesced = q.extend(
+        [
+            ("s", "value", 1),
+            ("s", "value", 2),
+            ("b", "clicked", True),
+            ("s", "value", 3),
+            ("s", "value", 4),
+            ("b", "clicked", True),
+            ("s", "value", 5),
+        ]
+    )
+    assert num_coalesced == 2
+
+    # The app observes the value the slider had when each click
+    # happened.
+    assert q.take_batch() == [("s", "value", 2), ("b", "clicked", True)]
+    assert q.take_batch() == [("s", "value", 4), ("b", "clicked", True)]
+
+    # Updates enqueued after the last event coalesce into pending
+    # updates, including after a batch was taken.
+    assert q.extend([("s", "value", 6)]) == 1
+    assert q.take_batch() == [("s", "value", 6)]
+    assert len(q) == 0
+
+
+def test_batches_keep_order():
+    q = UIUpdateQueue(is_event_prop)
+
+    q.extend(
+        [
+            ("a", "clicked", 1),
+            ("b", "clicked", 1),
+            ("b", "clicked", 2),
+            ("a", "clicked", 2),
+            ("c", "value", 1),
+        ]
+    )
+    assert q.take_batch() == [
+        ("a", "clicked", 1),
+        ("b", "clicked", 1),
+        ("c", "value", 1),
+    ]
+    assert q.take_batch() == [("b", "clicked", 2), ("a", "clicked", 2)]
+    assert q.take_batch() == []
+
+
+def take_batches(updates):
+    """
+    Splits `updates` into batches by repeatedly taking the earliest
+    update of each prop, without coalescing.
+    """
+    batches = []
+    while updates:
+        batch = []
+        remaining = []
+        taken = set()
+        for update in updates:
+            if update[:2] in taken:
+                remaining.append(update)
+            else:
+                taken.add(update[:2])
+                batch.append(update)
+        batches.append(batch)
+        updates = remaining
+    return batches
+
+
+def test_random_events():
+    rng = random.Random(0)
+    q = UIUpdateQueue(is_event_prop)
+    updates = [(rng.choice("abcd"), "clicked", i) for i in range(1000)]
+
+    for i in range(0, len(updates), 100):
+        q.extend(updates[i : i + 100])
+    assert len(q) == len(updates)
+
+    batches = []
+    while q:
+        batches.append(q.take_batch())
+    assert batches == take_batches(updates)
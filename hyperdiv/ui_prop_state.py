@@ -1,5 +1,12 @@
+from collections import OrderedDict
 from .component_base import Component
 from .diff import Insert
+from .renderer import render_style_class, flatten_style, diff_css
+
+# The maximum number of style classes no longer used by the browser
+# whose CSS is kept, so they can be sent again if they are used again
+# by a memoized rendering.
+max_unused_style_classes = 1000
 
 
 class UIPropState:
@@ -19,6 +26,26 @@ class UIPropState:
 
     Note that (b) implicitly prevents browser-modified values from
     being echoed back to the browser.
+
+    It also holds the keys of the children of each component in the
+    browser's DOM, so that the diff can skip the subtrees whose
+    children did not change. See `hyperdiv.diff.Differ`.
+
+    It also holds the style class of each component in the browser's
+    DOM, and counts the components using each class. Components with
+    identical CSS share a style class, whose rules are sent with the
+    first message that uses the class. When a component switches to
+    a new class, the class is sent as the difference from the
+    component's previous class, so only the changed CSS declarations
+    are sent. A class no longer used by any component at the end of a
+    message is released: the message tells the browser to delete its
+    rules, and the class is sent again if it is used again.
+
+    Finally, it memoizes the rendering of each component sent to the
+    browser, along with its descendants, until the props of the
+    component or of one of its descendants change. Subtrees that are
+    sent again, like subtrees reused from `cached` functions, or
+    re-inserted when switching tabs, are then not rendered again.
     """
 
     Unset = object()
@@ -28,6 +55,41 @@ class UIPropState:
         self.state = state
         # The values of props held by the UI
         self.props = dict()
+        # The keys of the children held by the UI, as a tuple per
+        # component key
+        self.child_keys = dict()
+        # The style class held by the UI, per component key
+        self.styles = dict()
+        # The number of keys in `styles` using each style class
+        self.style_class_refs = dict()
+        # The rendered style class of each component key, as returned
+        # by `render_style_class`, until the props of the component
+        # change
+        self.rendered_styles = dict()
+        # The style classes whose rules the UI holds
+        self.held_style_classes = set()
+        # The style classes whose count dropped to zero since the
+        # last message
+        self.released_style_classes = set()
+        # The style classes released by the UI, from least to most
+        # recently released
+        self.unused_style_classes = OrderedDict()
+        # The CSS declarations of the style classes in
+        # `held_style_classes` and `unused_style_classes`, by class
+        # name
+        self.style_classes = dict()
+        # The rules of the style classes to send with the next
+        # message, by class name
+        self.new_style_classes = dict()
+        # The style classes to send with the next message as the
+        # difference from another class held by the UI, by class name
+        self.new_derived_style_classes = dict()
+        # The memoized renderings, by component key, as (component,
+        # rendering) tuples. See `render_component`.
+        self.fragments = dict()
+        # Maps the key of a component to the keys of the components
+        # whose renderings included its rendering.
+        self.fragment_parents = dict()
 
     def get_prop_value(self, key, prop_name):
         if key not in self.props:
@@ -54,12 +116,35 @@ class UIPropState:
 
     def set_prop_values_from_component(self, component):
         key = component._key
-        props = self.state.get_props(key).values()
+        if self.has_fragment(component):
+            # The props of the component and its descendants are
+            # unchanged since they were last rendered, and set here.
+            return
+        # The browser is about to receive all the props of this
+        # component, so they no longer need to be diffed.
+        self.state.dirty_keys.discard(key)
+        self.props.setdefault(key, dict())
+        props = self.state.get_stored_props(key).values()
         self.set_prop_values(props)
         if component._has_children:
             for child in component._children:
                 self.set_prop_values_from_component(child)
 
+    def set_child_keys(self, component):
+        """
+        Sets the keys of the children of the given component, and of
+        its descendants, as held by the UI.
+        """
+        stack = [component]
+        while stack:
+            component = stack.pop()
+            if component._has_children:
+                children = component._children
+                self.child_keys[component._key] = tuple(
+                    child._key for child in children
+                )
+                stack.extend(children)
+
     def set_prop_values_from_diff(self, diff):
         for component_diff in diff._diff:
             self.set_prop_values(component_diff.props)
@@ -68,6 +153,251 @@ class UIPropState:
                     for component in command.components:
                         self.set_prop_values_from_component(component)
 
+    def sweep(self, keys):
+        """
+        Forgets the props and CSS of the components at `keys`, whose
+        state was dropped. See `AppRunner.collect_garbage`.
+        """
+        self.drop_fragments(keys)
+        for key in keys:
+            self.props.pop(key, None)
+            self.child_keys.pop(key, None)
+            self.release_style(key)
+            self.rendered_styles.pop(key, None)
+            self.fragment_parents.pop(key, None)
+
+    def release_components(self, components):
+        """
+        Releases the style classes of the given components, deleted
+        from the browser's DOM, and of their descendants.
+        """
+        stack = list(components)
+        while stack:
+            component = stack.pop()
+            self.release_style(component._key)
+            if component._has_children:
+                stack.extend(component._children)
+
+    def get_style_class(self, key, css_props):
+        """
+        Returns the style class of the given CSS props, held by the
+        component with the given key, or `None` if there is no CSS.
+        The class is rendered once per key, until the props of the
+        component change.
+        """
+        self.drop_stale_fragments()
+        if key in self.rendered_styles:
+            rendered = self.rendered_styles[key]
+        else:
+            rendered = self.rendered_styles[key] = render_style_class(css_props)
+        if rendered is None:
+            return None
+        class_name, style = rendered
+        self.style_classes.setdefault(class_name, style)
+        return class_name
+
+    def acquire_style(self, key, class_name, base_class_name=None):
+        """
+        Sets the style class of the component with the given key. If
+        the UI does not hold the class, it is queued for sending, as
+        the difference from `base_class_name` if given.
+        """
+        if self.styles.get(key) == class_name:
+            return
+        self.release_style(key)
+        if class_name is None:
+            return
+        self.styles[key] = class_name
+        self.style_class_refs[class_name] = self.style_class_refs.get(class_name, 0) + 1
+        if class_name in self.held_style_classes:
+            return
+        self.held_style_classes.add(class_name)
+        self.unused_style_classes.pop(class_name, None)
+        style = self.style_classes[class_name]
+        if base_class_name in self.held_style_classes:
+            self.new_derived_style_classes[class_name] = dict(
+                base=base_class_name,
+                diff=diff_css(self.style_classes[base_class_name], style),
+            )
+        else:
+            self.new_style_classes[class_name] = flatten_style(style)
+
+    def release_style(self, key):
+        """Forgets the style class of the component with the given key."""
+        class_name = self.styles.pop(key, None)
+        if class_name is None:
+            return
+        refs = self.style_class_refs[class_name] - 1
+        if refs > 0:
+            self.style_class_refs[class_name] = refs
+        else:
+            del self.style_class_refs[class_name]
+            self.released_style_classes.add(class_name)
+
+    def acquire_fragment_styles(self, rendering, recursive):
+        """
+        Sets the style classes of the components in a memoized
+        rendering, including its descendants if `recursive` is
+        `True`. Returns `False`, setting nothing, if the CSS of one of
+        the classes is no longer known, in which case the rendering
+        can't be reused.
+        """
+        styles = []
+        stack = [rendering]
+        while stack:
+            node = stack.pop()
+            class_name = node.get("styleClass")
+            if class_name is not None:
+                if class_name not in self.style_classes:
+                    return False
+                styles.append((node["key"], class_name))
+            if recursive:
+                stack.extend(node.get("children", ()))
+        for key, class_name in styles:
+            self.acquire_style(key, class_name)
+        return True
+
+    def update_style(self, key, css_props):
+        """
+        Sets the style class of the component with the given key to
+        the class of its CSS props. A class the UI does not hold is
+        sent as the difference from the component's previous class,
+        if any. Returns a `(previous_class_name, class_name)` tuple.
+        """
+        previous_class_name = self.styles.get(key)
+        class_name = self.get_style_class(key, css_props)
+        self.acquire_style(key, class_name, previous_class_name)
+        return previous_class_name, class_name
+
+    def render_style(self, key, css_props):
+        """
+        Renders the style class of the component with the given key,
+        remembering it as the style class held by the UI.
+        """
+        _, class_name = self.update_style(key, css_props)
+        if class_name is None:
+            return dict()
+        return dict(styleClass=class_name)
+
+    def render_style_diff(self, key, css_props):
+        """
+        Renders the style class of the component with the given key,
+        if it differs from the style class held by the UI. A removed
+        style class is rendered as `None`.
+        """
+        previous_class_name, class_name = self.update_style(key, css_props)
+        if previous_class_name == class_name:
+            return dict()
+        return dict(styleClass=class_name)
+
+    def take_new_style_classes(self):
+        """
+        Returns the changes to the style classes held by the UI since
+        the last call, for sending to the UI, as a `(style_classes,
+        derived_style_classes, released_style_classes)` tuple.
+        `style_classes` maps class names to rules.
+        `derived_style_classes` maps class names to dicts holding the
+        `base` class, and the `diff` of the class from the base class,
+        as returned by `diff_css`. `released_style_classes` lists the
+        classes no longer used, whose rules the UI deletes.
+        """
+        new_style_classes = self.new_style_classes
+        new_derived_style_classes = self.new_derived_style_classes
+        self.new_style_classes = dict()
+        self.new_derived_style_classes = dict()
+
+        released = [
+            class_name
+            for class_name in self.released_style_classes
+            if class_name not in self.style_class_refs
+        ]
+        self.released_style_classes = set()
+        for class_name in released:
+            self.held_style_classes.discard(class_name)
+            self.unused_style_classes[class_name] = None
+        while len(self.unused_style_classes) > max_unused_style_classes:
+            class_name, _ = self.unused_style_classes.popitem(last=False)
+            del self.style_classes[class_name]
+
+        return new_style_classes, new_derived_style_classes, released
+
+    def drop_fragments(self, keys):
+        """
+        Drops the memoized renderings of the components at `keys`,
+        and of the components whose renderings include them.
+        """
+        stack = list(keys)
+        while stack:
+            key = stack.pop()
+            # A component whose rendering was already dropped is no
+            # longer included in memoized renderings, since those
+            # were dropped along with it.
+            if self.fragments.pop(key, None) is not None:
+                stack.extend(self.fragment_parents.get(key, ()))
+
+    def drop_stale_fragments(self):
+        """
+        Drops the memoized renderings that include components whose
+        props changed since the last call, and the rendered style
+        classes of those components.
+        """
+        if self.state.changed_keys:
+            changed_keys = self.state.take_changed_keys()
+            self.drop_fragments(changed_keys)
+            for key in changed_keys:
+                self.rendered_styles.pop(key, None)
+
+    def has_fragment(self, component):
+        self.drop_stale_fragments()
+        fragment = self.fragments.get(component._key)
+        return fragment is not None and fragment[0] is component
+
+    def render_component(self, component):
+        """
+        Renders the given component, reusing the memoized rendering
+        of its key if the props of the component and its descendants
+        are unchanged since it was memoized.
+
+        A component reused from a previous run, like one returned by
+        a `cached` function, is rendered in constant time. A new
+        component reuses the memoized rendering of its own props, and
+        of its children, if they are reused in turn.
+        """
+        self.drop_stale_fragments()
+        key = component._key
+        fragment = self.fragments.get(key)
+
+        # A memoized rendering is reused along with the style classes
+        # it references.
+        if fragment is not None and (
+            type(fragment[0]) is not type(component)
+            or not self.acquire_fragment_styles(
+                fragment[1], recursive=fragment[0] is component
+            )
+        ):
+            fragment = None
+
+        if fragment is None:
+            output = component._render()
+        elif fragment[0] is component:
+            return fragment[1]
+        elif not component._has_children:
+            output = fragment[1]
+        else:
+            output = fragment[1]
+            children = [self.render_component(c) for c in component._children]
+            if len(children) != len(output["children"]) or any(
+                child is not previous
+                for child, previous in zip(children, output["children"])
+            ):
+                output = dict(output, children=children)
+
+        if component._has_children:
+            for child in component._children:
+                self.fragment_parents.setdefault(child._key, set()).add(key)
+        self.fragments[key] = (component, output)
+        return output
+
     def prop_changed(self, prop):
         if isinstance(prop.value, Component):
             return self.component_changed(prop.value)
@@ -83,7 +413,10 @@ class UIPropState:
         return ui_prop_value != prop.value
 
     def component_changed(self, component):
-        props = self.state.get_props(component._key)
+        if component._key not in self.props:
+            return True
+
+        props = self.state.get_stored_props(component._key)
 
         for prop in props.values():
             if self.prop_changed(prop):
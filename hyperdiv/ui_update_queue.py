@@ -0,0 +1,99 @@
+from collections import deque
+
+
+class UIUpdateQueue:
+    """
+    Holds the UI updates taken off the AppRunner's input queue that
+    have not yet been applied, and splits them into batches that are
+    disjoint on (key, prop_name), each batch applied in its own run.
+
+    Updates to value props are coalesced: when a prop is updated
+    again before its pending update is applied, the pending update
+    takes the new value, so a slider drag producing many updates to
+    the same prop causes a single run.
+
+    Updates to event props, like `clicked`, are never coalesced, and
+    each one is applied in its own run. An event update also acts as
+    a barrier: value updates enqueued after it are not coalesced
+    into value updates enqueued before it, so the app observes the
+    values the props had when the event happened.
+
+    The n-th pending update of a prop belongs to the n-th batch, so
+    each update is placed in its batch when it is enqueued, and
+    enqueueing and taking batches costs constant time per update.
+    """
+
+    def __init__(self, is_event_prop):
+        # A function (key, prop_name) -> bool.
+        self.is_event_prop = is_event_prop
+        # The pending batches, in order. Each batch holds its updates
+        # in the order they were enqueued, as [key, prop_name, value]
+        # lists.
+        self.batches = deque()
+        # Maps (key, prop_name) to the number of pending updates of
+        # that prop.
+        self.pending_counts = dict()
+        # Maps (key, prop_name) to the pending value update of that
+        # prop enqueued after the last event update, which later
+        # updates of that prop coalesce into.
+        self.index = dict()
+        # The number of pending updates.
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, updates):
+        """
+        Adds `updates` to the queue. Returns the number of updates
+        that were coalesced into previously pending updates.
+        """
+        num_coalesced = 0
+        for key, prop_name, value in updates:
+            if self.is_event_prop(key, prop_name):
+                self.append(key, prop_name, value)
+                self.index.clear()
+                continue
+            update = self.index.get((key, prop_name))
+            if update is None:
+                self.index[(key, prop_name)] = self.append(key, prop_name, value)
+            else:
+                update[2] = value
+                num_coalesced += 1
+        return num_coalesced
+
+    def append(self, key, prop_name, value):
+        """
+        Adds an update to the batch following the batch of the last
+        pending update of its prop, and returns it.
+        """
+        rank = self.pending_counts.get((key, prop_name), 0)
+        self.pending_counts[(key, prop_name)] = rank + 1
+        if rank == len(self.batches):
+            self.batches.append([])
+        update = [key, prop_name, value]
+        self.batches[rank].append(update)
+        self.size += 1
+        return update
+
+    def take_batch(self):
+        """
+        Removes and returns the earliest pending update of each
+        (key, prop_name).
+        """
+        if not self.batches:
+            return []
+
+        batch = self.batches.popleft()
+        for update in batch:
+            prop = (update[0], update[1])
+            count = self.pending_counts[prop] - 1
+            if count:
+                self.pending_counts[prop] = count
+            else:
+                del self.pending_counts[prop]
+            if self.index.get(prop) is update:
+                del self.index[prop]
+
+        self.size -= len(batch)
+        return [tuple(update) for update in batch]